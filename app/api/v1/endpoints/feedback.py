@@ -1,25 +1,129 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+import math
+import asyncio
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy import func, select
-from app.core.database import get_session
-from app.models.feedback import Feedback, FeedbackCreate, FeedbackRead, Category, Sentiment
-from app.services.ai_service import AIService
-from app.core.cache import cache_get, cache_set
+from app.core.database import DBClusterType, get_session, session_scope
+from app.models.feedback import (
+    Category, Feedback, FeedbackCreate, FeedbackPage, FeedbackRead, FeedbackSearchHit,
+    FeedbackSearchResults, FeedbackSimilarHit, FeedbackSimilarResults, Sentiment,
+)
+from app.services.ai_service import get_ai_service
+from app.core.admission import admit, ai_stage, client_ip, db_stage
+from app.core.cache import cached_computation
+from app.core.idempotency import (
+    IdempotencyKeyReused, InvalidIdempotencyKey, RequestInProgress, StoredResponse, idempotency_keys,
+    request_hash, validate_key,
+)
+from app.core.metrics import timed_stage
+from app.core.responses import FastJSONResponse
 from app.core.queue import publish_feedback_event
+from app.services.dashboard_stats import aggregate_stats, increment_counters, read_counters
+from app.services.stats_rollup import Bucket, windowed_stats
+from app.services.insights import INSIGHTS_ENABLED, Window, read_insights
+from app.services.live_stats import (
+    STREAM_KEEPALIVE, StreamMessage, Subscription, TooManySubscribers, get_broadcaster,
+)
+from app.services.bulk_ingest import BulkParseError, ingest_bulk, iter_json_array, iter_ndjson
+from app.services.feedback_query import (
+    FeedbackFilters, InvalidCursor, export_csv, export_ndjson, list_feedback, stream_feedback_rows,
+)
+from app.services.feedback_search import search_feedback
+from app.services.similarity import SIMILARITY_ENABLED, find_similar, index_feedback
+from app.services.near_duplicates import NEAR_DUP_ENABLED, message_fingerprint, near_duplicates, to_signed
 
 router = APIRouter()
-ai_service = AIService()
+ai_service = get_ai_service()
+
+STATS_CACHE_SOFT_TTL = int(os.getenv("STATS_CACHE_SOFT_TTL", "30"))
+STATS_CACHE_HARD_TTL = int(os.getenv("STATS_CACHE_HARD_TTL", "300"))
+
+# Opt-in: persist raw feedback and leave the analysis to app.workers.analysis (202 Accepted)
+ASYNC_ANALYSIS = os.getenv("FEEDBACK_ASYNC_ANALYSIS", "false").lower() == "true"
+
+def _feedback_event(feedback: Feedback, status: str = "analyzed") -> dict:
+    return {
+        "id": feedback.id,
+        "customer_id": feedback.customer_id,
+        "message": feedback.message,
+        "sentiment": feedback.sentiment.value if feedback.sentiment else None,
+        "category": feedback.category.value if feedback.category else None,
+        "status": status,
+    }
+
+def _prefers_async(prefer: Optional[str]) -> bool:
+    # RFC 7240: "Prefer: respond-async" lets a client opt in per request
+    return bool(prefer) and "respond-async" in prefer.lower()
 
 @router.post("/feedback", response_model=FeedbackRead, status_code=201)
 async def create_feedback(
     feedback_in: FeedbackCreate,
+    request: Request,
+    response: Response,
+    prefer: Optional[str] = Header(default=None),
+    idempotency_key: Optional[str] = Header(default=None),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Ingest customer feedback and process it with AI (Mock/LLM).
+    In async mode the row is stored unanalyzed and 202 is returned; the worker fills it in.
+    Rate-limited per client IP and customer (429); busy AI/DB stages shed load (503).
+    With an `Idempotency-Key` header, retries get the first attempt's response
+    (`Idempotent-Replayed: true`) instead of creating another row; a retry that arrives
+    while the first attempt runs waits for it (409 if it takes too long), and a key reused
+    for a different request is rejected (422).
     """
-    # 1. Analyze with AI
-    analysis = await ai_service.analyze_feedback(feedback_in.message)
+    if idempotency_key is None:
+        return await _create_feedback(feedback_in, request, response, prefer, session)
+
+    async def compute() -> StoredResponse:
+        feedback = await _create_feedback(feedback_in, request, response, prefer, session)
+        body = FeedbackRead.model_validate(feedback).model_dump(mode="json")
+        return StoredResponse(response.status_code or 201, body, dict(response.headers))
+
+    try:
+        stored, replayed = await idempotency_keys.run(
+            f"feedback:{feedback_in.customer_id}:{validate_key(idempotency_key)}",
+            request_hash([feedback_in.model_dump(mode="json"), ASYNC_ANALYSIS or _prefers_async(prefer)]),
+            compute,
+        )
+    except InvalidIdempotencyKey as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except RequestInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    headers = dict(stored.headers)
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return FastJSONResponse(stored.body, status_code=stored.status_code, headers=headers)
+
+async def _create_feedback(
+    feedback_in: FeedbackCreate,
+    request: Request,
+    response: Response,
+    prefer: Optional[str],
+    session: AsyncSession,
+) -> Feedback:
+    admit(client_ip(request), feedback_in.customer_id)
+    fingerprint = message_fingerprint(feedback_in.message) if NEAR_DUP_ENABLED else None
+    if ASYNC_ANALYSIS or _prefers_async(prefer):
+        return await _accept_feedback(feedback_in, fingerprint, response, session)
+
+    # 1. Reuse the analysis of a recent near-duplicate, or analyze with AI
+    with timed_stage("dedup"):
+        duplicate = await near_duplicates.find(fingerprint, ai_service.cache_namespace)
+    if duplicate is not None:
+        analysis = duplicate.analysis
+    else:
+        async with ai_stage.slot():
+            with timed_stage("analysis"):
+                analysis = await ai_service.analyze_feedback(feedback_in.message, endpoint="feedback")
     
     # 2. Create DB Object
     feedback = Feedback(
@@ -27,60 +131,279 @@ async def create_feedback(
         message=feedback_in.message,
         sentiment=analysis.sentiment,
         category=analysis.category,
-        summary=analysis.summary
+        summary=analysis.summary,
+        analysis_tier=analysis.tier,
+        analysis_confidence=analysis.confidence,
+        fingerprint=to_signed(fingerprint),
+        duplicate_of=duplicate.feedback_id if duplicate is not None else None,
     )
     
     # 3. Save to DB
     session.add(feedback)
-    await session.commit()
-    await session.refresh(feedback)
-    await publish_feedback_event({
-        "id": feedback.id,
-        "customer_id": feedback.customer_id,
-        "sentiment": feedback.sentiment.value if feedback.sentiment else None,
-        "category": feedback.category.value if feedback.category else None,
-    })
+    async with db_stage.slot():
+        with timed_stage("commit"):
+            await session.commit()
+        with timed_stage("refresh"):
+            await session.refresh(feedback)
+    if duplicate is None:
+        await near_duplicates.remember(fingerprint, feedback.id, analysis, ai_service.cache_namespace)
+    with timed_stage("counters"):
+        await increment_counters([(feedback.sentiment, feedback.category)])
+    with timed_stage("index"):
+        await index_feedback([(feedback.id, feedback.message)])
+    with timed_stage("publish"):
+        await publish_feedback_event(_feedback_event(feedback))
     
     return feedback
 
-@router.get("/dashboard/stats")
-async def get_dashboard_stats(session: AsyncSession = Depends(get_session)):
+async def _accept_feedback(
+    feedback_in: FeedbackCreate, fingerprint: Optional[int], response: Response, session: AsyncSession
+) -> Feedback:
+    feedback = Feedback(
+        customer_id=feedback_in.customer_id, message=feedback_in.message, fingerprint=to_signed(fingerprint)
+    )
+    session.add(feedback)
+    async with db_stage.slot():
+        await session.commit()
+        await session.refresh(feedback)
+    await increment_counters([(None, None)])
+    await index_feedback([(feedback.id, feedback.message)])
+    await publish_feedback_event(_feedback_event(feedback, status="pending"))
+
+    response.status_code = 202
+    response.headers["Preference-Applied"] = "respond-async"
+    return feedback
+
+@router.post("/feedback/bulk")
+async def create_feedback_bulk(request: Request, session: AsyncSession = Depends(get_session)):
     """
-    Get aggregated statistics for feedback.
-    Optimized for performance using database-level aggregation.
+    Bulk ingestion. Accepts a JSON array (application/json) or NDJSON
+    (application/x-ndjson), parsed incrementally from the request stream.
+    Returns a per-item result (created id or error) in input order. Items over their
+    customer's rate limit, or shed by a busy AI/DB stage, fail with `code` 429/503.
     """
-    # Try cache first
-    cached = await cache_get("dashboard_stats")
-    if cached:
-        import json
-        return json.loads(cached)
-
-    # Optimized Queries: Group by Category
-    cat_query = select(Feedback.category, func.count(Feedback.id)).group_by(Feedback.category)
-    cat_result = await session.exec(cat_query)
-    category_stats = {
-        (row[0].value if isinstance(row[0], Category) else row[0]): row[1]
-        for row in cat_result.all() if row[0] is not None
-    }
-    
-    # Optimized Queries: Group by Sentiment
-    sent_query = select(Feedback.sentiment, func.count(Feedback.id)).group_by(Feedback.sentiment)
-    sent_result = await session.exec(sent_query)
-    sentiment_stats = {
-        (row[0].value if isinstance(row[0], Sentiment) else row[0]): row[1]
-        for row in sent_result.all() if row[0] is not None
-    }
-    
-    # Total Count
-    total_query = select(func.count(Feedback.id))
-    total_result = await session.exec(total_query)
-    total_count = total_result.scalar_one()
-    
-    result = {
-        "total_feedback": total_count,
-        "by_category": category_stats,
-        "by_sentiment": sentiment_stats
+    admit(client_ip(request))
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = iter_ndjson(request.stream())
+    else:
+        items = iter_json_array(request.stream())
+    try:
+        return await ingest_bulk(items, session, ai_service)
+    except BulkParseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+_EXPORT_MEDIA_TYPES = {ExportFormat.NDJSON: "application/x-ndjson", ExportFormat.CSV: "text/csv"}
+
+def feedback_filters(
+    customer_id: Optional[str] = None,
+    sentiment: Optional[Sentiment] = None,
+    category: Optional[Category] = None,
+    from_: Optional[datetime] = Query(default=None, alias="from"),
+    to: Optional[datetime] = None,
+) -> FeedbackFilters:
+    if from_ is not None and to is not None and from_ >= to:
+        raise HTTPException(status_code=422, detail="'from' must be before 'to'")
+    return FeedbackFilters(customer_id, sentiment, category, from_, to)
+
+@router.get("/feedback", response_model=FeedbackPage)
+async def get_feedback(
+    filters: FeedbackFilters = Depends(feedback_filters),
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    List feedback, newest first, filtered by customer, sentiment, category and `created_at`
+    range (`from` inclusive, `to` exclusive). Pass `next_cursor` back as `cursor` for the next page.
+    """
+    try:
+        items, next_cursor = await list_feedback(session, filters, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FeedbackPage(items=items, next_cursor=next_cursor)
+
+@router.get("/feedback/search", response_model=FeedbackSearchResults)
+async def search_feedback_messages(
+    q: str = Query(min_length=1, max_length=256),
+    filters: FeedbackFilters = Depends(feedback_filters),
+    limit: int = Query(default=20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Full-text search over feedback messages, best match first. `q` takes web-search syntax:
+    words (all must match), "quoted phrases" and `or`.
+    """
+    hits = await search_feedback(session, q, filters, limit)
+    return FeedbackSearchResults(items=[
+        FeedbackSearchHit.model_validate(feedback, update={"rank": rank})
+        for feedback, rank in hits
+    ])
+
+@router.get("/feedback/export")
+async def export_feedback(
+    filters: FeedbackFilters = Depends(feedback_filters),
+    format: ExportFormat = ExportFormat.NDJSON,
+):
+    """Stream every matching row as NDJSON or CSV, read through a server-side cursor."""
+    encode = export_csv if format == ExportFormat.CSV else export_ndjson
+
+    async def body():
+        # Opens its own session: the stream outlives the request handler
+        async with session_scope() as session:
+            async for chunk in encode(stream_feedback_rows(session, filters)):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="feedback.{format.value}"'},
+    )
+
+@router.get("/feedback/{feedback_id}/similar", response_model=FeedbackSimilarResults)
+async def get_similar_feedback(
+    feedback_id: int,
+    k: int = Query(default=10, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+):
+    """Top-k feedback with the most similar messages (cosine similarity of local embeddings)."""
+    if not SIMILARITY_ENABLED:
+        raise HTTPException(status_code=503, detail="Similarity index is disabled")
+    feedback = await session.get(Feedback, feedback_id)
+    if feedback is None:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    hits = await find_similar(feedback.message, k, exclude_id=feedback_id)
+    rows = {
+        row.id: row for row in
+        (await session.exec(select(Feedback).where(Feedback.id.in_([id for id, _ in hits])))).scalars()
     }
-    import json
-    await cache_set("dashboard_stats", json.dumps(result), ttl=60)
-    return result
+    return FeedbackSimilarResults(items=[
+        FeedbackSimilarHit.model_validate(rows[id], update={"score": score})
+        for id, score in hits if id in rows
+    ])
+
+@router.get("/dashboard/stats", response_class=FastJSONResponse)
+async def get_dashboard_stats(
+    from_: Optional[datetime] = Query(default=None, alias="from"),
+    to: Optional[datetime] = None,
+    bucket: Optional[Bucket] = None,
+):
+    """
+    Get aggregated statistics for feedback.
+    All-time totals are served from write-time Redis counters (constant time), falling back
+    to database-level aggregation when the counter store is unavailable.
+    With `from`/`to`/`bucket`, a time series is read from the hourly rollup on the analytics cluster.
+    """
+    if from_ is not None or to is not None or bucket is not None:
+        if from_ is not None and to is not None and from_ >= to:
+            raise HTTPException(status_code=422, detail="'from' must be before 'to'")
+        # Only windowed requests open a session (on the analytics cluster)
+        async with session_scope(DBClusterType.ANALYTICS) as analytics_session:
+            stats = await windowed_stats(analytics_session, from_, to, bucket or Bucket.DAY)
+        return FastJSONResponse(stats)
+    return FastJSONResponse(await _current_stats())
+
+async def _current_stats() -> dict:
+    counters = await read_counters()
+    if counters is not None:
+        return counters
+    # Fallback: SQL aggregation behind a stale-while-revalidate cache
+    return await cached_computation(
+        "dashboard_stats", _aggregate_stats, soft_ttl=STATS_CACHE_SOFT_TTL, hard_ttl=STATS_CACHE_HARD_TTL
+    )
+
+@router.get("/dashboard/stream")
+async def stream_dashboard_stats():
+    """
+    Server-sent events: a `snapshot` of the stats on connect, then coalesced `delta` events
+    (counts to add) and periodic `snapshot` events (totals to replace), each with a sequence
+    number as its `id`: apply only deltas numbered above the last snapshot. Also available as a
+    WebSocket at the same path, as JSON `{"event", "seq", "data"}` messages.
+    """
+    subscription = _subscribe()
+    try:
+        initial = await _initial_snapshot()
+    except BaseException:
+        get_broadcaster().unsubscribe(subscription)
+        raise
+
+    async def body():
+        try:
+            yield initial.sse
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # SSE comment: keeps proxies from closing an idle stream
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    # Evicted as a slow consumer: the client reconnects to a fresh snapshot
+                    return
+                yield message.sse
+        finally:
+            get_broadcaster().unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/dashboard/stream")
+async def stream_dashboard_stats_ws(websocket: WebSocket):
+    try:
+        subscription = _subscribe()
+    except HTTPException:
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+    try:
+        await websocket.accept()
+        await websocket.send_text((await _initial_snapshot()).text)
+        while (message := await subscription.queue.get()) is not None:
+            await websocket.send_text(message.text)
+        await websocket.close(code=1013)
+    except Exception:
+        # Client went away (or the send failed): nothing left to deliver to
+        pass
+    finally:
+        get_broadcaster().unsubscribe(subscription)
+
+async def _initial_snapshot() -> StreamMessage:
+    stats = await _current_stats()
+    # Numbered after the read: deltas queued meanwhile are at or below it, so clients skip them
+    return StreamMessage("snapshot", stats, get_broadcaster().seq)
+
+def _subscribe() -> Subscription:
+    try:
+        return get_broadcaster().subscribe()
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/dashboard/insights", response_class=FastJSONResponse)
+async def get_dashboard_insights(
+    window: Window = Window.HOUR,
+    k: int = Query(default=10, ge=1, le=50),
+):
+    """
+    Approximate analytics for the current hour or day (UTC): unique customers (HyperLogLog)
+    and the top-k terms and customers (Count-Min), overall and per sentiment and category.
+    Read in constant time from streaming sketches in Redis.
+    """
+    if not INSIGHTS_ENABLED:
+        raise HTTPException(status_code=503, detail="Insights are disabled")
+    try:
+        insights = await read_insights(window, k)
+    except Exception:
+        raise HTTPException(status_code=503, detail="Insights store unavailable")
+    return FastJSONResponse(insights)
+
+async def _aggregate_stats() -> dict:
+    # Opens its own session: background refreshes outlive the request
+    async with session_scope() as session:
+        return await aggregate_stats(session)
@@ -0,0 +1,230 @@
+"""
+Admission control: per-key rate limiting and stage concurrency limits.
+
+Rate limiting is a token bucket per key (customer_id, client IP). Admission is decided
+locally; every RATE_LIMIT_SYNC_INTERVAL seconds each replica adds what it admitted to a
+shared Redis counter per key and refill window (the time a bucket takes to refill), and
+deducts what the other replicas admitted in the current window from its own buckets, so
+the limit holds across replicas without a Redis round trip per request. When Redis is
+unavailable the buckets simply stay local.
+
+Behind a load balancer the client IP is taken from X-Forwarded-For, trusting only the
+hops added by TRUSTED_PROXIES.
+
+Stage limiters cap in-flight work (AI analysis, writer sessions): a caller waits briefly
+for a slot when the stage is busy, and is shed with `Overloaded` when the wait queue is
+full or the wait times out, instead of queueing until the client times out.
+"""
+import os
+import time
+import asyncio
+import ipaddress
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from starlette.requests import Request
+from app.core.cache import LRUCache, get_redis
+from app.core.metrics import ADMISSION_REJECTIONS, CACHE_ERRORS
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Sustained requests per second and burst size, per customer_id and per client IP (0 = no limit)
+RATE_LIMIT_CUSTOMER_RPS = float(os.getenv("RATE_LIMIT_CUSTOMER_RPS", "10"))
+RATE_LIMIT_CUSTOMER_BURST = float(os.getenv("RATE_LIMIT_CUSTOMER_BURST", "20"))
+RATE_LIMIT_IP_RPS = float(os.getenv("RATE_LIMIT_IP_RPS", "50"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "100"))
+RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "1"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Comma-separated CIDRs of the load balancers/proxies allowed to set X-Forwarded-For
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(cidr.strip(), strict=False)
+    for cidr in os.getenv("TRUSTED_PROXIES", "").split(",") if cidr.strip()
+]
+
+AI_MAX_INFLIGHT = int(os.getenv("AI_MAX_INFLIGHT", "64"))
+# Defaults to the writer pool capacity (pool_size + max_overflow)
+DB_MAX_INFLIGHT = int(os.getenv("DB_MAX_INFLIGHT", "30"))
+# How many callers may wait for a busy stage, and for how long, before being shed
+STAGE_MAX_QUEUE = int(os.getenv("STAGE_MAX_QUEUE", "100"))
+STAGE_MAX_WAIT_MS = float(os.getenv("STAGE_MAX_WAIT_MS", "200"))
+
+class RateLimited(Exception):
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {key}")
+        self.retry_after = retry_after
+
+class Overloaded(Exception):
+    def __init__(self, stage: str, retry_after: float):
+        super().__init__(f"{stage} is overloaded")
+        self.retry_after = retry_after
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "admitted", "synced_total", "synced_window")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+        # Admitted since the last sync, and the shared total (of that refill window) seen at the last sync
+        self.admitted = 0
+        self.synced_total: Optional[int] = None
+        self.synced_window: Optional[int] = None
+
+class RateLimiter:
+    def __init__(self, name: str, rate: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._buckets = LRUCache(maxsize=max_keys)
+
+    def _refill(self, bucket: _Bucket, now: float) -> None:
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+
+    def check(self, key: str) -> None:
+        """Takes a token for `key` or raises RateLimited with the time until one is available."""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _Bucket(self.burst, now)
+            self._buckets.set(key, bucket)
+        self._refill(bucket, now)
+        if bucket.tokens < 1:
+            ADMISSION_REJECTIONS.labels(f"rate_limit_{self.name}").inc()
+            raise RateLimited(f"{self.name} {key}", (1 - bucket.tokens) / self.rate)
+        bucket.tokens -= 1
+        bucket.admitted += 1
+
+    async def sync(self, now: Optional[float] = None) -> None:
+        """
+        Publishes local admissions to Redis and charges other replicas' admissions locally.
+        Only admissions of the current refill window are charged: older ones have refilled.
+        """
+        dirty = [(key, bucket) for key, bucket in self._buckets.items() if bucket.admitted]
+        if not dirty:
+            return
+        period = max(self.burst / self.rate if self.rate > 0 else 0, RATE_LIMIT_SYNC_INTERVAL, 1.0)
+        window = int((time.time() if now is None else now) // period)
+        ttl = int(period) + 60
+        pipe = get_redis().pipeline(transaction=False)
+        for key, bucket in dirty:
+            pipe.incrby(f"ratelimit:{self.name}:{key}:{window}", bucket.admitted)
+            pipe.expire(f"ratelimit:{self.name}:{key}:{window}", ttl)
+        try:
+            results = await pipe.execute()
+        except Exception:
+            CACHE_ERRORS.labels("rate_limit_sync").inc()
+            return
+        updated = time.monotonic()
+        for (key, bucket), total in zip(dirty, results[::2]):
+            total = int(total)
+            if bucket.synced_total is not None:
+                seen = bucket.synced_total if bucket.synced_window == window else 0
+                remote = total - seen - bucket.admitted
+                if remote > 0:
+                    self._refill(bucket, updated)
+                    bucket.tokens = max(bucket.tokens - remote, -self.burst)
+            bucket.synced_total = total
+            bucket.synced_window = window
+            bucket.admitted = 0
+
+class StageLimiter:
+    def __init__(
+        self,
+        stage: str,
+        limit: int,
+        max_queue: int = STAGE_MAX_QUEUE,
+        max_wait: float = STAGE_MAX_WAIT_MS / 1000,
+    ):
+        self.stage = stage
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.inflight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(limit) if limit > 0 else None
+
+    def _shed(self) -> Overloaded:
+        ADMISSION_REJECTIONS.labels(f"overloaded_{self.stage}").inc()
+        return Overloaded(self.stage, max(self.max_wait, 1.0))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._slots is None:
+            yield
+            return
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                raise self._shed()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                raise self._shed()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "inflight": self.inflight, "waiting": self.waiting}
+
+customer_limiter = RateLimiter("customer", RATE_LIMIT_CUSTOMER_RPS, RATE_LIMIT_CUSTOMER_BURST)
+ip_limiter = RateLimiter("ip", RATE_LIMIT_IP_RPS, RATE_LIMIT_IP_BURST)
+ai_stage = StageLimiter("ai", AI_MAX_INFLIGHT)
+db_stage = StageLimiter("db", DB_MAX_INFLIGHT)
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    The address of the client: the peer, or when the peer is a trusted proxy, the rightmost
+    X-Forwarded-For hop that is not one (the left ones are whatever the client sent).
+    """
+    peer = request.client.host if request.client else None
+    if not peer or not _trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+def admit(client_ip: Optional[str], customer_id: Optional[str] = None) -> None:
+    """Rate-limits one request by client IP and customer. Raises RateLimited."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    if client_ip:
+        ip_limiter.check(client_ip)
+    if customer_id:
+        customer_limiter.check(customer_id)
+
+async def sync_rate_limits() -> None:
+    await ip_limiter.sync()
+    await customer_limiter.sync()
+
+class _StageCollector:
+    """Stage occupancy gauges, read at scrape time."""
+
+    def collect(self):
+        inflight = GaugeMetricFamily("admission_stage_inflight", "Requests holding a stage slot", labels=["stage"])
+        waiting = GaugeMetricFamily("admission_stage_waiting", "Requests waiting for a stage slot", labels=["stage"])
+        for stage in (ai_stage, db_stage):
+            inflight.add_metric([stage.stage], stage.inflight)
+            waiting.add_metric([stage.stage], stage.waiting)
+        yield inflight
+        yield waiting
+
+REGISTRY.register(_StageCollector())
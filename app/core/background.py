@@ -0,0 +1,43 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+_tasks: Dict[str, asyncio.Task] = {}
+
+async def _run_periodic(name: str, interval: float, job: Callable[[], Awaitable[object]]) -> None:
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Background] {name} failed: {e}")
+        await asyncio.sleep(interval)
+
+async def _run_once(name: str, job: Callable[[], Awaitable[object]]) -> None:
+    try:
+        await job()
+    except Exception as e:
+        print(f"[Background] {name} failed: {e}")
+
+def start_once(name: str, job: Callable[[], Awaitable[object]]) -> asyncio.Task:
+    """Runs `job` once in the background (e.g. startup work nothing needs to wait for)."""
+    task = _tasks.get(name)
+    if task is None or task.done():
+        task = asyncio.create_task(_run_once(name, job))
+        _tasks[name] = task
+    return task
+
+def start_periodic(name: str, interval: float, job: Callable[[], Awaitable[object]]) -> asyncio.Task:
+    """Runs `job` now and then every `interval` seconds until `stop_all()`. One task per name."""
+    task = _tasks.get(name)
+    if task is None or task.done():
+        task = asyncio.create_task(_run_periodic(name, interval, job))
+        _tasks[name] = task
+    return task
+
+async def stop_all() -> None:
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,6 +1,12 @@
 import os
-from typing import Optional
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import orjson
 from redis.asyncio import Redis
+from app.core.metrics import CACHE_ERRORS, CACHE_LOOKUPS
 
 _redis: Optional[Redis] = None
 
@@ -15,10 +21,225 @@ async def cache_get(key: str) -> Optional[str]:
     try:
         return await get_redis().get(key)
     except Exception:
+        CACHE_ERRORS.labels("get").inc()
         return None
 
-async def cache_set(key: str, value: str, ttl: int = 60) -> None:
+async def cache_set(key: str, value: Union[str, bytes], ttl: int = 60) -> None:
     try:
         await get_redis().set(key, value, ex=ttl)
     except Exception:
-        pass
+        CACHE_ERRORS.labels("set").inc()
+
+# Deletes KEYS[1] only while it still holds ARGV[1], in one step
+_DELETE_IF_EQUAL = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+async def delete_if_equal(key: str, value: str) -> bool:
+    """Deletes `key` if it still holds `value` (a lock token), atomically. Raises on Redis errors."""
+    return bool(await get_redis().eval(_DELETE_IF_EQUAL, 1, key, value))
+
+_PEXPIRE_IF_EQUAL = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+async def pexpire_if_equal(key: str, value: str, milliseconds: int) -> bool:
+    """Renews `key` for `milliseconds` if it still holds `value`, atomically. Raises on Redis errors."""
+    return bool(await get_redis().eval(_PEXPIRE_IF_EQUAL, 1, key, value, milliseconds))
+
+class LRUCache:
+    """Bounded in-process cache with per-entry expiry (L1 tier in front of Redis)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl if ttl else 0.0, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Live entries, oldest first, without refreshing their recency."""
+        now = time.monotonic()
+        return [(key, value) for key, (expires_at, value) in self._data.items() if not expires_at or expires_at >= now]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# --- Stale-while-revalidate computations ---
+
+CACHE_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "256"))
+# How long a replica waits for the lock holder to publish a value before computing itself
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "2.0"))
+
+_l1 = LRUCache(maxsize=CACHE_L1_SIZE)
+_inflight: Dict[str, asyncio.Future] = {}
+_refreshing: Dict[str, asyncio.Task] = {}
+
+async def cached_computation(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    soft_ttl: float = 30,
+    hard_ttl: float = 300,
+    lock_ttl: float = 10,
+) -> Any:
+    """
+    Returns the cached result of `compute()` (JSON-serializable), tiered L1 (process) -> Redis.
+    - younger than soft_ttl: served as is
+    - between soft_ttl and hard_ttl: served stale while one background task refreshes it
+    - missing/expired: computed once per process; across replicas a Redis lock lets one
+      replica compute while the others wait briefly for its result
+    """
+    entry = _l1.get(key)
+    result = "local"
+    if entry is None:
+        entry = await _load_entry(key)
+        result = "redis"
+        if entry is not None:
+            _l1.set(key, entry, ttl=hard_ttl)
+    if entry is not None:
+        stored_at, value = entry
+        if time.time() - stored_at >= soft_ttl:
+            result = "stale"
+            _schedule_refresh(key, compute, hard_ttl, lock_ttl)
+        CACHE_LOOKUPS.labels("computation", result).inc()
+        return value
+    CACHE_LOOKUPS.labels("computation", "miss").inc()
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled() or asyncio.current_task().cancelling():
+                raise
+            # The first caller went away mid-computation: take over
+            return await cached_computation(key, compute, soft_ttl, hard_ttl, lock_ttl)
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _compute_once(key, compute, hard_ttl, lock_ttl)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+async def invalidate(key: str) -> None:
+    _l1.delete(key)
+    try:
+        await get_redis().delete(key)
+    except Exception:
+        CACHE_ERRORS.labels("delete").inc()
+
+async def _load_entry(key: str) -> Optional[Tuple[float, Any]]:
+    raw = await cache_get(key)
+    if raw is None:
+        return None
+    try:
+        envelope = orjson.loads(raw)
+        return envelope["stored_at"], envelope["value"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+async def _store(key: str, value: Any, hard_ttl: float) -> None:
+    stored_at = time.time()
+    _l1.set(key, (stored_at, value), ttl=hard_ttl)
+    envelope = orjson.dumps({"stored_at": stored_at, "value": value}, option=orjson.OPT_NON_STR_KEYS)
+    await cache_set(key, envelope, ttl=int(hard_ttl))
+
+async def _acquire_lock(key: str, lock_ttl: float) -> Optional[str]:
+    """Returns a token if acquired, "" if Redis is unavailable (proceed unlocked), None if held elsewhere."""
+    token = uuid.uuid4().hex
+    try:
+        acquired = await get_redis().set(f"lock:{key}", token, nx=True, px=int(lock_ttl * 1000))
+    except Exception:
+        CACHE_ERRORS.labels("lock").inc()
+        return ""
+    return token if acquired else None
+
+async def _release_lock(key: str, token: str) -> None:
+    if not token:
+        return
+    try:
+        # Compare and delete in one step: the lock may have expired and been taken by another replica
+        await delete_if_equal(f"lock:{key}", token)
+    except Exception:
+        CACHE_ERRORS.labels("unlock").inc()
+
+async def _compute_once(
+    key: str, compute: Callable[[], Awaitable[Any]], hard_ttl: float, lock_ttl: float
+) -> Any:
+    token = await _acquire_lock(key, lock_ttl)
+    if token is None:
+        # Another replica is computing: wait for its result instead of stampeding the DB
+        deadline = time.monotonic() + min(CACHE_LOCK_WAIT, lock_ttl)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await _load_entry(key)
+            if entry is not None:
+                _l1.set(key, entry, ttl=hard_ttl)
+                return entry[1]
+    try:
+        value = await compute()
+        await _store(key, value, hard_ttl)
+        return value
+    finally:
+        if token:
+            await _release_lock(key, token)
+
+def _schedule_refresh(
+    key: str, compute: Callable[[], Awaitable[Any]], hard_ttl: float, lock_ttl: float
+) -> None:
+    task = _refreshing.get(key)
+    if task is not None and not task.done():
+        return
+    _refreshing[key] = asyncio.create_task(_refresh(key, compute, hard_ttl, lock_ttl))
+
+async def _refresh(
+    key: str, compute: Callable[[], Awaitable[Any]], hard_ttl: float, lock_ttl: float
+) -> None:
+    token = await _acquire_lock(key, lock_ttl)
+    if token is None:
+        # Another replica is refreshing; pick its value up from Redis next time
+        _l1.delete(key)
+        return
+    try:
+        await _store(key, await compute(), hard_ttl)
+    except Exception as e:
+        print(f"[Cache] Background refresh of {key} failed: {e}")
+    finally:
+        await _release_lock(key, token)
@@ -1,13 +1,24 @@
 import os
-from typing import Dict, Optional
+import time
+import asyncio
+import itertools
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from contextlib import asynccontextmanager
 from contextvars import ContextVar
 from enum import Enum
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from app.core.cache import LRUCache
+from app.core.metrics import DB_POOL_CHECKOUT_SECONDS
+from app.core.partitions import create_partitioned_table, ensure_partitions
 
 # --- 1. Configuration & Enums ---
 
@@ -29,71 +40,349 @@ DB_CONFIG = {
     DBClusterType.ANALYTICS: os.getenv("DB_ANALYTICS_URL", DEFAULT_DB_URL),
 }
 
-# --- 2. Engine Manager (Singleton-ish) ---
+# DB_READER_URL may list several replicas (comma-separated); reads are balanced across them
+DB_READER_URLS = [u.strip() for u in DB_CONFIG[DBClusterType.READER].split(",") if u.strip()]
+DB_CONFIG[DBClusterType.READER] = DB_READER_URLS[0]
+# Replicas lagging more than this (seconds) or failing probes are ejected until they recover
+DB_READER_MAX_LAG = float(os.getenv("DB_READER_MAX_LAG", "5"))
+DB_READER_PROBE_INTERVAL = float(os.getenv("DB_READER_PROBE_INTERVAL", "5"))
+# After a write, GETs from the same client go to the writer for this many seconds (0 = off)
+DB_READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "0"))
+
+# A replica that has replayed all the WAL it received is caught up: the age of its last
+# replayed transaction only measures how long the primary has been idle
+_REPLICATION_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+def _timed_pool(label: str) -> type:
+    """Queue pool that records how long each checkout waited (incl. connecting) under `label`."""
+    wait = DB_POOL_CHECKOUT_SECONDS.labels(label)
+
+    class TimedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                wait.observe(time.perf_counter() - start)
+
+    return TimedQueuePool
+
+def _create_engine(url: str, label: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=os.getenv("DB_ECHO", "False").lower() == "true",
+        future=True,
+        pool_pre_ping=False,
+        poolclass=_timed_pool(label),
+        pool_size=20,
+        max_overflow=10
+    )
+
+async def probe_replication_lag(engine: AsyncEngine) -> float:
+    """Health + lag probe: seconds behind the primary (0 for non-Postgres). Raises if unreachable."""
+    async with engine.connect() as conn:
+        if engine.dialect.name != "postgresql":
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+        return float((await conn.execute(_REPLICATION_LAG_SQL)).scalar() or 0.0)
+
+# --- 2. Reader Replica Pool ---
+
+class ReaderReplica:
+    def __init__(self, url: str, engine: AsyncEngine):
+        self.url = url
+        self.engine = engine
+        self.session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        self.outstanding = 0
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+class ReaderPool:
+    """
+    Least-outstanding-requests balancing over the reader replicas.
+    `probe()` ejects replicas that fail health checks or lag more than `max_lag` and
+    restores them once they recover; with no healthy replica, `acquire()` returns None and
+    callers fall back to the writer.
+    """
+
+    def __init__(
+        self,
+        replicas: List[ReaderReplica],
+        max_lag: float = DB_READER_MAX_LAG,
+        probe: Callable[[AsyncEngine], Awaitable[float]] = probe_replication_lag,
+    ):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self._probe = probe
+        self._rotation = itertools.count()
+
+    def acquire(self) -> Optional[ReaderReplica]:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        # Rotate the starting point so ties do not always favour the first replica
+        start = next(self._rotation) % len(healthy)
+        rotated = healthy[start:] + healthy[:start]
+        replica = min(rotated, key=lambda r: r.outstanding)
+        replica.outstanding += 1
+        return replica
+
+    def release(self, replica: Optional[ReaderReplica]) -> None:
+        if replica is not None:
+            replica.outstanding -= 1
+
+    async def probe(self) -> None:
+        results = await asyncio.gather(
+            *(self._probe(r.engine) for r in self.replicas), return_exceptions=True
+        )
+        for replica, result in zip(self.replicas, results):
+            was_healthy = replica.healthy
+            if isinstance(result, BaseException):
+                replica.healthy, replica.lag, replica.last_error = False, None, str(result)
+            else:
+                replica.lag = result
+                replica.healthy = result <= self.max_lag
+                replica.last_error = None if replica.healthy else f"lag {result:.1f}s"
+            if was_healthy != replica.healthy:
+                state = "restored" if replica.healthy else f"ejected ({replica.last_error})"
+                print(f"[DBManager] Reader replica {replica.url} {state}")
+
+    def status(self) -> List[dict]:
+        return [
+            {"url": r.url, "healthy": r.healthy, "lag": r.lag, "outstanding": r.outstanding}
+            for r in self.replicas
+        ]
+
+# --- 3. Engine Manager (Singleton-ish) ---
 
 class DBManager:
     def __init__(self):
         self.engines: Dict[DBClusterType, AsyncEngine] = {}
+        self.session_factories: Dict[DBClusterType, sessionmaker] = {}
+        self._reader_pool: Optional[ReaderPool] = None
 
     def get_engine(self, cluster_type: DBClusterType) -> AsyncEngine:
         if cluster_type not in self.engines:
             # Lazy initialization of engines
             url = DB_CONFIG.get(cluster_type, DEFAULT_DB_URL)
             print(f"[DBManager] Initializing engine for {cluster_type} -> {url}")
-            self.engines[cluster_type] = create_async_engine(
-                url,
-                echo=os.getenv("DB_ECHO", "False").lower() == "true",
-                future=True,
-                pool_pre_ping=False,
-                pool_size=20,
-                max_overflow=10
-            )
+            self.engines[cluster_type] = _create_engine(url, cluster_type.value)
         return self.engines[cluster_type]
 
+    @property
+    def reader_pool(self) -> ReaderPool:
+        if self._reader_pool is None:
+            replicas = [ReaderReplica(DB_READER_URLS[0], self.get_engine(DBClusterType.READER))]
+            for i, url in enumerate(DB_READER_URLS[1:], start=2):
+                print(f"[DBManager] Initializing engine for reader replica -> {url}")
+                replicas.append(ReaderReplica(url, _create_engine(url, f"{DBClusterType.READER.value}-{i}")))
+            self._reader_pool = ReaderPool(replicas)
+        return self._reader_pool
+
+    async def probe_readers(self) -> None:
+        await self.reader_pool.probe()
+
+    @asynccontextmanager
+    async def session(self, cluster_type: DBClusterType) -> AsyncIterator[AsyncSession]:
+        """Session on the given cluster; READER sessions are balanced across healthy replicas."""
+        if cluster_type != DBClusterType.READER:
+            async with self.get_session_factory(cluster_type)() as session:
+                yield session
+            return
+        pool = self.reader_pool
+        replica = pool.acquire()
+        factory = replica.session_factory if replica else self.get_session_factory(DBClusterType.WRITER)
+        try:
+            async with factory() as session:
+                yield session
+        finally:
+            pool.release(replica)
+
+    def get_session_factory(self, cluster_type: DBClusterType) -> sessionmaker:
+        # Built once per cluster; creating a sessionmaker per request is pure overhead
+        factory = self.session_factories.get(cluster_type)
+        if factory is None:
+            factory = sessionmaker(
+                self.get_engine(cluster_type), class_=AsyncSession, expire_on_commit=False
+            )
+            self.session_factories[cluster_type] = factory
+        return factory
+
+    def labelled_engines(self) -> Iterator[Tuple[str, AsyncEngine]]:
+        """Every engine created so far, labelled as in the pool metrics."""
+        for cluster_type, engine in list(self.engines.items()):
+            yield cluster_type.value, engine
+        if self._reader_pool is not None:
+            for i, replica in enumerate(self._reader_pool.replicas[1:], start=2):
+                yield f"{DBClusterType.READER.value}-{i}", replica.engine
+
     async def close_all(self):
-        for engine in self.engines.values():
+        self.session_factories.clear()
+        engines = list(self.engines.values())
+        if self._reader_pool is not None:
+            engines += [r.engine for r in self._reader_pool.replicas[1:]]
+            self._reader_pool = None
+        for engine in engines:
             await engine.dispose()
 
 db_manager = DBManager()
 
-# --- 3. Middleware for Routing Strategy ---
+class _PoolCollector:
+    """Pool usage gauges, read at scrape time so checkouts pay nothing for them."""
+
+    def collect(self):
+        in_use = GaugeMetricFamily("db_pool_connections_in_use", "Connections checked out", labels=["cluster"])
+        idle = GaugeMetricFamily("db_pool_connections_idle", "Connections idle in the pool", labels=["cluster"])
+        for label, engine in db_manager.labelled_engines():
+            pool = engine.sync_engine.pool
+            in_use.add_metric([label], pool.checkedout())
+            idle.add_metric([label], pool.checkedin())
+        yield in_use
+        yield idle
+
+REGISTRY.register(_PoolCollector())
+
+# --- 4. Middleware for Routing Strategy ---
+
+_TARGETS_BY_HEADER = {t.value: t for t in DBClusterType}
+# client key -> time of its last write (read-your-writes window)
+_recent_writers = LRUCache(maxsize=100_000, ttl=DB_READ_YOUR_WRITES_WINDOW or None)
+
+def _client_key(scope: Scope) -> Optional[str]:
+    # No IP fallback: behind the load balancer every request shares its address
+    for name, value in scope["headers"]:
+        if name == b"x-client-id":
+            return value.decode("latin-1")
+    return None
+
+class DBRoutingMiddleware:
+    """
+    Pure ASGI middleware: no per-request task or body stream wrapping (unlike BaseHTTPMiddleware).
+    Strategy:
+    - GET requests -> READER (default)
+    - POST/PUT/DELETE -> WRITER
+    - Specific headers can override (e.g. X-DB-Target: analytics)
+    - With DB_READ_YOUR_WRITES_WINDOW, GETs shortly after a write from the same client
+      (X-Client-Id) go to the WRITER
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
 
-class DBRoutingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Strategy: 
-        # - GET requests -> READER (default)
-        # - POST/PUT/DELETE -> WRITER
-        # - Specific headers can override (e.g. X-DB-Target: analytics)
-        
         target = DBClusterType.WRITER # Default safe
-        
-        method = request.method
-        if method == "GET":
+
+        # WebSocket handshakes are GETs
+        if scope.get("method", "GET") == "GET":
             target = DBClusterType.READER
-        
+            if DB_READ_YOUR_WRITES_WINDOW and _recent_writers.get(_client_key(scope)):
+                target = DBClusterType.WRITER
+        elif DB_READ_YOUR_WRITES_WINDOW:
+            client = _client_key(scope)
+            if client:
+                _recent_writers.set(client, time.monotonic())
+
         # Header override
-        if "X-DB-Target" in request.headers:
-            requested_target = request.headers["X-DB-Target"].lower()
-            if requested_target in [t.value for t in DBClusterType]:
-                target = DBClusterType(requested_target)
-                
+        for name, value in scope["headers"]:
+            if name == b"x-db-target":
+                target = _TARGETS_BY_HEADER.get(value.decode("latin-1").lower(), target)
+                break
+
         # Set context
         token = _db_cluster_ctx.set(target)
-        
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send)
         finally:
             _db_cluster_ctx.reset(token)
 
-# --- 4. Session Factory & Dependency ---
+# --- 5. Session Factory & Dependency ---
+
+# Full-text search over feedback.message, maintained by the database on every insert/update
+_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE feedback ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', coalesce(message, ''))) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_feedback_search_vector ON feedback USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5("
+        "message, content='feedback', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS feedback_fts_insert AFTER INSERT ON feedback BEGIN "
+        "INSERT INTO feedback_fts(rowid, message) VALUES (new.id, new.message); END",
+        "CREATE TRIGGER IF NOT EXISTS feedback_fts_delete AFTER DELETE ON feedback BEGIN "
+        "INSERT INTO feedback_fts(feedback_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+        "CREATE TRIGGER IF NOT EXISTS feedback_fts_update AFTER UPDATE OF message ON feedback BEGIN "
+        "INSERT INTO feedback_fts(feedback_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+        "INSERT INTO feedback_fts(rowid, message) VALUES (new.id, new.message); END",
+    ],
+}
+
+async def install_search_index(conn) -> None:
+    """
+    Postgres: generated tsvector column + GIN index. SQLite: external-content FTS5 table
+    kept in sync by triggers (rebuilt from existing rows when first created).
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        exists = (await conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'")
+        )).first()
+    for statement in _SEARCH_DDL.get(dialect, []):
+        await conn.execute(text(statement))
+    if dialect == "sqlite" and not exists:
+        await conn.execute(text("INSERT INTO feedback_fts(feedback_fts) VALUES ('rebuild')"))
+
+def _add_missing_columns(conn) -> None:
+    """
+    create_all does not alter existing tables: add model columns missing from them.
+    Only nullable columns without server defaults qualify, which is what new model fields are.
+    """
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+# Postgres: feedback is range-partitioned by month on created_at (new databases only)
+FEEDBACK_PARTITIONING = os.getenv("FEEDBACK_PARTITIONING", "true").lower() == "true"
+# Monthly partitions kept created ahead of the current month
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+
+def install_partitions(conn) -> bool:
+    """Creates the partitioned feedback table if missing, plus this month's and upcoming partitions."""
+    table = SQLModel.metadata.tables.get("feedback")
+    if conn.dialect.name != "postgresql" or not FEEDBACK_PARTITIONING or table is None:
+        return False
+    if not create_partitioned_table(conn, table, "created_at"):
+        print("[DB] feedback exists unpartitioned; leaving it as is")
+        return False
+    ensure_partitions(conn, table.name, datetime.utcnow(), PARTITION_PREMAKE_MONTHS + 1)
+    return True
 
 async def init_db():
     # Initialize schemas on the WRITER node (others usually replicate)
     writer_engine = db_manager.get_engine(DBClusterType.WRITER)
     async with writer_engine.begin() as conn:
         # await conn.run_sync(SQLModel.metadata.drop_all) 
+        # Before create_all, which then leaves the (partitioned) feedback table alone
+        await conn.run_sync(install_partitions)
         await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await install_search_index(conn)
 
 async def get_session() -> AsyncSession:
     """
@@ -101,11 +390,14 @@ async def get_session() -> AsyncSession:
     Automatically picks the right engine based on Middleware decision.
     """
     cluster_type = _db_cluster_ctx.get()
-    engine = db_manager.get_engine(cluster_type)
-    
-    async_session_factory = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-    
-    async with async_session_factory() as session:
+    async with db_manager.session(cluster_type) as session:
+        yield session
+
+@asynccontextmanager
+async def session_scope(cluster_type: Optional[DBClusterType] = None) -> AsyncIterator[AsyncSession]:
+    """
+    Session outside of request dependencies (background jobs, deferred cache refreshes).
+    Defaults to the cluster chosen for the current context.
+    """
+    async with db_manager.session(cluster_type or _db_cluster_ctx.get()) as session:
         yield session
@@ -0,0 +1,209 @@
+"""
+Idempotency keys: a retried request carrying the same `Idempotency-Key` gets the first
+attempt's response instead of repeating its work.
+
+The first request claims the key in Redis (SET NX, expiring after IDEMPOTENCY_LOCK_TTL
+seconds in case its replica dies, renewed every third of that while it runs) and runs;
+its response is stored for IDEMPOTENCY_TTL seconds. Duplicates that arrive while it runs wait for it: on a shared future when it runs
+in the same process, otherwise by polling Redis for up to IDEMPOTENCY_WAIT seconds, after
+which they are told to retry later. When Redis is unavailable, keys and responses are
+kept in process only.
+
+A key reused with a different request is rejected. A failed attempt stores nothing and
+releases its claim, so the client can retry it.
+"""
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+import orjson
+from app.core.cache import LRUCache, delete_if_equal, get_redis, pexpire_if_equal
+from app.core.metrics import CACHE_ERRORS, CACHE_LOOKUPS
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("IDEMPOTENCY_LOCK_TTL", "30"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "10"))
+IDEMPOTENCY_LOCAL_SIZE = int(os.getenv("IDEMPOTENCY_LOCAL_SIZE", "10000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+_POLL_INTERVAL = 0.05
+
+class InvalidIdempotencyKey(Exception):
+    pass
+
+class IdempotencyKeyReused(Exception):
+    def __init__(self, key: str):
+        super().__init__(f"Idempotency-Key {key!r} was already used for a different request")
+
+class RequestInProgress(Exception):
+    def __init__(self, key: str, retry_after: float = 1.0):
+        super().__init__(f"A request with Idempotency-Key {key!r} is still in progress")
+        self.retry_after = retry_after
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: Any
+    headers: Dict[str, str]
+
+def request_hash(payload: Any) -> str:
+    """Digest of the request a key was first used for (any orjson-serializable value)."""
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+def validate_key(key: str) -> str:
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH or not key.isprintable():
+        raise InvalidIdempotencyKey(
+            f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} printable characters"
+        )
+    return key
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        ttl: int = IDEMPOTENCY_TTL,
+        lock_ttl: float = IDEMPOTENCY_LOCK_TTL,
+        wait: float = IDEMPOTENCY_WAIT,
+        local_size: int = IDEMPOTENCY_LOCAL_SIZE,
+    ):
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        # key -> (request hash, StoredResponse)
+        self.local = LRUCache(maxsize=local_size, ttl=ttl)
+        # key -> (request hash, future of the attempt running in this process)
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self, key: str, request: str, compute: Callable[[], Awaitable[StoredResponse]]
+    ) -> Tuple[StoredResponse, bool]:
+        """
+        The response for `key`: computed by `compute()` the first time, then replayed.
+        Returns (response, replayed). Raises IdempotencyKeyReused when `request` (a
+        request_hash) differs from the first one, RequestInProgress when another replica's
+        attempt outlasts the wait.
+        """
+        stored = self.local.get(key)
+        if stored is not None:
+            _check(key, request, stored[0])
+            CACHE_LOOKUPS.labels("idempotency", "local").inc()
+            return stored[1], True
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            _check(key, request, inflight[0])
+            CACHE_LOOKUPS.labels("idempotency", "inflight").inc()
+            try:
+                return await asyncio.shield(inflight[1]), True
+            except asyncio.CancelledError:
+                if not inflight[1].cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The first attempt was abandoned: take over
+                return await self.run(key, request, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (request, future)
+        try:
+            response, replayed = await self._run_claimed(key, request, compute)
+            future.set_result(response)
+            return response, replayed
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run_claimed(
+        self, key: str, request: str, compute: Callable[[], Awaitable[StoredResponse]]
+    ) -> Tuple[StoredResponse, bool]:
+        deadline = time.monotonic() + self.wait
+        while True:
+            claim = await self._claim(key, request)
+            if claim is not None:
+                break
+            # Claimed elsewhere: wait for that attempt's response
+            record = await self._load(key)
+            if record is not None:
+                _check(key, request, record.get("request"))
+                if "status" in record:
+                    response = StoredResponse(record["status"], record["body"], record["headers"])
+                    self.local.set(key, (request, response))
+                    CACHE_LOOKUPS.labels("idempotency", "redis").inc()
+                    return response, True
+            if time.monotonic() >= deadline:
+                raise RequestInProgress(key)
+            await asyncio.sleep(_POLL_INTERVAL)
+
+        CACHE_LOOKUPS.labels("idempotency", "miss").inc()
+        heartbeat = asyncio.create_task(self._renew(key, claim)) if claim else None
+        try:
+            response = await compute()
+        except BaseException:
+            await self._release(key, claim)
+            raise
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+        await self._store(key, request, response)
+        return response, False
+
+    async def _claim(self, key: str, request: str) -> Optional[str]:
+        """
+        Returns the claim (the value set, unique per attempt) if claimed, "" if Redis is
+        unavailable (proceed locally), None if claimed elsewhere.
+        """
+        claim = orjson.dumps({"request": request, "token": uuid.uuid4().hex}).decode()
+        try:
+            claimed = await get_redis().set(f"idempotency:{key}", claim, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception:
+            CACHE_ERRORS.labels("idempotency_claim").inc()
+            return ""
+        return claim if claimed else None
+
+    async def _renew(self, key: str, claim: str) -> None:
+        """Keeps the claim from expiring while the attempt runs, however long it takes."""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                if not await pexpire_if_equal(f"idempotency:{key}", claim, int(self.lock_ttl * 1000)):
+                    return
+            except Exception:
+                CACHE_ERRORS.labels("idempotency_renew").inc()
+
+    async def _load(self, key: str) -> Optional[dict]:
+        try:
+            raw = await get_redis().get(f"idempotency:{key}")
+        except Exception:
+            CACHE_ERRORS.labels("idempotency_get").inc()
+            return None
+        if raw is None:
+            return None
+        try:
+            return orjson.loads(raw)
+        except ValueError:
+            return None
+
+    async def _release(self, key: str, claim: str) -> None:
+        if not claim:
+            return
+        try:
+            await delete_if_equal(f"idempotency:{key}", claim)
+        except Exception:
+            CACHE_ERRORS.labels("idempotency_release").inc()
+
+    async def _store(self, key: str, request: str, response: StoredResponse) -> None:
+        self.local.set(key, (request, response))
+        record = {"request": request, "status": response.status_code, "body": response.body, "headers": response.headers}
+        try:
+            await get_redis().set(f"idempotency:{key}", orjson.dumps(record), ex=self.ttl)
+        except Exception:
+            CACHE_ERRORS.labels("idempotency_store").inc()
+
+def _check(key: str, request: str, first: Optional[str]) -> None:
+    if first != request:
+        raise IdempotencyKeyReused(key)
+
+# Shared by the endpoints of the process
+idempotency_keys = IdempotencyStore()
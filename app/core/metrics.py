@@ -0,0 +1,52 @@
+"""
+Prometheus metrics, served at /metrics.
+
+All series are module-level so the hot path only pays a label lookup and an increment;
+gauges that can be read off existing state (DB pool usage) are collected at scrape time
+instead of being maintained on every checkout.
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Stage latencies are mostly sub-10ms (commit, publish) with a long AI tail
+_STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+FEEDBACK_STAGE_SECONDS = Histogram(
+    "feedback_stage_seconds",
+    "Time spent in each stage of feedback ingestion",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+CACHE_ERRORS = Counter("cache_errors_total", "Redis cache operations that failed", ["operation"])
+AI_FALLBACKS = Counter("ai_fallbacks_total", "LLM analyses answered by the local classifier instead", ["reason"])
+AI_CASCADE = Counter("ai_cascade_total", "Cascade decisions per endpoint and answering tier", ["endpoint", "tier"])
+PUBLISH_FAILURES = Counter(
+    "queue_publish_failures_total", "Events not confirmed by the broker, by outcome", ["outcome"]
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total", "Requests rejected by rate limits (429) or load shedding (503)", ["reason"]
+)
+PROFILE_WRITE_FAILURES = Counter("profile_write_failures_total", "Request profiles that could not be written")
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time waiting for a pooled DB connection",
+    ["cluster"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Observes the duration of the block into feedback_stage_seconds{stage=...}."""
+    histogram = FEEDBACK_STAGE_SECONDS.labels(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+def render_metrics() -> tuple:
+    """(body, content type) of the text exposition format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,115 @@
+"""
+Monthly range partitioning (Postgres) of time-ordered tables.
+
+The parent table is created `PARTITION BY RANGE (<key>)` from its SQLModel definition. The
+key has to be part of every unique constraint on a partitioned table, so the primary key
+becomes (id, <key>); ids still come from the same sequence. Partitions are named
+`<table>_yYYYYmMM` and cover one calendar month; a DEFAULT partition catches rows outside
+the created range. Queries filtering on the key are pruned to the matching partitions.
+"""
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, text
+
+_PARTITION_NAME = re.compile(r"_y(\d{4})m(\d{2})$")
+# How long a plain DETACH may wait for its lock before giving up until the next run
+_DETACH_LOCK_TIMEOUT = "5s"
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+def partitioned_copy(table: Table, key: str) -> Table:
+    """Copy of `table` for Postgres: range-partitioned on `key`, which joins the primary key."""
+    copy = table.to_metadata(MetaData())
+    for column in copy.primary_key.columns:
+        column.autoincrement = True
+    copy.c[key].primary_key = True
+    copy.primary_key = PrimaryKeyConstraint(*copy.primary_key.columns, copy.c[key])
+    copy.dialect_options["postgresql"]["partition_by"] = f"RANGE ({key})"
+    return copy
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    ).first() is not None
+
+def create_partitioned_table(conn, table: Table, key: str) -> bool:
+    """Creates `table` partitioned by month unless it exists. False if it exists unpartitioned."""
+    if conn.dialect.has_table(conn, table.name):
+        return is_partitioned(conn, table.name)
+    partitioned_copy(table, key).create(conn)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {default_partition_name(table.name)} PARTITION OF {table.name} DEFAULT"
+    ))
+    return True
+
+def ensure_partitions(conn, table: str, start: datetime, months: int) -> List[str]:
+    """Creates the monthly partitions from `start`'s month for `months` months (existing ones are kept)."""
+    created = []
+    month = month_start(start)
+    for _ in range(months):
+        name = partition_name(table, month)
+        upper = add_months(month, 1)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        created.append(name)
+        month = upper
+    return created
+
+def list_partitions(conn, table: str) -> List[Tuple[str, datetime]]:
+    """Monthly partitions of `table` as (name, month start), oldest first."""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": table}).scalars()
+    months = []
+    for name in rows:
+        match = _PARTITION_NAME.search(name)
+        if match:
+            months.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(months, key=lambda partition: partition[1])
+
+def has_default_partition(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table) AND partdefid <> 0"),
+        {"table": table},
+    ).first() is not None
+
+def detach_partition(conn, table: str, name: str) -> None:
+    """
+    Detaches partition `name` from `table` so it can be dropped without locking the parent.
+    Runs on an AUTOCOMMIT connection: DETACH ... CONCURRENTLY only waits for the queries
+    already running. Postgres refuses CONCURRENTLY while the table has a DEFAULT partition;
+    the plain DETACH used then gives up after _DETACH_LOCK_TIMEOUT instead of queueing
+    every query on the table behind it.
+    """
+    pending: Optional[bool] = conn.execute(
+        text("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if pending is None:
+        return
+    if pending:
+        # An interrupted concurrent detach
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} FINALIZE"))
+    elif not has_default_partition(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY"))
+    else:
+        conn.execute(text(f"SET lock_timeout = '{_DETACH_LOCK_TIMEOUT}'"))
+        try:
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        finally:
+            conn.execute(text("RESET lock_timeout"))
@@ -0,0 +1,105 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A request is profiled when it carries `X-Profile: 1` (only honoured with
+PROFILE_HEADER_ENABLED=true) or is picked by PROFILE_SAMPLE_RATE. A daemon thread then
+samples the event loop thread's stack every PROFILE_INTERVAL_MS until the response is sent
+and writes the samples in collapsed-stack format (flamegraph.pl / speedscope) to
+PROFILE_DIR; the file name is returned in the `X-Profile-File` header.
+
+The loop thread is shared, so samples also include whatever other requests ran meanwhile;
+profile on a quiet instance for a clean picture. When idle the middleware costs one flag check.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from typing import Optional
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import PROFILE_WRITE_FAILURES
+
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+# One profile at a time: concurrent samplers of the same thread would only duplicate work
+_active = threading.Lock()
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _requested(self, scope: Scope) -> bool:
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            return True
+        return PROFILE_HEADER_ENABLED and any(
+            name == b"x-profile" and value not in (b"", b"0") for name, value in scope.get("headers", ())
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._requested(scope) or not _active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{scope['path'].strip('/').replace('/', '_')}.folded"
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"x-profile-file", name.encode())]
+            await send(message)
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            profiler.stop()
+            # Off the loop, and never in place of the request's own outcome; the next profile
+            # starts only once this one is on disk
+            try:
+                await asyncio.to_thread(_write_profile, name, profiler.collapsed())
+            except OSError as e:
+                PROFILE_WRITE_FAILURES.inc()
+                print(f"[Profiling] Could not write {name}: {e}")
+            finally:
+                _active.release()
+
+def _write_profile(name: str, collapsed: str) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(collapsed)
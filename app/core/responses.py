@@ -0,0 +1,13 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-rendered response for plain dict payloads (stats, reports).
+    Returned directly from an endpoint it also skips FastAPI's jsonable_encoder pass;
+    endpoints with a response_model are already serialized by Pydantic and do not need it.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,26 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+class StartupReport:
+    """Durations of the startup steps (ms), logged once startup completes."""
+
+    def __init__(self):
+        self.steps: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = round((time.perf_counter() - start) * 1e3, 1)
+
+    def summary(self) -> dict:
+        return {"total_ms": round((time.perf_counter() - self._started) * 1e3, 1), "steps": dict(self.steps)}
+
+    def log(self) -> None:
+        summary = self.summary()
+        steps = ", ".join(f"{name} {ms}ms" for name, ms in summary["steps"].items())
+        print(f"[Startup] ready in {summary['total_ms']}ms ({steps})")
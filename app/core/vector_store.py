@@ -0,0 +1,254 @@
+"""
+Append-only, memory-mapped float32 vector store with an IVF (inverted file) coarse index.
+
+Files in the store directory:
+- vectors.f32    row-major float32 vectors
+- lists.i32      IVF list of each row (-1 until the index is trained)
+- ids.i64        external id of each row; written last, so its length is the row count
+- trained.i64    row count the centroids were trained on
+- centroids.npy  IVF centroids
+
+Opening the store maps the files instead of reading them; only the centroids and a row
+ordering by list (int64 per row) live in RAM. Similarity is the inner product, so callers
+should add L2-normalised vectors for cosine similarity. Appends from several processes are
+serialised with flock, and every process picks up the others' rows on its next search.
+
+Appends never train: `needs_training` turns true once the store holds `train_size` rows,
+or VECTOR_RETRAIN_GROWTH times the rows of the last training, and `train()` (run off the
+request path) clusters a snapshot without holding the lock, which is only taken to assign
+the rows appended meanwhile and swap the files. Until then searches scan every row, or
+use the previous centroids.
+"""
+import os
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+VECTOR_IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "256"))
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+VECTOR_TRAIN_SAMPLE = 50_000
+# Retrain once the store has grown this many times over since the last training
+VECTOR_RETRAIN_GROWTH = float(os.getenv("VECTOR_RETRAIN_GROWTH", "2"))
+# Rows appended after the list ordering was built are scanned linearly up to this many
+_TAIL_REBUILD_ROWS = 65_536
+_CHUNK_ROWS = 65_536
+
+class VectorStore:
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        n_lists: int = VECTOR_IVF_LISTS,
+        nprobe: int = VECTOR_IVF_NPROBE,
+        train_size: Optional[int] = None,
+    ):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        # ~40 points per centroid is the usual minimum for a stable k-means
+        self.train_size = train_size or n_lists * 40
+        self._lock = threading.RLock()
+        self._count = 0
+        self._vectors = np.empty((0, dim), np.float32)
+        self._lists = np.empty(0, np.int32)
+        self._ids = np.empty(0, np.int64)
+        self._centroids: Optional[np.ndarray] = None
+        self._centroids_mtime: Optional[int] = None
+        self._trained_rows = 0
+        self._order = np.empty(0, np.int64)
+        self._offsets = np.zeros(1, np.int64)
+        self._indexed = 0
+        self.refresh()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return self._count
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def needs_training(self) -> bool:
+        self.refresh()
+        if not self.trained:
+            return self._count >= self.train_size
+        return self._count >= self._trained_rows * VECTOR_RETRAIN_GROWTH
+
+    def ids(self) -> np.ndarray:
+        """External ids of every row, in append order."""
+        self.refresh()
+        with self._lock:
+            return np.array(self._ids)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock, open(self._file("store.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _map(self, name: str, dtype, shape: tuple) -> np.ndarray:
+        if shape[0] == 0:
+            return np.empty(shape, dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+
+    def refresh(self) -> None:
+        """Picks up rows appended, or an index trained, by this or another process."""
+        with self._lock:
+            ids_path, centroids_path = self._file("ids.i64"), self._file("centroids.npy")
+            count = os.path.getsize(ids_path) // 8 if os.path.exists(ids_path) else 0
+            mtime = os.stat(centroids_path).st_mtime_ns if os.path.exists(centroids_path) else None
+            retrained = mtime != self._centroids_mtime
+            if retrained:
+                self._centroids = np.load(centroids_path) if mtime is not None else None
+                self._centroids_mtime = mtime
+                trained_path = self._file("trained.i64")
+                self._trained_rows = (
+                    int(np.fromfile(trained_path, np.int64)[0]) if os.path.exists(trained_path) else count
+                )
+            if count == self._count and not retrained:
+                return
+            self._count = count
+            self._vectors = self._map("vectors.f32", np.float32, (count, self.dim))
+            self._lists = self._map("lists.i32", np.int32, (count,))
+            self._ids = self._map("ids.i64", np.int64, (count,))
+            if self.trained and (retrained or count - self._indexed > _TAIL_REBUILD_ROWS):
+                self._build_lists()
+
+    def _build_lists(self) -> None:
+        lists = np.asarray(self._lists)
+        self._order = np.argsort(lists, kind="stable")
+        self._offsets = np.searchsorted(lists[self._order], np.arange(len(self._centroids) + 1))
+        self._indexed = len(lists)
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + _CHUNK_ROWS] @ centroids.T, axis=1).astype(np.int32)
+            for start in range(0, len(vectors), _CHUNK_ROWS)
+        ]) if len(vectors) else np.empty(0, np.int32)
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors differ in length")
+        with self._exclusive():
+            self.refresh()
+            lists = (
+                self._assign(vectors, self._centroids) if self.trained
+                else np.full(len(vectors), -1, np.int32)
+            )
+            for name, array in (("vectors.f32", vectors), ("lists.i32", lists), ("ids.i64", ids)):
+                with open(self._file(name), "ab") as f:
+                    # Drop any partial append left behind by a crash
+                    f.truncate(self._count * array.itemsize * (self.dim if array.ndim == 2 else 1))
+                    f.write(array.tobytes())
+            self.refresh()
+
+    def train(self) -> None:
+        """
+        (Re)trains the IVF centroids and reassigns every row. Slow (k-means): run it in the
+        background. Searches and appends go on meanwhile.
+        """
+        self.refresh()
+        with self._lock:
+            rows, vectors = self._count, self._vectors
+        if rows == 0:
+            return
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(rows, size=min(rows, VECTOR_TRAIN_SAMPLE), replace=False))
+        centroids = _spherical_kmeans(np.asarray(vectors[sample_rows]), self.n_lists, rng)
+        lists = self._assign_rows(vectors, 0, rows, centroids)
+        with self._exclusive():
+            self.refresh()
+            # Rows appended while training
+            lists = np.concatenate([lists, self._assign_rows(self._vectors, rows, self._count, centroids)])
+            # Lists first, centroids last: a new centroids file tells readers to remap
+            for name, write in (
+                ("lists.i32", lambda f: f.write(lists.tobytes())),
+                ("trained.i64", lambda f: f.write(np.int64(rows).tobytes())),
+                ("centroids.npy", lambda f: np.save(f, centroids)),
+            ):
+                tmp = self._file(name + ".tmp")
+                with open(tmp, "wb") as f:
+                    write(f)
+                os.replace(tmp, self._file(name))
+            self.refresh()
+
+    def _assign_rows(self, vectors: np.ndarray, start: int, stop: int, centroids: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.empty(0, np.int32)] + [
+            self._assign(np.asarray(vectors[chunk:min(chunk + _CHUNK_ROWS, stop)]), centroids)
+            for chunk in range(start, stop, _CHUNK_ROWS)
+        ])
+
+    def search(self, vector: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-k (id, score) by inner product, probing the `nprobe` nearest IVF lists."""
+        self.refresh()
+        with self._lock:
+            count, vectors, lists, ids = self._count, self._vectors, self._lists, self._ids
+            centroids, order, offsets, indexed = self._centroids, self._order, self._offsets, self._indexed
+        query = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        if count == 0:
+            return []
+        if centroids is None:
+            return self._top_k_scan(query, k, vectors, ids)
+
+        nprobe = min(nprobe or self.nprobe, len(centroids))
+        probed = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        tail = np.arange(indexed, count)
+        candidates = [order[offsets[l]:offsets[l + 1]] for l in probed]
+        candidates.append(tail[np.isin(lists[indexed:count], probed)])
+        # Sorted rows turn the gather into a forward pass over the mapped file
+        rows = np.sort(np.concatenate(candidates))
+        return _top_k(np.asarray(vectors[rows]) @ query, rows, k, ids)
+
+    def brute_force(self, vector: np.ndarray, k: int = 10) -> List[Tuple[int, float]]:
+        """Exact top-k over every row (the recall baseline for the IVF search)."""
+        self.refresh()
+        with self._lock:
+            vectors, ids = self._vectors, self._ids
+        return self._top_k_scan(np.asarray(vector, dtype=np.float32).reshape(self.dim), k, vectors, ids)
+
+    @staticmethod
+    def _top_k_scan(query: np.ndarray, k: int, vectors: np.ndarray, ids: np.ndarray) -> List[Tuple[int, float]]:
+        best_scores = np.empty(0, np.float32)
+        best_rows = np.empty(0, np.int64)
+        for start in range(0, len(vectors), _CHUNK_ROWS):
+            scores = np.asarray(vectors[start:start + _CHUNK_ROWS]) @ query
+            best_scores = np.concatenate([best_scores, scores])
+            best_rows = np.concatenate([best_rows, np.arange(start, start + len(scores))])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+        return _top_k(best_scores, best_rows, k, ids)
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int, ids: np.ndarray) -> List[Tuple[int, float]]:
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[keep], rows[keep]
+    ranked = np.argsort(-scores, kind="stable")
+    return [(int(ids[rows[i]]), float(scores[i])) for i in ranked]
+
+def _spherical_kmeans(sample: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 10) -> np.ndarray:
+    k = min(k, len(sample))
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=k) == 0
+        # Re-seed empty lists from random points
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
@@ -1,9 +1,22 @@
-from fastapi import FastAPI
+import math
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from app.api.v1.api import api_router
 from app.microservices.loader import load_microservices
-from app.core.database import init_db, DBRoutingMiddleware
-from app.core.queue import init_rabbit
-from app.microservices.queuehealth.service import service as queue_service
+from app.core.database import init_db, db_manager, DBRoutingMiddleware, DB_READER_PROBE_INTERVAL
+from app.core.queue import EventPublisher, add_event_listener, get_publisher, init_rabbit, use_publisher
+from app.core.admission import RATE_LIMIT_SYNC_INTERVAL, Overloaded, RateLimited, sync_rate_limits
+from app.core.background import start_once, start_periodic, stop_all
+from app.core.startup import StartupReport
+from app.core.metrics import render_metrics
+from app.core.profiling import ProfilingMiddleware
+from app.services.dashboard_stats import STATS_RECONCILE_INTERVAL, run_reconciliation
+from app.services.stats_rollup import ROLLUP_INTERVAL, run_rollup
+from app.services.live_stats import STREAM_COALESCE_MS, get_broadcaster
+from app.services.insights import INSIGHTS_ENABLED, INSIGHTS_FLUSH_INTERVAL, flush_insights, observe_event
+from app.services.retention import PARTITION_MAINTENANCE_INTERVAL, run_partition_maintenance
+from app.services.outbox import OUTBOX_RELAY_INTERVAL, relay_outbox, spill_to_outbox
+from app.services.similarity import VECTOR_TRAIN_INTERVAL, train_vector_index
 
 app = FastAPI(
     title="Smart Feedback Analysis Service",
@@ -13,16 +26,60 @@ app = FastAPI(
 
 # Register DB Routing Middleware
 app.add_middleware(DBRoutingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(RateLimited)
+@app.exception_handler(Overloaded)
+async def admission_error_handler(request: Request, exc: Exception):
+    status_code = 429 if isinstance(exc, RateLimited) else 503
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
 
 @app.on_event("startup")
 async def on_startup():
-    await init_db()
-    await init_rabbit()
-    load_microservices(app)
-    app.include_router(queue_service.router, prefix=queue_service.prefix)
+    report = StartupReport()
+    with report.step("init_db"):
+        await init_db()
+    # The broker is not needed to serve: events buffer/spill until it is reachable
+    start_once("init_rabbit", lambda: _init_rabbit(report))
+    use_publisher(EventPublisher(spill=spill_to_outbox)).start()
+    load_microservices(app, report)
+    start_periodic("stats_reconciliation", STATS_RECONCILE_INTERVAL, run_reconciliation)
+    start_periodic("stats_rollup", ROLLUP_INTERVAL, run_rollup)
+    start_periodic("outbox_relay", OUTBOX_RELAY_INTERVAL, relay_outbox)
+    start_periodic("reader_probe", DB_READER_PROBE_INTERVAL, db_manager.probe_readers)
+    start_periodic("partition_maintenance", PARTITION_MAINTENANCE_INTERVAL, run_partition_maintenance)
+    start_periodic("rate_limit_sync", RATE_LIMIT_SYNC_INTERVAL, sync_rate_limits)
+    start_periodic("vector_index_training", VECTOR_TRAIN_INTERVAL, train_vector_index)
+    add_event_listener(get_broadcaster().observe)
+    start_periodic("dashboard_stream", STREAM_COALESCE_MS / 1000, get_broadcaster().tick)
+    if INSIGHTS_ENABLED:
+        add_event_listener(observe_event)
+        start_periodic("insights_flush", INSIGHTS_FLUSH_INTERVAL, flush_insights)
+    app.state.startup = report
+    report.log()
+
+async def _init_rabbit(report: StartupReport):
+    with report.step("init_rabbit"):
+        await init_rabbit()
+    print(f"[Startup] init_rabbit finished in the background in {report.steps['init_rabbit']}ms")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_all()
+    await flush_insights()
+    await get_publisher().close()
 
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
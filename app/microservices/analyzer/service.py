@@ -1,19 +1,38 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
-from app.services.ai_service import AIService
+from app.core.admission import admit, ai_stage, client_ip
+from app.services.ai_service import get_ai_service
+from app.services.analysis_cache import analysis_cache
+from app.services.near_duplicates import near_duplicates
 
 router = APIRouter()
 
 class AnalysisRequest(BaseModel):
     message: str
 
-ai = AIService()
+ai = get_ai_service()
 
 @router.post("/analyze")
-async def analyze(req: AnalysisRequest):
-    result = await ai.analyze_feedback(req.message)
+async def analyze(req: AnalysisRequest, request: Request):
+    admit(client_ip(request))
+    async with ai_stage.slot():
+        result = await ai.analyze_feedback(req.message, endpoint="analyzer")
     return result
 
+@router.get("/cascade")
+async def cascade_stats():
+    """Per endpoint: messages answered by the local classifier vs escalated to the LLM."""
+    return ai.cascade_stats()
+
+@router.get("/cache")
+async def cache_stats():
+    return analysis_cache.stats()
+
+@router.get("/near-duplicates")
+async def near_duplicate_stats():
+    """Ingested messages that reused a near-duplicate's analysis instead of being analyzed."""
+    return near_duplicates.stats()
+
 class AnalyzerService:
     name = "analyzer"
     prefix = "/services/analyzer"
@@ -1,18 +1,30 @@
+import os
 import importlib
 import pkgutil
-from typing import List
+from typing import List, Optional
 from fastapi import FastAPI
+from app.core.startup import StartupReport
 from .base import Microservice
 
-def load_microservices(app: FastAPI) -> List[str]:
+# Comma-separated subpackages to mount (e.g. "analyzer,echo"); unset or "*" mounts all of them.
+# Packages left out are never imported.
+MICROSERVICES = os.getenv("MICROSERVICES", "*")
+
+def microservice_enabled(name: str, setting: Optional[str] = None) -> bool:
+    names = {n.strip() for n in (setting if setting is not None else MICROSERVICES).split(",") if n.strip()}
+    return not names or "*" in names or name in names
+
+def load_microservices(app: FastAPI, report: Optional[StartupReport] = None) -> List[str]:
     loaded = []
+    report = report or StartupReport()
     pkg_name = __package__ or "app.microservices"
     package = importlib.import_module(pkg_name)
     for mod in pkgutil.iter_modules(package.__path__):
         name = mod.name
-        if name in {"base", "loader"}:
+        if name in {"base", "loader"} or not microservice_enabled(name):
             continue
-        module = importlib.import_module(f"{pkg_name}.{name}.service")
+        with report.step(f"service:{name}"):
+            module = importlib.import_module(f"{pkg_name}.{name}.service")
         service: Microservice = getattr(module, "service")
         app.include_router(service.router, prefix=service.prefix)
         loaded.append(service.name)
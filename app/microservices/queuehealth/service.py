@@ -1,12 +1,12 @@
 from fastapi import APIRouter
-from app.core.queue import init_rabbit
+from app.core.queue import get_publisher, init_rabbit
 
 router = APIRouter()
 
 @router.get("/health")
 async def health():
     await init_rabbit()
-    return {"queue": "ok"}
+    return {"queue": "ok", "publisher": get_publisher().stats()}
 
 class QueueHealthService:
     name = "queue"
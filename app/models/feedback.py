@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
+from sqlalchemy import BigInteger
 from sqlmodel import Field, SQLModel
 
 class Sentiment(str, Enum):
@@ -23,6 +24,13 @@ class Feedback(FeedbackBase, table=True):
     sentiment: Optional[Sentiment] = Field(default=None, index=True)
     category: Optional[Category] = Field(default=None, index=True)
     summary: Optional[str] = Field(default=None)
+    # Cascade tier that produced the analysis ("rules" or "llm") and the local confidence
+    analysis_tier: Optional[str] = Field(default=None)
+    analysis_confidence: Optional[float] = Field(default=None)
+    # 64-bit b-bit MinHash fingerprint of the message (signed), and the row whose analysis a
+    # near-duplicate reused
+    fingerprint: Optional[int] = Field(default=None, sa_type=BigInteger)
+    duplicate_of: Optional[int] = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class FeedbackCreate(FeedbackBase):
@@ -33,4 +41,23 @@ class FeedbackRead(FeedbackBase):
     sentiment: Optional[Sentiment]
     category: Optional[Category]
     summary: Optional[str]
+    analysis_tier: Optional[str] = None
+    analysis_confidence: Optional[float] = None
+    duplicate_of: Optional[int] = None
     created_at: datetime
+
+class FeedbackPage(SQLModel):
+    items: List[FeedbackRead]
+    next_cursor: Optional[str] = None
+
+class FeedbackSearchHit(FeedbackRead):
+    rank: float
+
+class FeedbackSearchResults(SQLModel):
+    items: List[FeedbackSearchHit]
+
+class FeedbackSimilarHit(FeedbackRead):
+    score: float
+
+class FeedbackSimilarResults(SQLModel):
+    items: List[FeedbackSimilarHit]
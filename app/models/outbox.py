@@ -0,0 +1,10 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class OutboxEvent(SQLModel, table=True):
+    __tablename__ = "event_outbox"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    payload: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
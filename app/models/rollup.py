@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+from app.models.feedback import Category, Sentiment
+
+class FeedbackStatsHourly(SQLModel, table=True):
+    __tablename__ = "feedback_stats_hourly"
+
+    bucket: datetime = Field(primary_key=True)
+    category: Category = Field(primary_key=True)
+    sentiment: Sentiment = Field(primary_key=True)
+    count: int = Field(default=0)
+
+class RollupWatermark(SQLModel, table=True):
+    __tablename__ = "rollup_watermark"
+
+    name: str = Field(primary_key=True)
+    last_id: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
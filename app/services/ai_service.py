@@ -1,33 +1,226 @@
 import os
-import random
 import asyncio
 import json
-import google.generativeai as genai
-from pydantic import BaseModel, Field
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+from pydantic import BaseModel, Field, PrivateAttr
+from app.core.admission import StageLimiter
+from app.core.metrics import AI_CASCADE, AI_FALLBACKS
 from app.models.feedback import Sentiment, Category
+from app.services.analysis_cache import AI_CACHE_ENABLED, AnalysisCache, analysis_cache
+from app.services.rule_classifier import RuleClassifier, RuleMatch
+
+GEMINI_MODEL = "gemini-1.5-flash"
+# Bump whenever the prompts below change so cached analyses are not reused across them
+PROMPT_VERSION = "1"
+
+# Micro-batching of LLM calls: wait up to the window (or until max size) and send one prompt.
+# A window of 0 disables batching.
+# A few ms of added latency per LLM call buys one prompt per burst; 0 disables batching
+AI_BATCH_WINDOW_MS = float(os.getenv("AI_BATCH_WINDOW_MS", "5"))
+AI_BATCH_MAX_SIZE = int(os.getenv("AI_BATCH_MAX_SIZE", "16"))
+# Artificial latency of the local rules provider, e.g. to rehearse LLM timings (0 = none)
+AI_MOCK_LATENCY_MS = float(os.getenv("AI_MOCK_LATENCY_MS", "0"))
+# Confidence-gated cascade (with an LLM configured): the local classifier answers when its
+# confidence reaches the threshold, only the rest escalate to the LLM. Per-endpoint override:
+# AI_CASCADE_THRESHOLD_<ENDPOINT> (FEEDBACK, BULK, WORKER, ANALYZER). "off" sends everything to the LLM.
+AI_CASCADE_THRESHOLD = os.getenv("AI_CASCADE_THRESHOLD", "0.6")
+
+TIER_RULES = "rules"
+TIER_LLM = "llm"
+
+# endpoint -> {"local": n, "escalated": n}, shared by every AIService in the process
+_cascade_counts: Dict[str, Dict[str, int]] = {}
+
+def cascade_threshold(endpoint: str) -> Optional[float]:
+    value = os.getenv(f"AI_CASCADE_THRESHOLD_{endpoint.upper()}", AI_CASCADE_THRESHOLD).strip().lower()
+    return None if value in ("", "off", "none") else float(value)
 
 class FeedbackAnalysis(BaseModel):
     sentiment: Sentiment
     category: Category
     summary: str = Field(description="One sentence summary of the feedback")
+    # Which tier answered ("rules" or "llm"), and the local classifier's confidence for "rules"
+    tier: Optional[str] = None
+    confidence: Optional[float] = None
+    # Set when the provider failed and the mock answered instead; such results are not cached
+    _fallback: bool = PrivateAttr(default=False)
+
+class AnalysisBatcher:
+    """
+    Coalesces concurrent analysis requests into batches.
+    A batch is dispatched when it reaches `max_size` or `window` seconds after its first item,
+    and each caller receives its own slot of the result (None = that item failed).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[str]], Awaitable[List[Optional[FeedbackAnalysis]]]],
+        window: float,
+        max_size: int,
+    ):
+        self._run_batch = run_batch
+        self.window = window
+        self.max_size = max_size
+        self._items: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, message: str) -> Optional[FeedbackAnalysis]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append((message, future))
+        if len(self._items) >= self.max_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._items = self._items, []
+        if not items:
+            return
+        task = asyncio.create_task(self._run(items))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, items: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await self._run_batch([message for message, _ in items])
+        except Exception as e:
+            print(f"[AI Service Error] Batch of {len(items)} failed: {e}")
+            results = [None] * len(items)
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
 
 class AIService:
-    def __init__(self):
+    def __init__(self, cache: Optional[AnalysisCache] = None):
         # Auto-detect provider based on API Key
         self.api_key = os.getenv("GEMINI_API_KEY")
+        self.batcher: Optional[AnalysisBatcher] = None
+        self.cache = cache or (analysis_cache if AI_CACHE_ENABLED else None)
+        self.classifier = RuleClassifier.from_env()
+        self._thresholds: Dict[str, Optional[float]] = {}
         if self.api_key:
             self.provider = "gemini"
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+            # Provider client imported only when that provider is selected
+            from app.services.gemini_client import GeminiClient
+            self.client = GeminiClient(self.api_key, GEMINI_MODEL)
+            if AI_BATCH_WINDOW_MS > 0:
+                self.batcher = AnalysisBatcher(
+                    self._gemini_batch_analysis, AI_BATCH_WINDOW_MS / 1000, AI_BATCH_MAX_SIZE
+                )
         else:
             self.provider = "mock"
 
-    async def analyze_feedback(self, message: str) -> FeedbackAnalysis:
+    @property
+    def cache_namespace(self) -> str:
+        model = GEMINI_MODEL if self.provider == "gemini" else f"rules-{self.classifier.version}"
+        return f"{self.provider}:{model}:p{PROMPT_VERSION}"
+
+    def cascade_threshold(self, endpoint: str) -> Optional[float]:
+        if endpoint not in self._thresholds:
+            self._thresholds[endpoint] = cascade_threshold(endpoint)
+        return self._thresholds[endpoint]
+
+    def _answers_locally(self, match: RuleMatch, endpoint: str) -> bool:
+        threshold = self.cascade_threshold(endpoint)
+        local = threshold is not None and match.confidence >= threshold
+        counts = _cascade_counts.setdefault(endpoint, {"local": 0, "escalated": 0})
+        counts["local" if local else "escalated"] += 1
+        AI_CASCADE.labels(endpoint, TIER_RULES if local else TIER_LLM).inc()
+        return local
+
+    def cascade_stats(self) -> dict:
+        """Per endpoint: messages answered locally vs escalated to the LLM, and the escalation rate."""
+        return {
+            endpoint: {
+                **counts,
+                "threshold": self.cascade_threshold(endpoint),
+                "escalation_rate": counts["escalated"] / max(counts["local"] + counts["escalated"], 1),
+            }
+            for endpoint, counts in _cascade_counts.items()
+        }
+
+    async def analyze_feedback(self, message: str, endpoint: str = "default") -> FeedbackAnalysis:
+        """
+        Analyzes one message. With an LLM configured, the local classifier answers first and
+        the message escalates only when its confidence is under the endpoint's threshold.
+        """
         if self.provider == "gemini":
+            match = self.classifier.classify(message)
+            if self._answers_locally(match, endpoint):
+                return _rules_analysis(match)
+        return await self._cached_analysis(message)
+
+    async def _cached_analysis(self, message: str) -> FeedbackAnalysis:
+        if self.cache is None:
+            return await self._analyze(message)
+        return await self.cache.get_or_compute(
+            message,
+            lambda: self._analyze(message),
+            FeedbackAnalysis,
+            namespace=self.cache_namespace,
+            cacheable=lambda analysis: not analysis._fallback,
+        )
+
+    async def analyze_batch(
+        self,
+        messages: Sequence[str],
+        slots: Optional[asyncio.Semaphore] = None,
+        endpoint: str = "default",
+        stage: Optional[StageLimiter] = None,
+    ) -> List[Union[FeedbackAnalysis, Exception]]:
+        """
+        Analyzes many messages; a failed item is returned as its exception.
+        The local classifier scores the whole batch in one pass; with an LLM configured, only
+        the low-confidence messages escalate (through the cache and batcher), at most `slots`
+        at a time, each holding a `stage` slot (Overloaded when shed).
+        """
+        if self.provider != "gemini":
+            return await self._mock_batch_analysis(messages)
+
+        results: List[Union[FeedbackAnalysis, Exception, None]] = [None] * len(messages)
+        escalated: List[int] = []
+        for i, match in enumerate(self.classifier.classify_batch(messages)):
+            if self._answers_locally(match, endpoint):
+                results[i] = _rules_analysis(match)
+            else:
+                escalated.append(i)
+
+        async def analyze(message: str) -> FeedbackAnalysis:
+            async with AsyncExitStack() as stack:
+                if slots is not None:
+                    await stack.enter_async_context(slots)
+                if stage is not None:
+                    await stack.enter_async_context(stage.slot())
+                return await self._cached_analysis(message)
+
+        analyses = await asyncio.gather(*(analyze(messages[i]) for i in escalated), return_exceptions=True)
+        for i, analysis in zip(escalated, analyses):
+            results[i] = analysis
+        return results
+
+    async def _analyze(self, message: str) -> FeedbackAnalysis:
+        if self.provider == "gemini":
+            if self.batcher is not None:
+                result = await self.batcher.submit(message)
+                return result if result is not None else await self._fallback_analysis(message, "batch_item")
             return await self._gemini_analysis(message)
         else:
             return await self._mock_analysis(message)
 
+    async def _fallback_analysis(self, message: str, reason: str) -> FeedbackAnalysis:
+        # Straight to the classifier: no artificial latency while the LLM is failing
+        AI_FALLBACKS.labels(reason).inc()
+        analysis = _rules_analysis(self.classifier.classify(message))
+        analysis._fallback = True
+        return analysis
+
     async def _gemini_analysis(self, message: str) -> FeedbackAnalysis:
         """
         Analyzes feedback using Google Gemini API with structured JSON output.
@@ -46,56 +239,99 @@ class AIService:
         """
         
         try:
-            # Run in executor to avoid blocking async loop
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
+            # Native async call: concurrency, rate limit, retries and circuit breaker live in the client
+            text = await self.client.generate_json(prompt)
             
             # Parse JSON response
-            data = json.loads(response.text)
+            data = json.loads(text)
             
             return FeedbackAnalysis(
                 sentiment=Sentiment(data["sentiment"]),
                 category=Category(data["category"]),
-                summary=data["summary"]
+                summary=data["summary"],
+                tier=TIER_LLM,
             )
         except Exception as e:
+            if _circuit_open(e):
+                return await self._fallback_analysis(message, "circuit_open")
             print(f"[AI Service Error] Gemini failed: {e}. Falling back to mock.")
-            return await self._mock_analysis(message)
+            return await self._fallback_analysis(message, "error")
 
-    async def _mock_analysis(self, message: str) -> FeedbackAnalysis:
+    async def _gemini_batch_analysis(self, messages: List[str]) -> List[Optional[FeedbackAnalysis]]:
         """
-        Simulates an AI analysis with latency and random but plausible results.
-        Fallback if no API Key is provided or API fails.
+        Analyzes several feedback messages with a single Gemini call.
+        Returns one entry per message; entries that are missing or invalid are None.
         """
-        await asyncio.sleep(0.5) # Reduced latency for mock
+        items = json.dumps([{"index": i, "feedback": m} for i, m in enumerate(messages)])
+        prompt = f"""
+        Analyze each of the following customer feedback items and extract structured data.
         
-        # Simple heuristic for "better than random" mock
-        lower_msg = message.lower()
+        Items (JSON): {items}
         
-        if any(word in lower_msg for word in ["bad", "slow", "broken", "terrible", "worst"]):
-            sentiment = Sentiment.NEGATIVE
-        elif any(word in lower_msg for word in ["good", "great", "fast", "love", "best"]):
-            sentiment = Sentiment.POSITIVE
-        else:
-            sentiment = Sentiment.NEUTRAL
-            
-        if "delivery" in lower_msg or "shipping" in lower_msg or "late" in lower_msg:
-            category = Category.DELIVERY
-        elif (
-            "product" in lower_msg or "feature" in lower_msg or "quality" in lower_msg
-            or "app" in lower_msg or "website" in lower_msg or "bug" in lower_msg or "crash" in lower_msg
-        ):
-            category = Category.PRODUCT
-        elif "service" in lower_msg or "support" in lower_msg or "rude" in lower_msg:
-            category = Category.SERVICE
-        else:
-            category = Category.OTHER
+        Output a JSON array with exactly one object per item:
+        [
+            {{
+                "index": <index of the item>,
+                "sentiment": "Positive" | "Neutral" | "Negative",
+                "category": "Service" | "Product" | "Delivery" | "Other",
+                "summary": "Concise 1-sentence summary"
+            }}
+        ]
+        """
+        results: List[Optional[FeedbackAnalysis]] = [None] * len(messages)
+        try:
+            data = json.loads(await self.client.generate_json(prompt))
+        except Exception as e:
+            if not _circuit_open(e):
+                print(f"[AI Service Error] Gemini batch failed: {e}. Falling back to mock.")
+            return results
 
-        return FeedbackAnalysis(
-            sentiment=sentiment,
-            category=category,
-            summary=f"[Mock Analysis] Customer provided feedback about {category.value}."
-        )
+        for entry in data if isinstance(data, list) else []:
+            try:
+                index = int(entry["index"])
+                if 0 <= index < len(messages) and results[index] is None:
+                    results[index] = FeedbackAnalysis(
+                        sentiment=Sentiment(entry["sentiment"]),
+                        category=Category(entry["category"]),
+                        summary=entry["summary"],
+                        tier=TIER_LLM,
+                    )
+            except Exception:
+                # Only this item falls back to the mock
+                continue
+        return results
+
+    async def _mock_analysis(self, message: str) -> FeedbackAnalysis:
+        """
+        Local analysis with the compiled rule classifier.
+        Fallback if no API Key is provided or API fails.
+        """
+        return (await self._mock_batch_analysis([message]))[0]
+
+    async def _mock_batch_analysis(self, messages: Sequence[str]) -> List[FeedbackAnalysis]:
+        if AI_MOCK_LATENCY_MS > 0:
+            await asyncio.sleep(AI_MOCK_LATENCY_MS / 1000)
+        return [_rules_analysis(match) for match in self.classifier.classify_batch(messages)]
+
+_ai_service: Optional[AIService] = None
+
+def get_ai_service() -> AIService:
+    """The process-wide AIService: one classifier, LLM client and batcher for every caller."""
+    global _ai_service
+    if _ai_service is None:
+        _ai_service = AIService()
+    return _ai_service
+
+def _circuit_open(error: Exception) -> bool:
+    # Only reached on the Gemini path, where the client module is already imported
+    from app.services.gemini_client import CircuitOpenError
+    return isinstance(error, CircuitOpenError)
+
+def _rules_analysis(match: RuleMatch) -> FeedbackAnalysis:
+    return FeedbackAnalysis(
+        sentiment=match.sentiment,
+        category=match.category,
+        summary=f"[Mock Analysis] Customer provided feedback about {match.category.value}.",
+        tier=TIER_RULES,
+        confidence=round(match.confidence, 4),
+    )
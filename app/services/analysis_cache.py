@@ -0,0 +1,131 @@
+import os
+import re
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Optional, Type, TypeVar
+from pydantic import BaseModel
+from app.core.cache import LRUCache, cache_get, cache_set
+from app.core.metrics import CACHE_LOOKUPS
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_LOCAL_SIZE = int(os.getenv("AI_CACHE_LOCAL_SIZE", "10000"))
+# Bump to invalidate every stored analysis (e.g. after a taxonomy change)
+AI_CACHE_VERSION = os.getenv("AI_CACHE_VERSION", "1")
+
+T = TypeVar("T", bound=BaseModel)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_message(message: str) -> str:
+    return _WHITESPACE.sub(" ", message).strip().casefold()
+
+def message_digest(message: str) -> str:
+    return hashlib.sha256(normalize_message(message).encode()).hexdigest()
+
+class AnalysisCache:
+    """
+    Content-addressed analysis cache: L1 in-process LRU -> L2 Redis -> compute.
+    Keys are namespaced by version (cache version + provider/model/prompt), so changing any of
+    those simply starts a fresh keyspace. Concurrent lookups of the same message share a single
+    in-flight computation (single-flight).
+    """
+
+    def __init__(
+        self,
+        ttl: int = AI_CACHE_TTL,
+        local_size: int = AI_CACHE_LOCAL_SIZE,
+        version: str = AI_CACHE_VERSION,
+    ):
+        self.ttl = ttl
+        self.version = version
+        self.local = LRUCache(maxsize=local_size, ttl=ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def key(self, message: str, namespace: str = "") -> str:
+        return f"analysis:{self.version}:{namespace}:{message_digest(message)}"
+
+    async def get_or_compute(
+        self,
+        message: str,
+        compute: Callable[[], Awaitable[T]],
+        model: Type[T],
+        namespace: str = "",
+        cacheable: Callable[[T], bool] = lambda _: True,
+    ) -> T:
+        key = self.key(message, namespace)
+        value = self.local.get(key)
+        if value is not None:
+            self.hits_local += 1
+            CACHE_LOOKUPS.labels("analysis", "local").inc()
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            CACHE_LOOKUPS.labels("analysis", "coalesced").inc()
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The first lookup was abandoned (its caller went away): take over
+                return await self.get_or_compute(message, compute, model, namespace, cacheable)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, model)
+            if value is None:
+                self.misses += 1
+                CACHE_LOOKUPS.labels("analysis", "miss").inc()
+                value = await compute()
+                if cacheable(value):
+                    self.local.set(key, value)
+                    await cache_set(key, value.model_dump_json(), ttl=self.ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody awaited is not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _load(self, key: str, model: Type[T]) -> Optional[T]:
+        raw = await cache_get(key)
+        if raw is None:
+            return None
+        try:
+            value = model.model_validate_json(raw)
+        except ValueError:
+            return None
+        self.hits_redis += 1
+        CACHE_LOOKUPS.labels("analysis", "redis").inc()
+        self.local.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits_local + self.hits_redis + self.misses + self.coalesced
+        return {
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "local_capacity": self.local.maxsize,
+            "inflight": len(self._inflight),
+        }
+
+# Shared by every AIService in the process so identical messages from the feedback endpoint
+# and the analyzer microservice dedupe against each other
+analysis_cache = AnalysisCache()
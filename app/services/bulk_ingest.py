@@ -0,0 +1,288 @@
+"""
+Bulk feedback ingestion: incremental JSON-array / NDJSON parsing of the request stream,
+bounded-concurrency analysis and chunked multi-row INSERT ... RETURNING.
+
+Each item takes a token of its customer's rate limit (over the limit, the item fails with
+code 429), and analysis and writes go through the process-wide AI and DB stage limits
+(shed items fail with code 503).
+"""
+import os
+import json
+import math
+import codecs
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.admission import Overloaded, RateLimited, admit, ai_stage, db_stage
+from app.core.queue import publish_feedback_events
+from app.models.feedback import Feedback, FeedbackCreate
+from app.services.ai_service import AIService
+from app.services.dashboard_stats import increment_counters
+from app.services.near_duplicates import NEAR_DUP_ENABLED, message_fingerprint, near_duplicates, to_signed
+from app.services.similarity import index_feedback
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_ANALYSIS_CONCURRENCY = int(os.getenv("BULK_ANALYSIS_CONCURRENCY", "16"))
+# Largest single element / line the parsers buffer (in decoded characters)
+BULK_MAX_ITEM_BYTES = int(os.getenv("BULK_MAX_ITEM_BYTES", "1048576"))
+
+class BulkParseError(ValueError):
+    """The body could not be parsed past this point; earlier items are still processed."""
+
+# --- 1. Streaming parsers ---
+
+async def _iter_text(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+async def iter_ndjson(
+    chunks: AsyncIterator[bytes], max_item: int = BULK_MAX_ITEM_BYTES
+) -> AsyncIterator[Any]:
+    """
+    Yields one decoded value per non-empty line (a BulkParseError for invalid lines).
+    Raises BulkParseError on a line longer than `max_item`.
+    """
+    buffer = ""
+    async for text in _iter_text(chunks):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if len(line) > max_item:
+                raise _too_large(max_item)
+            if line.strip():
+                yield _loads(line)
+        if len(buffer) > max_item:
+            raise _too_large(max_item)
+    if buffer.strip():
+        yield _loads(buffer)
+
+def _loads(line: str) -> Any:
+    try:
+        return orjson.loads(line)
+    except ValueError as e:
+        return BulkParseError(f"Invalid JSON line: {e}")
+
+async def iter_json_array(
+    chunks: AsyncIterator[bytes], max_item: int = BULK_MAX_ITEM_BYTES
+) -> AsyncIterator[Any]:
+    """
+    Yields the elements of a top-level JSON array as they arrive.
+    Only the element currently being received is buffered; one that does not decode
+    within `max_item` characters (too large or malformed) raises BulkParseError, and so
+    does a missing, doubled or trailing comma.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    # What comes next: "[" (start), "first" (element or "]"), "element", "separator" ("," or "]")
+    expect = "["
+    async for text in _iter_text(chunks):
+        buffer += text
+        pos = 0
+        while True:
+            pos = _skip(buffer, pos, " \t\r\n")
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "[":
+                if char != "[":
+                    raise BulkParseError("Body must be a JSON array")
+                expect, pos = "first", pos + 1
+                continue
+            if char == "]" and expect in ("first", "separator"):
+                return
+            if expect == "separator":
+                if char != ",":
+                    raise BulkParseError(f"Expected ',' or ']' at character {pos}")
+                expect, pos = "element", pos + 1
+                continue
+            if char in ",]":
+                raise BulkParseError(f"Expected an array element at character {pos}")
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Element is incomplete: wait for more data
+                break
+            if end == len(buffer):
+                # A number may continue in the next chunk
+                break
+            expect, pos = "separator", end
+            yield value
+        buffer = buffer[pos:]
+        if len(buffer) > max_item:
+            raise _too_large(max_item)
+    if expect == "[":
+        raise BulkParseError("Body must be a JSON array")
+    raise BulkParseError("Unexpected end of JSON array")
+
+def _too_large(max_item: int) -> BulkParseError:
+    return BulkParseError(f"Item is not valid JSON within {max_item} characters")
+
+def _skip(buffer: str, pos: int, chars: str) -> int:
+    while pos < len(buffer) and buffer[pos] in chars:
+        pos += 1
+    return pos
+
+# --- 2. Chunked ingestion ---
+
+async def ingest_bulk(
+    items: AsyncIterator[Any],
+    session: AsyncSession,
+    ai_service: AIService,
+    chunk_size: int = BULK_CHUNK_SIZE,
+    concurrency: int = BULK_ANALYSIS_CONCURRENCY,
+) -> dict:
+    results: List[dict] = []
+    chunk: List[Tuple[int, FeedbackCreate]] = []
+    slots = asyncio.Semaphore(concurrency)
+    index = 0
+    try:
+        async for item in items:
+            try:
+                if isinstance(item, BulkParseError):
+                    raise item
+                feedback_in = FeedbackCreate.model_validate(item)
+                admit(None, feedback_in.customer_id)
+                chunk.append((index, feedback_in))
+            except (ValidationError, ValueError, RateLimited) as e:
+                results.append(_error(index, e))
+            index += 1
+            if len(chunk) >= chunk_size:
+                results.extend(await _ingest_chunk(chunk, session, ai_service, slots))
+                chunk = []
+    except BulkParseError as e:
+        if index == 0:
+            raise
+        # The rest of the body is unreadable; keep what was parsed so far
+        results.append(_error(index, e))
+    if chunk:
+        results.extend(await _ingest_chunk(chunk, session, ai_service, slots))
+
+    results.sort(key=lambda r: r["index"])
+    accepted = sum(1 for r in results if r["status"] == "created")
+    return {"accepted": accepted, "failed": len(results) - accepted, "results": results}
+
+def _error(index: int, error: Exception) -> dict:
+    if isinstance(error, ValidationError):
+        message = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+    else:
+        message = str(error)
+    result = {"index": index, "status": "error", "error": message}
+    if isinstance(error, (RateLimited, Overloaded)):
+        # The HTTP status the item would have had on its own, and when to retry it
+        result["code"] = 429 if isinstance(error, RateLimited) else 503
+        result["retry_after"] = math.ceil(error.retry_after)
+    return result
+
+async def _ingest_chunk(
+    chunk: List[Tuple[int, FeedbackCreate]],
+    session: AsyncSession,
+    ai_service: AIService,
+    slots: asyncio.Semaphore,
+) -> List[dict]:
+    # Near-duplicates of recently analyzed rows reuse their analysis; only the rest are analyzed
+    fingerprints = [
+        message_fingerprint(feedback_in.message) if NEAR_DUP_ENABLED else None for _, feedback_in in chunk
+    ]
+    duplicates = await near_duplicates.find_many(fingerprints, ai_service.cache_namespace)
+    # ... and so do near-duplicates of an earlier message of the chunk: position -> that position
+    copies = near_duplicates.dedupe(fingerprints, (i for i, duplicate in enumerate(duplicates) if duplicate is None))
+    fresh = [i for i, duplicate in enumerate(duplicates) if duplicate is None and i not in copies]
+    analyses: list = [duplicate.analysis if duplicate else None for duplicate in duplicates]
+    fresh_analyses = await ai_service.analyze_batch(
+        [chunk[i][1].message for i in fresh], slots, endpoint="bulk", stage=ai_stage
+    )
+    for i, analysis in zip(fresh, fresh_analyses):
+        analyses[i] = analysis
+    for i, first in copies.items():
+        analyses[i] = analyses[first]
+
+    results: List[dict] = []
+    rows: List[dict] = []
+    indexes: List[int] = []
+    # Per row: (fingerprint, analysis) to index; near-duplicates are not indexed (fingerprint None)
+    originals: List[tuple] = []
+    # Row of a chunk copy -> row it copies, whose id is only known once inserted
+    copy_rows: Dict[int, int] = {}
+    row_of: Dict[int, int] = {}
+    now = datetime.utcnow()
+    for i, ((index, feedback_in), analysis, fingerprint, duplicate) in enumerate(
+        zip(chunk, analyses, fingerprints, duplicates)
+    ):
+        if isinstance(analysis, Exception):
+            results.append(_error(index, analysis))
+            continue
+        row_of[i] = len(rows)
+        if i in copies:
+            copy_rows[len(rows)] = row_of[copies[i]]
+        indexes.append(index)
+        originals.append((fingerprint if duplicate is None and i not in copies else None, analysis))
+        rows.append({
+            "customer_id": feedback_in.customer_id,
+            "message": feedback_in.message,
+            "sentiment": analysis.sentiment,
+            "category": analysis.category,
+            "summary": analysis.summary,
+            "analysis_tier": analysis.tier,
+            "analysis_confidence": analysis.confidence,
+            "fingerprint": to_signed(fingerprint),
+            "duplicate_of": duplicate.feedback_id if duplicate is not None else None,
+            "created_at": now,
+        })
+    if not rows:
+        return results
+
+    # executemany + RETURNING is sent as batched multi-row INSERT ... VALUES ... RETURNING
+    statement = insert(Feedback).returning(Feedback.id, sort_by_parameter_order=True)
+    ids: List[int] = [0] * len(rows)
+    try:
+        async with db_stage.slot():
+            # Chunk copies go second, once the rows they copy have ids
+            for batch in (
+                [r for r in range(len(rows)) if r not in copy_rows],
+                [r for r in range(len(rows)) if r in copy_rows],
+            ):
+                if not batch:
+                    continue
+                for r in batch:
+                    if r in copy_rows:
+                        rows[r]["duplicate_of"] = ids[copy_rows[r]]
+                inserted = await session.exec(statement, params=[rows[r] for r in batch])
+                for r, row in zip(batch, inserted.all()):
+                    ids[r] = row[0]
+            await session.commit()
+    except Overloaded as e:
+        results.extend(_error(index, e) for index in indexes)
+        return results
+
+    await near_duplicates.remember_many(
+        ((fingerprint, feedback_id, analysis) for feedback_id, (fingerprint, analysis) in zip(ids, originals)),
+        ai_service.cache_namespace,
+    )
+    await increment_counters((row["sentiment"], row["category"]) for row in rows)
+    await index_feedback((feedback_id, row["message"]) for feedback_id, row in zip(ids, rows))
+    await publish_feedback_events([
+        {
+            "id": feedback_id,
+            "customer_id": row["customer_id"],
+            "message": row["message"],
+            "sentiment": row["sentiment"].value,
+            "category": row["category"].value,
+            "status": "analyzed",
+        }
+        for feedback_id, row in zip(ids, rows)
+    ])
+    results.extend(
+        {"index": index, "status": "created", "id": feedback_id}
+        for index, feedback_id in zip(indexes, ids)
+    )
+    return results
@@ -0,0 +1,128 @@
+"""
+Dashboard totals.
+Counters are incremented in Redis on every write/analysis so reads are O(1); a periodic
+reconciliation recomputes them from the writer and adds the difference to correct any drift. `aggregate_stats` is the
+SQL path used for reconciliation and as fallback when the counter store is unavailable.
+"""
+import os
+import time
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import get_redis
+from app.core.metrics import CACHE_ERRORS
+from app.core.database import DBClusterType, session_scope
+from app.models.feedback import Feedback, Category, Sentiment
+
+STATS_COUNTERS_KEY = "feedback_stats:counters"
+STATS_RECONCILE_LOCK_KEY = "feedback_stats:reconcile_lock"
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", "300"))
+
+async def aggregate_stats(session: AsyncSession) -> dict:
+    # Optimized Queries: Group by Category
+    cat_query = select(Feedback.category, func.count(Feedback.id)).group_by(Feedback.category)
+    cat_result = await session.exec(cat_query)
+    category_stats = {
+        (row[0].value if isinstance(row[0], Category) else row[0]): row[1]
+        for row in cat_result.all() if row[0] is not None
+    }
+
+    # Optimized Queries: Group by Sentiment
+    sent_query = select(Feedback.sentiment, func.count(Feedback.id)).group_by(Feedback.sentiment)
+    sent_result = await session.exec(sent_query)
+    sentiment_stats = {
+        (row[0].value if isinstance(row[0], Sentiment) else row[0]): row[1]
+        for row in sent_result.all() if row[0] is not None
+    }
+
+    # Total Count
+    total_query = select(func.count(Feedback.id))
+    total_result = await session.exec(total_query)
+    total_count = total_result.scalar_one()
+
+    return {
+        "total_feedback": total_count,
+        "by_category": category_stats,
+        "by_sentiment": sentiment_stats
+    }
+
+async def increment_counters(
+    labels: Iterable[Tuple[Optional[Sentiment], Optional[Category]]],
+    count_total: bool = True,
+) -> None:
+    """
+    Adds one row per (sentiment, category) pair to the counters.
+    Use count_total=False when rows already counted at insert are later analyzed.
+    """
+    deltas: Counter = Counter()
+    for sentiment, category in labels:
+        if count_total:
+            deltas["total"] += 1
+        if sentiment is not None:
+            deltas[f"sentiment:{sentiment.value}"] += 1
+        if category is not None:
+            deltas[f"category:{category.value}"] += 1
+    if not deltas:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for field, amount in deltas.items():
+            pipe.hincrby(STATS_COUNTERS_KEY, field, amount)
+        await pipe.execute()
+    except Exception:
+        CACHE_ERRORS.labels("stats_increment").inc()
+
+async def read_counters() -> Optional[dict]:
+    """Counter snapshot in the `aggregate_stats` shape, or None if unavailable/never reconciled."""
+    fields = await _read_fields()
+    if fields is None or "reconciled_at" not in fields:
+        return None
+    stats = {"total_feedback": fields.get("total", 0), "by_category": {}, "by_sentiment": {}}
+    for field, value in fields.items():
+        kind, _, label = field.partition(":")
+        if value and kind == "category":
+            stats["by_category"][label] = value
+        elif value and kind == "sentiment":
+            stats["by_sentiment"][label] = value
+    return stats
+
+async def _read_fields() -> Optional[dict]:
+    try:
+        raw = await get_redis().hgetall(STATS_COUNTERS_KEY)
+    except Exception:
+        CACHE_ERRORS.labels("stats_read").inc()
+        return None
+    return {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+
+async def reconcile_counters(session: AsyncSession) -> dict:
+    """
+    Corrects the counters to the DB totals. The counters are read before the aggregate and
+    the difference is added (HINCRBY), so increments landing meanwhile are kept, not
+    overwritten. Raises if Redis is unavailable.
+    """
+    before = await _read_fields()
+    if before is None:
+        raise ConnectionError("counter store unavailable")
+    stats = await aggregate_stats(session)
+    exact = {"total": stats["total_feedback"]}
+    exact.update({f"category:{k}": v for k, v in stats["by_category"].items()})
+    exact.update({f"sentiment:{k}": v for k, v in stats["by_sentiment"].items()})
+    fields = (set(exact) | set(before)) - {"reconciled_at"}
+    pipe = get_redis().pipeline(transaction=True)
+    for field in fields:
+        if exact.get(field, 0) != before.get(field, 0):
+            pipe.hincrby(STATS_COUNTERS_KEY, field, exact.get(field, 0) - before.get(field, 0))
+    pipe.hset(STATS_COUNTERS_KEY, mapping={"reconciled_at": int(time.time())})
+    await pipe.execute()
+    return stats
+
+async def run_reconciliation(interval: int = STATS_RECONCILE_INTERVAL) -> bool:
+    """One reconciliation across all replicas per interval (guarded by a Redis lock)."""
+    redis = get_redis()
+    if not await redis.set(STATS_RECONCILE_LOCK_KEY, "1", nx=True, ex=max(interval - 1, 1)):
+        return False
+    # The writer: a lagging replica would move the counters back
+    async with session_scope(DBClusterType.WRITER) as session:
+        await reconcile_counters(session)
+    return True
@@ -0,0 +1,35 @@
+"""
+Local text embeddings: the hashing trick over word unigrams and bigrams, with sublinear
+term frequency and L2 normalisation. No vocabulary to fit and no network calls; crc32
+(not the salted built-in hash) keeps vectors identical across processes and restarts.
+"""
+import os
+import re
+import zlib
+from typing import Iterable
+import numpy as np
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+_TOKENS = re.compile(r"\w+", re.UNICODE)
+
+class HashingEmbedder:
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = _TOKENS.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, np.float32)
+        if not grams:
+            return vector
+        hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), np.uint32, len(grams))
+        # Low bits pick the slot, the top bit the sign (collisions cancel out on average)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts: Iterable[str]) -> np.ndarray:
+        vectors = [self.embed(text) for text in texts]
+        return np.vstack(vectors) if vectors else np.empty((0, self.dim), np.float32)
@@ -0,0 +1,122 @@
+"""
+Reading feedback back out: filtered listings with keyset pagination on (created_at, id),
+newest first, and row-streaming exports through a server-side cursor.
+"""
+import io
+import csv
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+import orjson
+from sqlalchemy import and_, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.feedback import Feedback, Category, Sentiment
+from app.services.stats_rollup import naive_utc
+
+EXPORT_BATCH_ROWS = 1000
+EXPORT_COLUMNS = ("id", "customer_id", "message", "sentiment", "category", "summary", "created_at")
+
+class InvalidCursor(ValueError):
+    pass
+
+@dataclass
+class FeedbackFilters:
+    customer_id: Optional[str] = None
+    sentiment: Optional[Sentiment] = None
+    category: Optional[Category] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    def conditions(self) -> list:
+        conditions = []
+        if self.customer_id is not None:
+            conditions.append(Feedback.customer_id == self.customer_id)
+        if self.sentiment is not None:
+            conditions.append(Feedback.sentiment == self.sentiment)
+        if self.category is not None:
+            conditions.append(Feedback.category == self.category)
+        if self.created_from is not None:
+            conditions.append(Feedback.created_at >= naive_utc(self.created_from))
+        if self.created_to is not None:
+            conditions.append(Feedback.created_at < naive_utc(self.created_to))
+        return conditions
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, id = raw.partition("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Malformed cursor")
+
+def _newest_first(query):
+    return query.order_by(Feedback.created_at.desc(), Feedback.id.desc())
+
+async def list_feedback(
+    session: AsyncSession,
+    filters: FeedbackFilters,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Feedback], Optional[str]]:
+    """
+    One page of matching rows, newest first, plus the cursor for the next page (None at the end).
+    The cursor is the (created_at, id) of the last row, so every page is an index range scan
+    instead of an OFFSET that grows with the page number.
+    """
+    conditions = filters.conditions()
+    if cursor is not None:
+        created_at, id = decode_cursor(cursor)
+        conditions.append(or_(
+            Feedback.created_at < created_at,
+            and_(Feedback.created_at == created_at, Feedback.id < id),
+        ))
+    query = _newest_first(select(Feedback).where(*conditions)).limit(limit + 1)
+    rows = list((await session.exec(query)).scalars().all())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+async def stream_feedback_rows(
+    session: AsyncSession,
+    filters: FeedbackFilters,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> AsyncIterator[List[tuple]]:
+    """Matching rows in batches, fetched through a server-side cursor (memory stays flat)."""
+    columns = [getattr(Feedback, name) for name in EXPORT_COLUMNS]
+    query = _newest_first(select(*columns).where(*filters.conditions())).execution_options(
+        stream_results=True, yield_per=batch_rows
+    )
+    result = await session.stream(query)
+    async for partition in result.partitions():
+        yield partition
+
+def _plain(value):
+    if isinstance(value, (Sentiment, Category)):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def export_ndjson(rows: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    async for partition in rows:
+        yield b"".join(
+            orjson.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row)))) + b"\n" for row in partition
+        )
+
+async def export_csv(rows: AsyncIterator[List[tuple]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for partition in rows:
+        writer.writerows([_plain(value) for value in row] for row in partition)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
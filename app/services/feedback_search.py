@@ -0,0 +1,64 @@
+"""
+Ranked full-text search over feedback messages.
+Postgres matches `websearch_to_tsquery` against the GIN-indexed `search_vector` column;
+SQLite (local runs and tests) uses the `feedback_fts` FTS5 table. Both are maintained by the
+database itself on insert (see `app.core.database.install_search_index`).
+"""
+import re
+from typing import List, Tuple
+from sqlalchemy import func, literal_column, select, table, column
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.feedback import Feedback
+from app.services.feedback_query import FeedbackFilters
+
+_fts = table("feedback_fts", column("rowid"))
+_search_vector = literal_column("feedback.search_vector")
+# Quoted phrases, words, and the OR keyword
+_QUERY_TOKENS = re.compile(r'"([^"]+)"|(\w+)', re.UNICODE)
+
+def fts5_query(query: str) -> str:
+    """
+    Translates web-search syntax (words, "quoted phrases", `or`) into an FTS5 MATCH
+    expression, quoting every term so user input cannot inject FTS5 operators.
+    """
+    terms: List[str] = []
+    for phrase, word in _QUERY_TOKENS.findall(query):
+        if word and word.lower() == "or":
+            if terms and terms[-1] != "OR":
+                terms.append("OR")
+            continue
+        text = (phrase or word).replace('"', "")
+        if text.strip():
+            terms.append(f'"{text}"')
+    while terms and terms[-1] == "OR":
+        terms.pop()
+    return " ".join(terms)
+
+async def search_feedback(
+    session: AsyncSession,
+    query: str,
+    filters: FeedbackFilters,
+    limit: int = 20,
+) -> List[Tuple[Feedback, float]]:
+    """Best matches first, as (row, rank) pairs; a higher rank is a better match."""
+    if session.bind.dialect.name == "postgresql":
+        ts_query = func.websearch_to_tsquery("english", query)
+        rank = func.ts_rank_cd(_search_vector, ts_query)
+        statement = select(Feedback, rank).where(_search_vector.op("@@")(ts_query))
+    else:
+        match = fts5_query(query)
+        if not match:
+            return []
+        # bm25() is lower-is-better
+        rank = -func.bm25(literal_column("feedback_fts"))
+        statement = (
+            select(Feedback, rank)
+            .join(_fts, _fts.c.rowid == Feedback.id)
+            .where(literal_column("feedback_fts").op("MATCH")(match))
+        )
+    statement = (
+        statement.where(*filters.conditions())
+        .order_by(rank.desc(), Feedback.id.desc())
+        .limit(limit)
+    )
+    return [(feedback, float(score)) for feedback, score in (await session.exec(statement)).all()]
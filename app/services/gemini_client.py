@@ -0,0 +1,202 @@
+"""
+Native async client for the Gemini REST API (generateContent), used instead of running the
+blocking SDK call on the default thread pool.
+
+Every call passes, in order: the circuit breaker (fails fast while the upstream is
+unhealthy), a concurrency semaphore, and a token bucket sized to the quota. Transient
+failures (timeouts, transport errors, 429, 5xx) are retried with exponential backoff and
+full jitter, honouring Retry-After.
+"""
+import os
+import time
+import random
+import asyncio
+from typing import Optional
+import httpx
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+# Requests per minute allowed by the quota (0 = unlimited)
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "600"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "10"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+_BACKOFF_BASE = 0.2
+_BACKOFF_CAP = 2.0
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+class GeminiError(Exception):
+    pass
+
+class CircuitOpenError(GeminiError):
+    pass
+
+class GeminiRequestError(GeminiError):
+    """Non-retryable rejection (4xx): the upstream is answering, so the breaker ignores it."""
+
+class TokenBucket:
+    """`rate` tokens per second, bursts up to `capacity`. `acquire()` waits for a token."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; after `reset_timeout` one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = GEMINI_BREAKER_THRESHOLD, reset_timeout: float = GEMINI_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            self._opened_at = time.monotonic()
+        self._trial_running = False
+
+    def record_abandoned(self) -> None:
+        """The call was cancelled before an outcome: no verdict, the next call may be the trial."""
+        self._trial_running = False
+
+class GeminiClient:
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: str = GEMINI_API_BASE,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        rpm: float = GEMINI_RPM,
+        timeout: float = GEMINI_TIMEOUT,
+        retries: int = GEMINI_RETRIES,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.model = model
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._url = f"{base_url.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self._api_key = api_key
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rpm / 60)
+        self._timeout = timeout
+        self._http: Optional[httpx.AsyncClient] = None
+        self._max_concurrency = max_concurrency
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self._timeout,
+                # In a header, not the query string, so it stays out of URLs and access logs
+                headers={"x-goog-api-key": self._api_key},
+                limits=httpx.Limits(max_connections=self._max_concurrency),
+            )
+        return self._http
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def generate_json(self, prompt: str) -> str:
+        """Text of the first candidate, requested as JSON. Raises GeminiError / CircuitOpenError."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini circuit open")
+        try:
+            text = await self._generate_with_retries(prompt)
+        except GeminiRequestError:
+            self.breaker.record_success()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (client disconnect, caller timeout): a half-open trial must not stay taken
+            self.breaker.record_abandoned()
+            raise
+        self.breaker.record_success()
+        return text
+
+    async def _generate_with_retries(self, prompt: str) -> str:
+        body = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"responseMimeType": "application/json"},
+        }
+        for attempt in range(self.retries + 1):
+            retry_after: Optional[float] = None
+            async with self._slots:
+                await self._bucket.acquire()
+                try:
+                    response = await self._client().post(self._url, json=body)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    error: Exception = GeminiError(f"{type(e).__name__}: {e}")
+                else:
+                    if response.status_code == 200:
+                        return _candidate_text(response.json())
+                    message = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code not in _RETRYABLE_STATUS:
+                        raise GeminiRequestError(message)
+                    error = GeminiError(message)
+                    retry_after = _retry_after(response)
+            if attempt == self.retries:
+                raise error
+            # Full jitter spreads retries from concurrent callers
+            backoff = random.uniform(0, min(_BACKOFF_CAP, _BACKOFF_BASE * 2 ** attempt))
+            await asyncio.sleep(max(backoff, retry_after or 0))
+        raise GeminiError("unreachable")
+
+def _candidate_text(data: dict) -> str:
+    try:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        raise GeminiError(f"Unexpected response: {str(data)[:200]}")
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return min(float(response.headers["retry-after"]), _BACKOFF_CAP * 5)
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,249 @@
+"""
+Streaming approximate analytics over feedback events: unique customers and top-K terms
+and customers, per sentiment and category, in hourly and daily windows.
+
+Every event handed to `publish_feedback_event(s)` is observed in-process (a queue event
+listener); every INSIGHTS_FLUSH_INTERVAL seconds the buffered deltas are merged into
+mergeable sketches in Redis, shared by all replicas:
+
+- unique customers: a Redis HyperLogLog (`PFADD`/`PFCOUNT`, ~0.8% standard error)
+- top-K terms and customers: a Count-Min sketch (a hash of INSIGHTS_CMS_DEPTH x
+  INSIGHTS_CMS_WIDTH counters, `HINCRBY`) whose estimates rank a bounded sorted set of
+  heavy-hitter candidates (INSIGHTS_CANDIDATES). Counts may overestimate, never underestimate.
+
+`read_insights` answers from a fixed number of keys, whatever the volume. Rows ingested
+unanalyzed (202 path) are counted overall at ingestion and added to their sentiment and
+category by the analysis worker. Deltas buffered while Redis is unavailable are dropped;
+candidates whose counts were written but whose ranking failed are ranked on the next flush.
+"""
+import os
+import re
+import hashlib
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.core.cache import get_redis
+from app.core.metrics import CACHE_ERRORS
+from app.models.feedback import Category, Sentiment
+
+INSIGHTS_ENABLED = os.getenv("INSIGHTS_ENABLED", "true").lower() == "true"
+INSIGHTS_FLUSH_INTERVAL = float(os.getenv("INSIGHTS_FLUSH_INTERVAL", "1"))
+INSIGHTS_CMS_WIDTH = int(os.getenv("INSIGHTS_CMS_WIDTH", "2048"))
+INSIGHTS_CMS_DEPTH = int(os.getenv("INSIGHTS_CMS_DEPTH", "4"))
+# Heavy-hitter candidates kept per sketch; top-K reads take the first K of them
+INSIGHTS_CANDIDATES = int(os.getenv("INSIGHTS_CANDIDATES", "100"))
+INSIGHTS_KEY_PREFIX = "insights"
+
+_TOKENS = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "the and for was were with this that have has had but not are you your our they them "
+    "their its it's from been very too all any can could would will just about when what "
+    "there here than then also really again still only after before into over more most "
+    "some such get got did does don didn much one two out off who how why which".split()
+)
+
+class Window(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+# Bucket label format and how long a bucket's sketches are kept
+_WINDOWS = {
+    Window.HOUR: ("%Y%m%d%H", int(timedelta(hours=48).total_seconds())),
+    Window.DAY: ("%Y%m%d", int(timedelta(days=8).total_seconds())),
+}
+
+def _utcnow() -> datetime:
+    # Naive UTC like the rest of the app, without the deprecated datetime.utcnow()
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def window_start(window: Window, at: datetime) -> datetime:
+    if window == Window.HOUR:
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def message_terms(message: str) -> Set[str]:
+    """Distinct content words of a message (each counts once per message)."""
+    return {
+        token for token in _TOKENS.findall(message.lower())
+        if len(token) > 2 and not token.isdigit() and token not in _STOPWORDS
+    }
+
+def dimensions(sentiment: Optional[str], category: Optional[str], overall: bool = True) -> List[str]:
+    found = ["all"] if overall else []
+    if sentiment:
+        found.append(f"sentiment:{sentiment}")
+    if category:
+        found.append(f"category:{category}")
+    return found
+
+def _key(window: Window, bucket: datetime, dimension: str, sketch: str) -> str:
+    return f"{INSIGHTS_KEY_PREFIX}:{window.value}:{bucket.strftime(_WINDOWS[window][0])}:{dimension}:{sketch}"
+
+class CountMinSketch:
+    """
+    Cell addressing of a Count-Min sketch whose counters live in a Redis hash. Each row takes
+    4 bytes of one blake2b digest (not the salted built-in hash, and not crc32, whose seeds
+    are linear and so collide the same item pairs in every row), so every replica maps an
+    item to the same cells.
+    """
+
+    def __init__(self, width: int = INSIGHTS_CMS_WIDTH, depth: int = INSIGHTS_CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+
+    def cells(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=4 * self.depth).digest()
+        return [
+            row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width
+            for row in range(self.depth)
+        ]
+
+class _Delta:
+    """What one flush interval observed for one dimension."""
+
+    __slots__ = ("customers", "terms")
+
+    def __init__(self):
+        self.customers: Counter = Counter()
+        self.terms: Counter = Counter()
+
+class InsightsAggregator:
+    def __init__(self, sketch: Optional[CountMinSketch] = None, candidates: int = INSIGHTS_CANDIDATES):
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = candidates
+        # (window, bucket start, dimension) -> delta since the last flush
+        self._pending: Dict[Tuple[Window, datetime, str], _Delta] = defaultdict(_Delta)
+        # Candidates key -> (ttl, item -> estimate) counted in the sketch but not ranked yet
+        self._unranked: Dict[str, Tuple[int, Dict[str, int]]] = {}
+        self.flushed = 0
+
+    def observe(self, payload: dict, overall: bool = True, at: Optional[datetime] = None) -> None:
+        """Buffers one feedback event. overall=False adds only its sentiment/category dimensions."""
+        customer_id = payload.get("customer_id")
+        message = payload.get("message") or ""
+        at = at or _utcnow()
+        terms = message_terms(message)
+        for dimension in dimensions(payload.get("sentiment"), payload.get("category"), overall):
+            for window in Window:
+                delta = self._pending[(window, window_start(window, at), dimension)]
+                if customer_id:
+                    delta.customers[customer_id] += 1
+                delta.terms.update(terms)
+
+    async def flush(self) -> int:
+        """Merges the buffered deltas into the Redis sketches. Returns the sketches updated."""
+        if not self._pending:
+            await self._rank()
+            return 0
+        pending, self._pending = self._pending, defaultdict(_Delta)
+        pipe = get_redis().pipeline(transaction=False)
+        queued = 0
+        # (candidates key, ttl, [(item, index of its first HINCRBY reply)])
+        tops = []
+        for (window, bucket, dimension), delta in pending.items():
+            ttl = _WINDOWS[window][1]
+            if delta.customers:
+                hll = _key(window, bucket, dimension, "customers:hll")
+                pipe.pfadd(hll, *delta.customers)
+                pipe.expire(hll, ttl)
+                queued += 2
+            for kind, counts in (("customers", delta.customers), ("terms", delta.terms)):
+                if not counts:
+                    continue
+                cms = _key(window, bucket, dimension, f"{kind}:cms")
+                items = []
+                for item, amount in counts.items():
+                    items.append((item, queued))
+                    for cell in self.sketch.cells(item):
+                        pipe.hincrby(cms, cell, amount)
+                    queued += self.sketch.depth
+                pipe.expire(cms, ttl)
+                queued += 1
+                tops.append((_key(window, bucket, dimension, f"{kind}:top"), ttl, items))
+        try:
+            replies = await pipe.execute()
+        except Exception:
+            CACHE_ERRORS.labels("insights_flush").inc()
+            return 0
+        # Candidates are scored with the sketch's updated estimate: the minimum over its rows
+        for top, ttl, items in tops:
+            scores = self._unranked.setdefault(top, (ttl, {}))[1]
+            for item, first in items:
+                estimate = min(int(count) for count in replies[first:first + self.sketch.depth])
+                scores[item] = max(estimate, scores.get(item, 0))
+        await self._rank()
+        self.flushed += len(tops)
+        return len(tops)
+
+    async def _rank(self) -> None:
+        """Updates the top-K candidates; kept for the next flush if Redis fails meanwhile."""
+        if not self._unranked:
+            return
+        unranked, self._unranked = self._unranked, {}
+        pipe = get_redis().pipeline(transaction=False)
+        for top, (ttl, scores) in unranked.items():
+            pipe.zadd(top, scores, gt=True)
+            pipe.zremrangebyrank(top, 0, -self.candidates - 1)
+            pipe.expire(top, ttl)
+        try:
+            await pipe.execute()
+        except Exception:
+            CACHE_ERRORS.labels("insights_rank").inc()
+            for top, (ttl, scores) in unranked.items():
+                pending = self._unranked.setdefault(top, (ttl, {}))[1]
+                for item, score in scores.items():
+                    pending[item] = max(score, pending.get(item, 0))
+
+def _label(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+async def read_insights(window: Window = Window.HOUR, k: int = 10, at: Optional[datetime] = None) -> dict:
+    """Unique customers and top-k terms/customers for the window containing `at` (default now)."""
+    bucket = window_start(window, at or _utcnow())
+    names = ["all"] + [f"sentiment:{s.value}" for s in Sentiment] + [f"category:{c.value}" for c in Category]
+    pipe = get_redis().pipeline(transaction=False)
+    for dimension in names:
+        pipe.pfcount(_key(window, bucket, dimension, "customers:hll"))
+        pipe.zrevrange(_key(window, bucket, dimension, "terms:top"), 0, k - 1, withscores=True)
+        pipe.zrevrange(_key(window, bucket, dimension, "customers:top"), 0, k - 1, withscores=True)
+    results = await pipe.execute()
+
+    def section(offset: int) -> dict:
+        unique, terms, customers = results[offset:offset + 3]
+        return {
+            "unique_customers": int(unique),
+            "top_terms": [{"term": _label(term), "count": int(score)} for term, score in terms],
+            "top_customers": [{"customer_id": _label(c), "count": int(score)} for c, score in customers],
+        }
+
+    insights = {"window": window.value, "bucket_start": bucket.isoformat(), "by_sentiment": {}, "by_category": {}}
+    for index, dimension in enumerate(names):
+        kind, _, label = dimension.partition(":")
+        data = section(index * 3)
+        if kind == "all":
+            insights.update(data)
+        elif data["unique_customers"] or data["top_terms"]:
+            insights[f"by_{kind}"][label] = data
+    return insights
+
+_aggregator: Optional[InsightsAggregator] = None
+
+def get_insights_aggregator() -> InsightsAggregator:
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = InsightsAggregator()
+    return _aggregator
+
+def observe_event(payload: dict) -> None:
+    """Queue event listener. Pending (unanalyzed) events only count towards the overall sketches."""
+    get_insights_aggregator().observe(payload)
+
+def observe_analyzed(payloads: Iterable[dict]) -> None:
+    """Adds the sentiment/category dimensions of rows analyzed after ingestion."""
+    aggregator = get_insights_aggregator()
+    for payload in payloads:
+        aggregator.observe(payload, overall=False)
+
+async def flush_insights() -> int:
+    return await get_insights_aggregator().flush()
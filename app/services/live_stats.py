@@ -0,0 +1,166 @@
+"""
+Live dashboard stats, pushed to subscribers of /api/v1/dashboard/stream.
+
+One broadcaster per process observes every published feedback event (a queue event
+listener) and folds it into a pending delta. At most every STREAM_COALESCE_MS the delta is
+encoded once and handed to every subscriber, so a connected client costs a queue slot,
+not a request. Deltas only cover events published by this process; every
+STREAM_SNAPSHOT_INTERVAL seconds a snapshot of the shared Redis counters is pushed as well,
+which clients use to replace their totals, so writes on other replicas show up at snapshot
+time rather than as deltas.
+
+Every message carries a sequence number (the SSE `id`, `seq` in the WebSocket JSON). A client
+replaces its totals with each snapshot and applies only deltas whose sequence number is greater
+than that snapshot's; a delta numbered at or below it is already counted in the snapshot. The
+counters are incremented before an event is published, so events observed before a snapshot
+read are in it and their pending delta is dropped rather than pushed; only events observed while
+the read is in flight can be counted twice, until the next snapshot.
+
+Each subscriber has a bounded buffer (STREAM_SUBSCRIBER_BUFFER messages). A subscriber that
+falls that far behind is evicted: its stream ends and the client reconnects to a fresh
+snapshot, instead of the broadcaster holding an unbounded backlog for it.
+"""
+import os
+import time
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Optional, Set
+import orjson
+from app.core.metrics import CACHE_ERRORS
+from app.services.dashboard_stats import read_counters
+
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "500"))
+STREAM_SNAPSHOT_INTERVAL = float(os.getenv("STREAM_SNAPSHOT_INTERVAL", "5"))
+STREAM_SUBSCRIBER_BUFFER = int(os.getenv("STREAM_SUBSCRIBER_BUFFER", "16"))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "1000"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+
+class TooManySubscribers(Exception):
+    pass
+
+class StreamMessage:
+    """
+    One update, encoded once for every subscriber: as a server-sent event and as JSON text.
+    `seq` is the broadcaster's sequence number (see the module docstring).
+    """
+
+    __slots__ = ("sse", "text")
+
+    def __init__(self, event: str, data: dict, seq: int):
+        body = orjson.dumps(data)
+        self.sse = b"id: %d\nevent: " % seq + event.encode() + b"\ndata: " + body + b"\n\n"
+        self.text = orjson.dumps({"event": event, "seq": seq, "data": data}).decode()
+
+class Subscription:
+    __slots__ = ("queue", "evicted")
+
+    def __init__(self, buffer: int):
+        # StreamMessages; None ends the stream
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.evicted = False
+
+    def offer(self, message: StreamMessage) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class StatsBroadcaster:
+    def __init__(
+        self,
+        snapshot: Callable[[], Awaitable[Optional[dict]]] = read_counters,
+        snapshot_interval: float = STREAM_SNAPSHOT_INTERVAL,
+        buffer: int = STREAM_SUBSCRIBER_BUFFER,
+        max_subscribers: int = STREAM_MAX_SUBSCRIBERS,
+    ):
+        self._snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.buffer = buffer
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscription] = set()
+        self._delta: Counter = Counter()
+        self._snapshot_at: Optional[float] = None
+        # Number of the last message published
+        self.seq = 0
+        self.evicted = 0
+
+    def subscribe(self) -> Subscription:
+        if len(self._subscribers) >= self.max_subscribers:
+            raise TooManySubscribers(f"{len(self._subscribers)} dashboard streams already open")
+        subscription = Subscription(self.buffer)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def observe(self, payload: dict) -> None:
+        """Queue event listener: counts the event into the pending delta."""
+        if not self._subscribers:
+            return
+        self._delta["total"] += 1
+        # Pending rows have no labels yet; they arrive with a later snapshot
+        if payload.get("sentiment"):
+            self._delta[f"sentiment:{payload['sentiment']}"] += 1
+        if payload.get("category"):
+            self._delta[f"category:{payload['category']}"] += 1
+
+    def _publish(self, event: str, data: dict) -> None:
+        self.seq += 1
+        message = StreamMessage(event, data, self.seq)
+        for subscription in list(self._subscribers):
+            if not subscription.offer(message):
+                self._subscribers.discard(subscription)
+                subscription.evicted = True
+                subscription.close()
+                self.evicted += 1
+
+    async def tick(self) -> None:
+        """
+        Pushes the coalesced delta or, when due, a snapshot of the shared counters that
+        replaces it. If the snapshot is unavailable the delta is pushed instead.
+        """
+        if not self._subscribers:
+            self._delta.clear()
+            return
+        delta, self._delta = self._delta, Counter()
+        now = time.monotonic()
+        if self._snapshot_at is None or now - self._snapshot_at >= self.snapshot_interval:
+            self._snapshot_at = now
+            try:
+                snapshot = await self._snapshot()
+            except Exception:
+                CACHE_ERRORS.labels("stream_snapshot").inc()
+                snapshot = None
+            if snapshot is not None:
+                # The events in `delta` were counted before this read began
+                self._publish("snapshot", snapshot)
+                return
+        if delta:
+            self._publish("delta", _stats_shape(delta))
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "evicted": self.evicted}
+
+def _stats_shape(counts: Counter) -> dict:
+    """A delta in the /dashboard/stats shape."""
+    shaped = {"total_feedback": counts.get("total", 0), "by_category": {}, "by_sentiment": {}}
+    for field, value in counts.items():
+        kind, _, label = field.partition(":")
+        if kind in ("category", "sentiment"):
+            shaped[f"by_{kind}"][label] = value
+    return shaped
+
+_broadcaster: Optional[StatsBroadcaster] = None
+
+def get_broadcaster() -> StatsBroadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = StatsBroadcaster()
+    return _broadcaster
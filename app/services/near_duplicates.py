@@ -0,0 +1,263 @@
+"""
+Near-duplicate detection, so floods of copy-pasted feedback reuse one analysis.
+
+Messages are compared by the Jaccard similarity of their word unigrams and bigrams, tokens
+containing digits (order numbers, amounts, dates) left out. At ingest a MinHash signature
+of NEAR_DUP_PERMUTATIONS hashes is computed and indexed by LSH: NEAR_DUP_BANDS bands of
+rows, each hashed to one bucket key, so similar messages share a bucket with high
+probability. Buckets are kept in an in-process LRU and in Redis (one sorted set per
+bucket holding its _BUCKET_SIZE newest entries, NEAR_DUP_TTL), so every replica sees
+recent analyses. Within a batch, near-duplicates of an earlier message of the batch reuse
+its analysis too.
+
+The row stores a 64-bit fingerprint: the lowest bit of 64 of the minhashes (b-bit
+MinHash). Bucket candidates are confirmed by its Hamming distance: two messages with
+Jaccard similarity J agree on each bit with probability (1 + J) / 2, so the default
+NEAR_DUP_MAX_DISTANCE of 9 bits accepts J of roughly 0.7 and above. A match reuses the
+earlier row's analysis and is linked to it (`duplicate_of`).
+
+SimHash was the other candidate. On messages of a few dozen words, changing one name
+moves a 64-bit SimHash about as far as a different complaint on the same topic, so it
+cannot tell the two apart. Messages shorter than NEAR_DUP_MIN_TOKENS are not
+fingerprinted, because a single word ("not") can flip their meaning.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from app.core.cache import LRUCache, get_redis
+from app.core.metrics import CACHE_ERRORS, CACHE_LOOKUPS
+from app.services.ai_service import FeedbackAnalysis
+from app.services.analysis_cache import AI_CACHE_VERSION
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "9"))
+NEAR_DUP_MIN_TOKENS = int(os.getenv("NEAR_DUP_MIN_TOKENS", "5"))
+NEAR_DUP_PERMUTATIONS = int(os.getenv("NEAR_DUP_PERMUTATIONS", "64"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_TTL = int(os.getenv("NEAR_DUP_TTL", "3600"))
+NEAR_DUP_LOCAL_SIZE = int(os.getenv("NEAR_DUP_LOCAL_SIZE", "10000"))
+# Fingerprints kept per bucket, in the local index and in Redis
+_BUCKET_SIZE = 8
+
+_TOKENS = re.compile(r"\w+", re.UNICODE)
+_BITS = 64
+
+def _hash_family(count: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Fixed seed: every replica must draw the same hash functions
+    rng = np.random.default_rng(20240611)
+    multipliers = rng.integers(1, 2**63, count, dtype=np.uint64) | np.uint64(1)
+    return multipliers, rng.integers(0, 2**63, count, dtype=np.uint64)
+
+_MULTIPLIERS, _OFFSETS = _hash_family(max(NEAR_DUP_PERMUTATIONS, _BITS))
+
+class Fingerprint(NamedTuple):
+    bits: int
+    buckets: Tuple[str, ...]
+
+def message_fingerprint(
+    message: str,
+    bands: int = NEAR_DUP_BANDS,
+    permutations: int = NEAR_DUP_PERMUTATIONS,
+    min_tokens: int = NEAR_DUP_MIN_TOKENS,
+) -> Optional[Fingerprint]:
+    """MinHash LSH buckets and 64-bit fingerprint of a message, or None when it is too short."""
+    tokens = [token for token in _TOKENS.findall(message.casefold()) if not any(c.isdigit() for c in token)]
+    if len(tokens) < min_tokens:
+        return None
+    features = set(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    hashes = np.frombuffer(
+        b"".join(hashlib.blake2b(feature.encode(), digest_size=8).digest() for feature in features),
+        dtype=np.uint64,
+    )
+    count = max(permutations, _BITS)
+    # Multiply-shift hashing, one function per column: products wrap modulo 2^64 by design
+    with np.errstate(over="ignore"):
+        signature = ((hashes[:, None] * _MULTIPLIERS[:count] + _OFFSETS[:count]) >> np.uint64(32)).min(axis=0)
+    rows = permutations // bands
+    buckets = tuple(
+        hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()
+        for band in range(bands)
+    )
+    low_bits = (signature[:_BITS] & np.uint64(1)).astype(np.uint8)
+    return Fingerprint(int.from_bytes(np.packbits(low_bits, bitorder="little").tobytes(), "little"), buckets)
+
+def to_signed(fingerprint: Optional[Fingerprint]) -> Optional[int]:
+    """The 64-bit fingerprint as a signed integer (BIGINT column)."""
+    if fingerprint is None:
+        return None
+    bits = fingerprint.bits
+    return bits - (1 << _BITS) if bits >= 1 << (_BITS - 1) else bits
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class NearDuplicate(NamedTuple):
+    feedback_id: int
+    distance: int
+    analysis: FeedbackAnalysis
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        max_distance: int = NEAR_DUP_MAX_DISTANCE,
+        ttl: int = NEAR_DUP_TTL,
+        local_size: int = NEAR_DUP_LOCAL_SIZE,
+        version: str = AI_CACHE_VERSION,
+    ):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.version = version
+        # bucket key -> [(fingerprint bits, feedback id, analysis)], newest last
+        self.local = LRUCache(maxsize=local_size, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket_keys(self, fingerprint: Fingerprint, namespace: str) -> List[str]:
+        # "z": sorted-set buckets (hashes written by earlier releases just expire)
+        return [
+            f"neardup:{self.version}:z:{namespace}:{band}:{bucket}"
+            for band, bucket in enumerate(fingerprint.buckets)
+        ]
+
+    def _closest(
+        self, fingerprint: Fingerprint, entries: Iterable[Tuple[int, int, FeedbackAnalysis]]
+    ) -> Optional[NearDuplicate]:
+        best = None
+        for bits, feedback_id, analysis in entries:
+            distance = hamming(fingerprint.bits, bits)
+            if distance <= self.max_distance and (best is None or distance < best.distance):
+                best = NearDuplicate(feedback_id, distance, analysis)
+        return best
+
+    async def find_many(
+        self, fingerprints: List[Optional[Fingerprint]], namespace: str
+    ) -> List[Optional[NearDuplicate]]:
+        """The closest recently analyzed row per fingerprint, local index first, then Redis."""
+        results: List[Optional[NearDuplicate]] = [None] * len(fingerprints)
+        remote: List[int] = []
+        for i, fingerprint in enumerate(fingerprints):
+            if fingerprint is None:
+                continue
+            local = [
+                entry for key in self._bucket_keys(fingerprint, namespace) for entry in self.local.get(key) or ()
+            ]
+            results[i] = self._closest(fingerprint, local)
+            if results[i] is not None:
+                CACHE_LOOKUPS.labels("near_duplicate", "local").inc()
+            else:
+                remote.append(i)
+        if remote:
+            await self._find_remote(fingerprints, remote, namespace, results)
+        for i in remote:
+            CACHE_LOOKUPS.labels("near_duplicate", "redis" if results[i] else "miss").inc()
+        looked_up = [i for i, fingerprint in enumerate(fingerprints) if fingerprint is not None]
+        self.hits += sum(1 for i in looked_up if results[i] is not None)
+        self.misses += sum(1 for i in looked_up if results[i] is None)
+        return results
+
+    async def _find_remote(
+        self,
+        fingerprints: List[Optional[Fingerprint]],
+        indexes: List[int],
+        namespace: str,
+        results: List[Optional[NearDuplicate]],
+    ) -> None:
+        pipe = get_redis().pipeline(transaction=False)
+        for i in indexes:
+            for key in self._bucket_keys(fingerprints[i], namespace):
+                pipe.zrevrange(key, 0, -1)
+        try:
+            replies = iter(await pipe.execute())
+        except Exception:
+            CACHE_ERRORS.labels("near_duplicate_find").inc()
+            return
+        for i in indexes:
+            entries = []
+            for _ in fingerprints[i].buckets:
+                for raw in next(replies):
+                    try:
+                        entry = json.loads(raw)
+                        entries.append((int(entry["bits"]), entry["id"], FeedbackAnalysis.model_validate(entry["analysis"])))
+                    except (ValueError, KeyError):
+                        continue
+            results[i] = self._closest(fingerprints[i], entries)
+            if results[i] is not None:
+                self._remember_local(fingerprints[i], results[i].feedback_id, results[i].analysis, namespace)
+
+    async def find(self, fingerprint: Optional[Fingerprint], namespace: str) -> Optional[NearDuplicate]:
+        return (await self.find_many([fingerprint], namespace))[0]
+
+    def _remember_local(
+        self, fingerprint: Fingerprint, feedback_id: int, analysis: FeedbackAnalysis, namespace: str
+    ) -> None:
+        for key in self._bucket_keys(fingerprint, namespace):
+            bucket = self.local.get(key) or []
+            self.local.set(key, (bucket + [(fingerprint.bits, feedback_id, analysis)])[-_BUCKET_SIZE:])
+
+    async def remember_many(
+        self, entries: Iterable[Tuple[Optional[Fingerprint], int, FeedbackAnalysis]], namespace: str
+    ) -> None:
+        """Indexes analyzed rows as (fingerprint, feedback id, analysis). Fallback analyses are skipped."""
+        pipe = get_redis().pipeline(transaction=False)
+        queued = False
+        now = time.time()
+        for fingerprint, feedback_id, analysis in entries:
+            if fingerprint is None or analysis._fallback:
+                continue
+            self._remember_local(fingerprint, feedback_id, analysis, namespace)
+            value = json.dumps({"bits": fingerprint.bits, "id": feedback_id, "analysis": analysis.model_dump(mode="json")})
+            for key in self._bucket_keys(fingerprint, namespace):
+                # Newest last; the bucket keeps its _BUCKET_SIZE newest entries
+                pipe.zadd(key, {value: now})
+                pipe.zremrangebyrank(key, 0, -_BUCKET_SIZE - 1)
+                pipe.expire(key, self.ttl)
+            queued = True
+        if not queued:
+            return
+        try:
+            await pipe.execute()
+        except Exception:
+            CACHE_ERRORS.labels("near_duplicate_remember").inc()
+
+    def dedupe(self, fingerprints: List[Optional[Fingerprint]], indexes: Iterable[int]) -> Dict[int, int]:
+        """
+        Near-duplicates among `indexes` of a batch: maps each to the earlier index whose
+        analysis it can reuse. Unmapped indexes have to be analyzed.
+        """
+        kept: Dict[Tuple[int, str], List[int]] = {}
+        copies: Dict[int, int] = {}
+        for i in indexes:
+            fingerprint = fingerprints[i]
+            if fingerprint is None:
+                continue
+            bands = list(enumerate(fingerprint.buckets))
+            candidates = {j for band in bands for j in kept.get(band, ())}
+            closest = min(candidates, key=lambda j: (hamming(fingerprint.bits, fingerprints[j].bits), j), default=None)
+            if closest is not None and hamming(fingerprint.bits, fingerprints[closest].bits) <= self.max_distance:
+                copies[i] = closest
+                continue
+            for band in bands:
+                kept.setdefault(band, []).append(i)
+        return copies
+
+    async def remember(
+        self, fingerprint: Optional[Fingerprint], feedback_id: int, analysis: FeedbackAnalysis, namespace: str
+    ) -> None:
+        await self.remember_many([(fingerprint, feedback_id, analysis)], namespace)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+        }
+
+# Shared by every ingestion path in the process
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,50 @@
+"""
+Durable outbox for feedback events the broker could not take.
+The publisher spills unconfirmed events here; a background relay re-publishes them in id
+order with confirms and deletes what the broker acknowledged (at-least-once delivery).
+"""
+import os
+import json
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import delete, insert, select
+from app.core.database import DBClusterType, session_scope
+from app.core.queue import EventPublisher, get_publisher
+from app.models.outbox import OutboxEvent
+
+OUTBOX_RELAY_INTERVAL = int(os.getenv("OUTBOX_RELAY_INTERVAL", "5"))
+OUTBOX_RELAY_BATCH = int(os.getenv("OUTBOX_RELAY_BATCH", "500"))
+
+async def spill_to_outbox(payloads: List[dict]) -> None:
+    now = datetime.utcnow()
+    async with session_scope(DBClusterType.WRITER) as session:
+        await session.exec(insert(OutboxEvent), params=[
+            {"payload": json.dumps(payload), "created_at": now} for payload in payloads
+        ])
+        await session.commit()
+
+async def relay_outbox(
+    publisher: Optional[EventPublisher] = None, batch_size: int = OUTBOX_RELAY_BATCH
+) -> int:
+    """Drains the outbox while the broker confirms. Returns the number of events relayed."""
+    publisher = publisher or get_publisher()
+    relayed = 0
+    async with session_scope(DBClusterType.WRITER) as session:
+        while True:
+            # SKIP LOCKED lets relays on several replicas drain disjoint rows (no-op on SQLite)
+            rows = (await session.exec(
+                select(OutboxEvent).order_by(OutboxEvent.id).limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not rows:
+                break
+            confirmed = await publisher.publish_confirmed([json.loads(row.payload) for row in rows])
+            sent = [row.id for row, ok in zip(rows, confirmed) if ok]
+            if sent:
+                await session.exec(delete(OutboxEvent).where(OutboxEvent.id.in_(sent)))
+            await session.commit()
+            relayed += len(sent)
+            if len(sent) < len(rows):
+                # Broker trouble: leave the rest for the next run
+                break
+    return relayed
@@ -0,0 +1,160 @@
+"""
+Partition maintenance and retention for feedback.
+
+Every PARTITION_MAINTENANCE_INTERVAL seconds one replica (Redis lock; without Redis every
+replica runs it, the steps being idempotent):
+- creates the upcoming monthly partitions (Postgres, partitioned table)
+- archives each month older than FEEDBACK_RETENTION_MONTHS to a gzip-compressed NDJSON file
+  in ARCHIVE_DIR (`feedback_yYYYYmMM.ndjson.gz`, all columns, written to a temporary file
+  and renamed once complete; a month without rows gets no file), then detaches and drops
+  that month's partition and deletes the month's rows left in the DEFAULT partition (or in
+  the table, when not partitioned).
+
+The hourly rollup is not touched, so windowed dashboard stats keep covering archived months.
+"""
+import os
+import gzip
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+import orjson
+from sqlalchemy import delete, func, select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import get_redis
+from app.core.database import DBClusterType, PARTITION_PREMAKE_MONTHS, session_scope
+from app.core.partitions import (
+    add_months, default_partition_name, detach_partition, ensure_partitions, is_partitioned,
+    list_partitions, month_start, partition_name,
+)
+from app.models.feedback import Feedback
+
+# Months kept in the database (the current month included); 0 keeps everything
+FEEDBACK_RETENTION_MONTHS = int(os.getenv("FEEDBACK_RETENTION_MONTHS", "0"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600"))
+ARCHIVE_BATCH_ROWS = 5000
+_LOCK_KEY = "lock:partition_maintenance"
+
+def archive_path(month: datetime, directory: str = ARCHIVE_DIR) -> str:
+    return os.path.join(directory, f"{partition_name(Feedback.__tablename__, month)}.ndjson.gz")
+
+async def archive_month(session: AsyncSession, month: datetime, directory: str = ARCHIVE_DIR) -> int:
+    """
+    Writes the month's rows to its archive file, then removes them (and the month's partition).
+    Returns the row count; no file is written for a month without rows.
+    """
+    lower, upper = month_start(month), add_months(month_start(month), 1)
+    columns = list(Feedback.__table__.columns)
+    query = (
+        select(*columns)
+        .where(Feedback.created_at >= lower, Feedback.created_at < upper)
+        .order_by(Feedback.id)
+        .execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_ROWS)
+    )
+    path = archive_path(month, directory)
+    rows = 0
+    archive: Optional[gzip.GzipFile] = None
+    try:
+        result = await session.stream(query)
+        async for partition in result.partitions():
+            if archive is None:
+                # Opened on the first row, so an empty month leaves no file behind
+                os.makedirs(directory, exist_ok=True)
+                archive = gzip.open(f"{path}.tmp", "wb")
+            chunk = b"".join(
+                orjson.dumps({column.name: value for column, value in zip(columns, row)}) + b"\n"
+                for row in partition
+            )
+            await asyncio.to_thread(archive.write, chunk)
+            rows += len(partition)
+    finally:
+        if archive is not None:
+            archive.close()
+    if rows:
+        os.replace(f"{path}.tmp", path)
+
+    connection = await session.connection()
+    name = partition_name(Feedback.__tablename__, lower)
+    has_partition = await connection.run_sync(_has_partition, name)
+    # Ends the read transaction, which a concurrent detach would otherwise wait for
+    await session.commit()
+    if has_partition:
+        async with connection.engine.connect() as autocommit:
+            autocommit = await autocommit.execution_options(isolation_level="AUTOCOMMIT")
+            await autocommit.run_sync(detach_partition, Feedback.__tablename__, name)
+            await autocommit.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    if not rows:
+        print(f"[Retention] No rows in {lower:%Y-%m}, nothing archived")
+        return 0
+    # Partitioned, what is left of the month is in the DEFAULT partition
+    await session.exec(delete(Feedback).where(Feedback.created_at >= lower, Feedback.created_at < upper))
+    await session.commit()
+    print(f"[Retention] Archived {rows} rows of {lower:%Y-%m} to {path}")
+    return rows
+
+def _has_partition(conn, name: str) -> bool:
+    if conn.dialect.name != "postgresql" or not is_partitioned(conn, Feedback.__tablename__):
+        return False
+    return any(partition == name for partition, _ in list_partitions(conn, Feedback.__tablename__))
+
+def _default_months(conn, cutoff: datetime) -> List[datetime]:
+    """Months before `cutoff` with rows in the DEFAULT partition."""
+    name = default_partition_name(Feedback.__tablename__)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+        return []
+    return list(conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at) FROM {name} WHERE created_at < :cutoff"
+    ), {"cutoff": cutoff}).scalars())
+
+async def expired_months(session: AsyncSession, cutoff: datetime) -> List[datetime]:
+    """
+    Months before `cutoff` that still hold rows (or, partitioned, still have a partition or
+    rows in the DEFAULT partition). Unpartitioned, archived months no longer hold rows, so
+    the search starts after them: one index seek per month with rows, none per empty month.
+    """
+    connection = await session.connection()
+    if connection.dialect.name == "postgresql" and await connection.run_sync(
+        is_partitioned, Feedback.__tablename__
+    ):
+        partitions = await connection.run_sync(list_partitions, Feedback.__tablename__)
+        months = {month for _, month in partitions if month < cutoff}
+        months.update(await connection.run_sync(_default_months, cutoff))
+        return sorted(months)
+    months: List[datetime] = []
+    after: Optional[datetime] = None
+    while True:
+        query = select(func.min(Feedback.created_at)).where(Feedback.created_at < cutoff)
+        if after is not None:
+            query = query.where(Feedback.created_at >= after)
+        oldest: Optional[datetime] = await session.scalar(query)
+        if oldest is None:
+            return months
+        months.append(month_start(oldest))
+        after = add_months(months[-1], 1)
+
+async def run_partition_maintenance(
+    retention_months: int = FEEDBACK_RETENTION_MONTHS, directory: str = ARCHIVE_DIR
+) -> int:
+    """Creates upcoming partitions and archives expired months. Returns the rows archived."""
+    try:
+        if not await get_redis().set(_LOCK_KEY, "1", nx=True, ex=max(PARTITION_MAINTENANCE_INTERVAL - 1, 1)):
+            return 0
+    except Exception:
+        # Redis unavailable: run anyway, every step is idempotent
+        pass
+    archived = 0
+    async with session_scope(DBClusterType.WRITER) as session:
+        connection = await session.connection()
+        if connection.dialect.name == "postgresql" and await connection.run_sync(
+            is_partitioned, Feedback.__tablename__
+        ):
+            await connection.run_sync(
+                ensure_partitions, Feedback.__tablename__, datetime.utcnow(), PARTITION_PREMAKE_MONTHS + 1
+            )
+            await session.commit()
+        if retention_months <= 0:
+            return 0
+        cutoff = add_months(month_start(datetime.utcnow()), 1 - retention_months)
+        for month in await expired_months(session, cutoff):
+            archived += await archive_month(session, month, directory)
+    return archived
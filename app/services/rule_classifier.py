@@ -0,0 +1,176 @@
+"""
+Local rule-based classifier: the provider used without an LLM key, and the CPU-cheap tier
+for bulk and backfill workloads.
+
+Every keyword/phrase of the rule set is compiled into one regex with word boundaries,
+factored as a character trie so the scan does not try each rule in turn at every position. A term may end in
+`*` to match any word ending ("crash*" matches "crashes"); multi-word phrases match across
+any whitespace. Each match adds its weight to its label; the best-scoring label wins, ties
+going to the label listed first, and messages without matches get the axis default.
+
+`classify_batch` scans a whole batch as a single string and scores it with one NumPy
+accumulation, which is what makes thousands of messages per call cheap.
+"""
+import os
+import re
+import json
+import hashlib
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+from app.models.feedback import Sentiment, Category
+
+# JSON file with the same shape as DEFAULT_RULES; replaces the built-in rules
+AI_RULES_PATH = os.getenv("AI_RULES_PATH")
+
+# axis -> label -> term -> weight. Label order is the tie-break priority.
+DEFAULT_RULES: Dict[str, Dict[str, Dict[str, float]]] = {
+    "sentiment": {
+        Sentiment.NEGATIVE.value: {
+            "bad": 1.0, "slow": 1.0, "broken": 1.0, "terrible": 1.5, "worst": 1.5,
+            "awful": 1.5, "rude": 1.0, "never arrived": 1.5, "not working": 1.5,
+            "disappointed": 1.0, "refund*": 0.5,
+        },
+        Sentiment.POSITIVE.value: {
+            "good": 1.0, "great": 1.0, "fast": 1.0, "love*": 1.5, "best": 1.5,
+            "excellent": 1.5, "amazing": 1.5, "thank*": 0.5, "lovely": 1.0,
+        },
+        Sentiment.NEUTRAL.value: {},
+    },
+    "category": {
+        Category.DELIVERY.value: {
+            "deliver*": 1.0, "shipping": 1.0, "shipped": 1.0, "late": 1.0, "courier": 1.0,
+            "parcel": 1.0, "package": 0.5,
+        },
+        Category.PRODUCT.value: {
+            "product*": 1.0, "feature*": 1.0, "quality": 1.0, "app": 1.0, "website": 1.0,
+            "bug*": 1.0, "crash*": 1.0,
+        },
+        Category.SERVICE.value: {
+            "service": 1.0, "support": 1.0, "rude": 1.0, "staff": 1.0, "agent": 0.5,
+        },
+        Category.OTHER.value: {},
+    },
+}
+_DEFAULT_LABELS = {"sentiment": Sentiment.NEUTRAL.value, "category": Category.OTHER.value}
+# Keeps a single weak match from reading as certainty: one clear keyword per axis scores 0.67,
+# which clears the default cascade threshold; conflicting evidence stays under it
+_CONFIDENCE_PRIOR = 0.5
+_SEPARATOR = "\x00"
+_RESOLVED_MAX = 65_536
+
+class RuleMatch(NamedTuple):
+    sentiment: Sentiment
+    category: Category
+    # 0 when nothing matched; approaches 1 with strong, unambiguous evidence
+    confidence: float
+
+def _trie_pattern(node: dict) -> str:
+    """Regex for a character trie; "" keys mark term ends ("*" = any word ending may follow)."""
+    end = node.get("")
+    alternatives = [
+        (r"\s+" if char == " " else re.escape(char)) + _trie_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if end == "*":
+        return "(?:" + "|".join(alternatives + [r"\w*"]) + ")" if alternatives else r"\w*"
+    if not alternatives:
+        return ""
+    body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    return f"(?:{body})?" if end else body
+
+class RuleClassifier:
+    def __init__(self, rules: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None):
+        rules = rules or DEFAULT_RULES
+        self.version = hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:8]
+        self._sentiments = [Sentiment(label) for label in rules["sentiment"]]
+        self._categories = [Category(label) for label in rules["category"]]
+        # Score columns: sentiment labels, then category labels (each in priority order)
+        columns = {("sentiment", s.value): i for i, s in enumerate(self._sentiments)}
+        columns.update({("category", c.value): len(columns) + i for i, c in enumerate(self._categories)})
+        self._defaults = (
+            self._sentiments.index(Sentiment(_DEFAULT_LABELS["sentiment"])),
+            self._categories.index(Category(_DEFAULT_LABELS["category"])),
+        )
+
+        # One rule per distinct term; a term may score on both axes
+        terms: Dict[str, int] = {}
+        weights: List[np.ndarray] = []
+        for axis, labels in rules.items():
+            for label, entries in labels.items():
+                for term, weight in entries.items():
+                    key = " ".join(term.lower().split())
+                    if key not in terms:
+                        terms[key] = len(terms)
+                        weights.append(np.zeros(len(columns), np.float32))
+                    weights[terms[key]][columns[(axis, label)]] += weight
+        self._weights = np.vstack(weights) if weights else np.zeros((0, len(columns)), np.float32)
+        self._exact = {t: i for t, i in terms.items() if not t.endswith("*")}
+        # Longest prefix first, so "refund request*" wins over "refund*"
+        self._prefixes = sorted(
+            ((t.rstrip("*"), i) for t, i in terms.items() if t.endswith("*")), key=lambda p: -len(p[0])
+        )
+        self._resolved: Dict[str, int] = {}
+        trie: dict = {}
+        for term in terms:
+            node = trie
+            for char in term.rstrip("*"):
+                node = node.setdefault(char, {})
+            node[""] = "*" if term.endswith("*") or node.get("") == "*" else "="
+        self._regex = re.compile(rf"\b(?:{_trie_pattern(trie) or '(?!)'})\b", re.IGNORECASE)
+
+    def _rule(self, matched: str) -> int:
+        """Rule index of a matched span, -1 if none (memoised: spans repeat across messages)."""
+        rule = self._resolved.get(matched)
+        if rule is None:
+            text = " ".join(matched.lower().split())
+            rule = self._exact.get(text)
+            if rule is None:
+                rule = next((i for prefix, i in self._prefixes if text.startswith(prefix)), -1)
+            if len(self._resolved) >= _RESOLVED_MAX:
+                self._resolved.clear()
+            self._resolved[matched] = rule
+        return rule
+
+    @classmethod
+    def from_env(cls) -> "RuleClassifier":
+        if AI_RULES_PATH:
+            with open(AI_RULES_PATH) as f:
+                return cls(json.load(f))
+        return cls()
+
+    def classify(self, message: str) -> RuleMatch:
+        return self.classify_batch([message])[0]
+
+    def classify_batch(self, messages: Sequence[str]) -> List[RuleMatch]:
+        if not messages:
+            return []
+        text = _SEPARATOR.join(m.replace(_SEPARATOR, " ") for m in messages)
+        starts = np.cumsum([0] + [len(m) + 1 for m in messages[:-1]])
+        positions, rules = [], []
+        for match in self._regex.finditer(text):
+            rule = self._rule(match.group())
+            if rule >= 0:
+                positions.append(match.start())
+                rules.append(rule)
+
+        scores = np.zeros((len(messages), self._weights.shape[1]), np.float32)
+        if positions:
+            rows = np.searchsorted(starts, positions, side="right") - 1
+            np.add.at(scores, rows, self._weights[rules])
+        n_sentiments = len(self._sentiments)
+        sentiments, sentiment_confidence = self._decide(scores[:, :n_sentiments], self._defaults[0])
+        categories, category_confidence = self._decide(scores[:, n_sentiments:], self._defaults[1])
+        confidences = np.minimum(sentiment_confidence, category_confidence).tolist()
+        return [
+            RuleMatch(self._sentiments[s], self._categories[c], confidence)
+            for s, c, confidence in zip(sentiments.tolist(), categories.tolist(), confidences)
+        ]
+
+    @staticmethod
+    def _decide(scores: np.ndarray, default: int):
+        """Per-row winning label (argmax's first maximum: ties go to the higher priority) and confidence."""
+        totals = scores.sum(axis=1)
+        best = np.argmax(scores, axis=1)
+        matched = totals > 0
+        confidence = np.where(matched, scores[np.arange(len(scores)), best] / (totals + _CONFIDENCE_PRIOR), 0.0)
+        return np.where(matched, best, default), confidence
@@ -0,0 +1,89 @@
+"""
+Similar-feedback lookups. Messages are embedded locally at ingestion and appended to the
+memory-mapped vector store; neighbours of a row are found by re-embedding its message.
+
+The IVF index is (re)trained by a background job every VECTOR_TRAIN_INTERVAL seconds when
+the store needs it, never on the ingestion path. `backfill_index` embeds the rows missing
+from the store (ones written before it existed): python -m app.workers.vector_index
+"""
+import os
+import asyncio
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import get_redis
+from app.core.vector_store import VectorStore
+from app.models.feedback import Feedback
+from app.services.embeddings import HashingEmbedder
+
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+# With several replicas, a volume they all mount (see k8s/vector-store-pvc.yaml)
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "data/vectors")
+VECTOR_TRAIN_INTERVAL = int(os.getenv("VECTOR_TRAIN_INTERVAL", "300"))
+VECTOR_BACKFILL_BATCH = 1000
+_TRAIN_LOCK_KEY = "lock:vector_training"
+
+_embedder = HashingEmbedder()
+_store: Optional[VectorStore] = None
+
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        _store = VectorStore(VECTOR_STORE_DIR, _embedder.dim)
+    return _store
+
+def _index(rows: List[Tuple[int, str]]) -> None:
+    get_vector_store().add([id for id, _ in rows], _embedder.embed_batch(m for _, m in rows))
+
+async def index_feedback(rows: Iterable[Tuple[int, str]]) -> None:
+    """Embeds and stores (id, message) pairs. Failures are logged, never raised to the writer."""
+    rows = list(rows)
+    if not SIMILARITY_ENABLED or not rows:
+        return
+    try:
+        await asyncio.to_thread(_index, rows)
+    except Exception as e:
+        print(f"[Similarity] Indexing {len(rows)} rows failed: {e}")
+
+async def find_similar(message: str, k: int = 10, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Top-k (id, cosine similarity) for a message, excluding the row itself."""
+    hits = await asyncio.to_thread(get_vector_store().search, _embedder.embed(message), k + 1)
+    return [(id, score) for id, score in hits if id != exclude_id][:k]
+
+async def train_vector_index() -> bool:
+    """Trains the IVF index in a worker thread if the store needs it. True if it trained."""
+    if not SIMILARITY_ENABLED:
+        return False
+    store = get_vector_store()
+    if not await asyncio.to_thread(lambda: store.needs_training):
+        return False
+    try:
+        # One replica per interval; the store itself stays consistent either way
+        if not await get_redis().set(_TRAIN_LOCK_KEY, "1", nx=True, ex=max(VECTOR_TRAIN_INTERVAL - 1, 1)):
+            return False
+    except Exception:
+        pass
+    await asyncio.to_thread(store.train)
+    print(f"[Similarity] Trained the vector index on {len(store)} rows")
+    return True
+
+async def backfill_index(session: AsyncSession, batch_size: int = VECTOR_BACKFILL_BATCH) -> int:
+    """Embeds and stores every feedback row missing from the vector store. Returns the rows added."""
+    known = np.unique(await asyncio.to_thread(lambda: get_vector_store().ids()))
+    query = (
+        select(Feedback.id, Feedback.message)
+        .order_by(Feedback.id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    added = 0
+    result = await session.stream(query)
+    async for partition in result.partitions():
+        ids = np.fromiter((row[0] for row in partition), np.int64, len(partition))
+        positions = np.minimum(np.searchsorted(known, ids), max(len(known) - 1, 0))
+        missing = known[positions] != ids if len(known) else np.ones(len(ids), bool)
+        rows = [(int(row[0]), row[1]) for row, new in zip(partition, missing) if new]
+        if rows:
+            await asyncio.to_thread(_index, rows)
+            added += len(rows)
+    return added
@@ -0,0 +1,202 @@
+"""
+Hourly (bucket, category, sentiment) -> count rollup of the feedback table.
+Maintained by a background job on the writer: incrementally past an id watermark, with the
+most recent buckets re-aggregated on every run. The time-windowed dashboard reads it from
+the analytics cluster.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.database import DBClusterType, session_scope
+from app.models.feedback import Feedback, Category, Sentiment
+from app.models.rollup import FeedbackStatsHourly, RollupWatermark
+
+ROLLUP_NAME = "feedback_stats_hourly"
+ROLLUP_INTERVAL = int(os.getenv("ROLLUP_INTERVAL", "60"))
+ROLLUP_BATCH_ROWS = int(os.getenv("ROLLUP_BATCH_ROWS", "100000"))
+# Buckets this recent are re-aggregated on every run: rows committed out of id order or
+# analyzed later than this after insertion are not counted
+ROLLUP_RECOMPUTE_WINDOW = int(os.getenv("ROLLUP_RECOMPUTE_WINDOW", "3600"))
+
+class Bucket(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+
+def _truncate(column, unit: str, dialect: str):
+    if dialect == "postgresql":
+        return func.date_trunc(unit, column)
+    # SQLite: ISO strings, parsed back in Python
+    if unit == "hour":
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    if unit == "day":
+        return func.strftime("%Y-%m-%d 00:00:00", column)
+    # ISO weeks start on Monday
+    return func.strftime("%Y-%m-%d 00:00:00", func.date(column, "-6 days", "weekday 1"))
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at is stored as naive UTC
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _insert(dialect: str):
+    # Dialect-specific INSERT, for ON CONFLICT support
+    return postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+# --- 1. Incremental maintenance ---
+
+async def refresh_rollup(
+    session: AsyncSession, batch_rows: int = ROLLUP_BATCH_ROWS, now: Optional[datetime] = None
+) -> int:
+    """
+    Folds feedback rows past the watermark into the rollup, in the same transaction that
+    advances the watermark. Returns the number of rows processed.
+    Rows in the recompute window are passed over and left to recompute_recent.
+    """
+    dialect = session.bind.dialect.name
+    watermark = await _lock_watermark(session, dialect)
+    start = watermark.last_id
+
+    upper = (await session.exec(select(func.max(Feedback.id)).where(Feedback.id > start))).scalar_one()
+    if upper is None:
+        await session.commit()
+        return 0
+    upper = min(upper, start + batch_rows)
+
+    rows = await _aggregate(session, dialect, Feedback.id > start, Feedback.id <= upper,
+                            Feedback.created_at < _recompute_cutoff(now))
+    if rows:
+        statement = _insert(dialect)(FeedbackStatsHourly)
+        statement = statement.on_conflict_do_update(
+            index_elements=["bucket", "category", "sentiment"],
+            set_={"count": FeedbackStatsHourly.count + statement.excluded.count},
+        )
+        await session.exec(statement, params=rows)
+
+    watermark.last_id = upper
+    watermark.updated_at = datetime.utcnow()
+    session.add(watermark)
+    await session.commit()
+    return upper - start
+
+async def recompute_recent(session: AsyncSession, now: Optional[datetime] = None) -> int:
+    """
+    Re-aggregates the buckets of the last ROLLUP_RECOMPUTE_WINDOW seconds from the feedback
+    table, replacing their counts. Ids are allocated at INSERT but become visible at commit,
+    so the watermark can pass a lower id that commits later; async rows are labelled after
+    they were inserted. Both are counted here while they are recent. Returns the number
+    of buckets written.
+    """
+    dialect = session.bind.dialect.name
+    # Same row lock as refresh_rollup: one replica rewrites the window at a time
+    watermark = await _lock_watermark(session, dialect)
+    cutoff = _recompute_cutoff(now)
+    # Rows past the watermark are left to refresh_rollup, so none is counted twice
+    rows = await _aggregate(session, dialect, Feedback.created_at >= cutoff, Feedback.id <= watermark.last_id)
+    await session.exec(delete(FeedbackStatsHourly).where(FeedbackStatsHourly.bucket >= cutoff))
+    if rows:
+        await session.exec(_insert(dialect)(FeedbackStatsHourly), params=rows)
+    await session.commit()
+    return len(rows)
+
+def _recompute_cutoff(now: Optional[datetime]) -> datetime:
+    """Start of the oldest hourly bucket in the recompute window."""
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=ROLLUP_RECOMPUTE_WINDOW)
+    return cutoff.replace(minute=0, second=0, microsecond=0)
+
+async def _aggregate(session: AsyncSession, dialect: str, *conditions) -> List[dict]:
+    """Analyzed feedback matching `conditions`, counted per (hour, category, sentiment)."""
+    hour = _truncate(Feedback.created_at, "hour", dialect).label("bucket")
+    rows = (await session.exec(
+        select(hour, Feedback.category, Feedback.sentiment, func.count(Feedback.id))
+        .where(*conditions, Feedback.category.is_not(None), Feedback.sentiment.is_not(None))
+        .group_by(hour, Feedback.category, Feedback.sentiment)
+    )).all()
+    return [{"bucket": _as_datetime(b), "category": c, "sentiment": s, "count": n} for b, c, s, n in rows]
+
+async def _lock_watermark(session: AsyncSession, dialect: str) -> RollupWatermark:
+    await session.exec(
+        _insert(dialect)(RollupWatermark)
+        .values(name=ROLLUP_NAME, last_id=0, updated_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    # Row lock serialises concurrent refreshes from several replicas (no-op on SQLite)
+    result = await session.exec(
+        select(RollupWatermark).where(RollupWatermark.name == ROLLUP_NAME).with_for_update()
+    )
+    return result.scalar_one()
+
+async def run_rollup() -> int:
+    processed = 0
+    now = datetime.utcnow()
+    async with session_scope(DBClusterType.WRITER) as session:
+        # Catch up in batches so one run never holds a huge transaction
+        while True:
+            batch = await refresh_rollup(session, now=now)
+            processed += batch
+            if batch < ROLLUP_BATCH_ROWS:
+                break
+        await recompute_recent(session, now)
+    return processed
+
+# --- 2. Time-windowed reads ---
+
+async def windowed_stats(
+    session: AsyncSession,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    bucket: Bucket = Bucket.DAY,
+) -> dict:
+    dialect = session.bind.dialect.name
+    start, end = naive_utc(start), naive_utc(end)
+    if start is not None:
+        # Hourly resolution: a window starting mid-hour includes that hour's bucket
+        start = start.replace(minute=0, second=0, microsecond=0)
+    period = (
+        FeedbackStatsHourly.bucket if bucket == Bucket.HOUR
+        else _truncate(FeedbackStatsHourly.bucket, bucket.value, dialect)
+    ).label("period")
+    conditions = []
+    if start is not None:
+        conditions.append(FeedbackStatsHourly.bucket >= start)
+    if end is not None:
+        conditions.append(FeedbackStatsHourly.bucket < end)
+    query = (
+        select(period, FeedbackStatsHourly.category, FeedbackStatsHourly.sentiment,
+               func.sum(FeedbackStatsHourly.count))
+        .where(*conditions)
+        .group_by(period, FeedbackStatsHourly.category, FeedbackStatsHourly.sentiment)
+        .order_by(period)
+    )
+    rows: List[Tuple] = (await session.exec(query)).all()
+
+    series: Dict[datetime, dict] = {}
+    totals = {"total_feedback": 0, "by_category": {}, "by_sentiment": {}}
+    for period_value, category, sentiment, count in rows:
+        key = _as_datetime(period_value)
+        point = series.setdefault(key, {"bucket": key, "total": 0, "by_category": {}, "by_sentiment": {}})
+        point["total"] += count
+        totals["total_feedback"] += count
+        for target in (point, totals):
+            _add(target["by_category"], category, count)
+            _add(target["by_sentiment"], sentiment, count)
+
+    return {
+        "from": start,
+        "to": end,
+        "bucket": bucket.value,
+        **totals,
+        "series": list(series.values()),
+    }
+
+def _add(counts: dict, label, count: int) -> None:
+    key = label.value if isinstance(label, (Category, Sentiment)) else label
+    counts[key] = counts.get(key, 0) + count
@@ -0,0 +1,159 @@
+"""
+Analysis worker: consumes pending feedback events, runs the AI analysis and
+bulk-updates the rows persisted by the 202-Accepted ingestion path.
+
+Run with: python -m app.workers.analysis
+"""
+import os
+import asyncio
+from typing import AsyncIterator, List, Optional, Set, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+from app.core.background import start_periodic, stop_all
+from app.core.database import db_manager, DBClusterType
+from app.core.queue import ConsumedEvent, consume_feedback_events
+from app.models.feedback import Feedback
+from app.services.ai_service import AIService, FeedbackAnalysis, get_ai_service
+from app.services.dashboard_stats import increment_counters
+from app.services.near_duplicates import NEAR_DUP_ENABLED, Fingerprint, message_fingerprint, near_duplicates
+from app.services.insights import INSIGHTS_ENABLED, INSIGHTS_FLUSH_INTERVAL, flush_insights, observe_analyzed
+
+WORKER_PREFETCH = int(os.getenv("WORKER_PREFETCH", "32"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "50"))
+WORKER_FLUSH_INTERVAL = float(os.getenv("WORKER_FLUSH_INTERVAL", "0.5"))
+
+class AnalysisWorker:
+    def __init__(
+        self,
+        ai_service: AIService,
+        session_factory: sessionmaker,
+        concurrency: int = WORKER_CONCURRENCY,
+        batch_size: int = WORKER_BATCH_SIZE,
+        flush_interval: float = WORKER_FLUSH_INTERVAL,
+    ):
+        self.ai_service = ai_service
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        # (event, analysis, fingerprint, id of the near-duplicate whose analysis was reused)
+        self._pending: List[Tuple[ConsumedEvent, FeedbackAnalysis, Optional[Fingerprint], Optional[int]]] = []
+        self._flush_lock = asyncio.Lock()
+        self.updated = 0
+        self.failed = 0
+
+    @staticmethod
+    def is_pending(payload: dict) -> bool:
+        return payload.get("status") == "pending" and payload.get("id") is not None
+
+    async def run(self, events: AsyncIterator[ConsumedEvent]) -> None:
+        flusher = asyncio.create_task(self._flush_periodically())
+        try:
+            async for event in events:
+                if not self.is_pending(event.payload):
+                    # Already analyzed inline by the API, nothing to do
+                    await event.ack()
+                    continue
+                await self._slots.acquire()
+                task = asyncio.create_task(self._analyze(event))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            flusher.cancel()
+            await self.flush()
+
+    async def _analyze(self, event: ConsumedEvent) -> None:
+        message = event.payload["message"]
+        fingerprint = message_fingerprint(message) if NEAR_DUP_ENABLED else None
+        try:
+            duplicate = await near_duplicates.find(fingerprint, self.ai_service.cache_namespace)
+            if duplicate is not None:
+                analysis = duplicate.analysis
+            else:
+                analysis = await self.ai_service.analyze_feedback(message, endpoint="worker")
+        except Exception as e:
+            print(f"[AnalysisWorker] Analysis failed for feedback {event.payload.get('id')}: {e}")
+            self.failed += 1
+            await event.nack(requeue=False)
+            return
+        finally:
+            self._slots.release()
+        self._pending.append((event, analysis, fingerprint, duplicate.feedback_id if duplicate else None))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write all buffered analyses in one bulk UPDATE, then settle their events."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            rows = [
+                {
+                    "id": event.payload["id"],
+                    "sentiment": analysis.sentiment,
+                    "category": analysis.category,
+                    "summary": analysis.summary,
+                    "analysis_tier": analysis.tier,
+                    "analysis_confidence": analysis.confidence,
+                    "duplicate_of": duplicate_of,
+                }
+                for event, analysis, _, duplicate_of in batch
+            ]
+            try:
+                async with self.session_factory() as session:
+                    await session.exec(update(Feedback), params=rows)
+                    await session.commit()
+            except Exception as e:
+                print(f"[AnalysisWorker] Bulk update of {len(rows)} rows failed: {e}")
+                for event, *_ in batch:
+                    await event.nack(requeue=True)
+                return 0
+            await near_duplicates.remember_many(
+                (
+                    (fingerprint, event.payload["id"], analysis)
+                    for event, analysis, fingerprint, duplicate_of in batch if duplicate_of is None
+                ),
+                self.ai_service.cache_namespace,
+            )
+            # Rows were counted in the total when accepted; add their labels now
+            await increment_counters(
+                ((a.sentiment, a.category) for _, a, *_ in batch), count_total=False
+            )
+            if INSIGHTS_ENABLED:
+                observe_analyzed(
+                    {**event.payload, "sentiment": a.sentiment.value, "category": a.category.value}
+                    for event, a, *_ in batch
+                )
+            for event, *_ in batch:
+                await event.ack()
+            self.updated += len(batch)
+            return len(batch)
+
+async def run_worker() -> None:
+    session_factory = db_manager.get_session_factory(DBClusterType.WRITER)
+    worker = AnalysisWorker(get_ai_service(), session_factory)
+    print(
+        f"[AnalysisWorker] Consuming (prefetch={WORKER_PREFETCH}, concurrency={WORKER_CONCURRENCY}, "
+        f"batch={WORKER_BATCH_SIZE})"
+    )
+    if INSIGHTS_ENABLED:
+        start_periodic("insights_flush", INSIGHTS_FLUSH_INTERVAL, flush_insights)
+    try:
+        await worker.run(consume_feedback_events(prefetch=WORKER_PREFETCH))
+    finally:
+        await stop_all()
+        await flush_insights()
+        await db_manager.close_all()
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -0,0 +1,24 @@
+"""
+Vector index maintenance: embeds the feedback rows missing from the similarity store
+(e.g. rows written before it was enabled), then trains the IVF index if the store needs it.
+
+Run with: python -m app.workers.vector_index
+"""
+import asyncio
+from app.core.database import DBClusterType, db_manager, session_scope
+from app.services.similarity import backfill_index, get_vector_store
+
+async def run_backfill() -> None:
+    try:
+        async with session_scope(DBClusterType.ANALYTICS) as session:
+            added = await backfill_index(session)
+        print(f"[VectorIndex] Backfilled {added} rows")
+        store = get_vector_store()
+        if store.needs_training:
+            await asyncio.to_thread(store.train)
+            print(f"[VectorIndex] Trained the index on {len(store)} rows")
+    finally:
+        await db_manager.close_all()
+
+if __name__ == "__main__":
+    asyncio.run(run_backfill())
@@ -0,0 +1,148 @@
+"""
+Near-duplicate detection: LLM calls saved on a synthetic flood corpus.
+
+Builds --templates complaint templates and a stream of --messages where --flood of them
+are copies of a template with small variations (customer names, order numbers, amounts,
+punctuation and case, an extra or swapped word), the rest being unrelated messages. The
+stream is ingested in order, and each message that is neither an exact repeat nor a near
+duplicate of an earlier one counts as one LLM call. Reported:
+
+- LLM calls with no cache, with the exact-text analysis cache only, and with the exact
+  cache plus near-duplicate reuse
+- false links: messages that reused the analysis of a different complaint (another problem
+  or demand) or of an unrelated message
+- fingerprint + lookup overhead per message (in-process index, Redis stand-in)
+
+    python tests/benchmarks/bench_near_duplicates.py [--messages 20000] [--templates 30] [--flood 0.7]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+import app.core.cache as cache  # noqa: E402
+from app.models.feedback import Category, Sentiment  # noqa: E402
+from app.services.ai_service import FeedbackAnalysis  # noqa: E402
+from app.services.analysis_cache import message_digest  # noqa: E402
+from app.services.near_duplicates import NearDuplicateIndex, message_fingerprint  # noqa: E402
+from tests.conftest import FakeRedis  # noqa: E402
+
+_OPENINGS = [
+    "Hi, my name is {name} and", "Hello, this is {name},", "Dear support team, {name} here and",
+    "I am writing again because", "To whom it may concern,", "{name} speaking:",
+]
+_PROBLEMS = [
+    "my order {order} never arrived and the tracking page has not changed for {days} days",
+    "I was charged {amount} twice for order {order} and nobody answers my emails",
+    "the courier marked order {order} as delivered but there was nothing at my door",
+    "the blender from order {order} stopped working after {days} days of normal use",
+    "your app logs me out every time I try to pay for order {order}",
+    "the replacement for order {order} arrived damaged exactly like the first one",
+    "the store manager was rude to me when I asked about order {order}",
+    "my refund of {amount} for order {order} is still pending after {days} days",
+]
+_DEMANDS = [
+    "I want a full refund immediately.", "Please send a replacement as soon as possible.",
+    "This is unacceptable and I expect a call back today.", "Fix this or I will cancel my account.",
+    "I will report this to consumer protection if nothing happens.",
+]
+_NAMES = "John Maria Priya Ahmed Lee Sofia Raj Ann Tom Chen Olga Luis Fatima Ken Ines".split()
+_WORDS = (
+    "great terrible slow fast delivery courier parcel app crash support staff rude lovely refund "
+    "product quality website service package late broken excellent store price checkout login "
+    "size colour shoes jacket phone battery screen manager queue discount voucher"
+).split()
+
+def templates(rng: random.Random, count: int) -> List[Tuple[str, str]]:
+    """(complaint, text) pairs: distinct problem and demand, any greeting."""
+    complaints = rng.sample([(p, d) for p in _PROBLEMS for d in _DEMANDS], count)
+    return [(f"{_PROBLEMS.index(p)}/{_DEMANDS.index(d)}", " ".join([rng.choice(_OPENINGS), p, d])) for p, d in complaints]
+
+def vary(rng: random.Random, text: str) -> str:
+    """A flood copy: new slot values plus small edits."""
+    message = text.format(
+        name=rng.choice(_NAMES),
+        order=rng.randrange(10000, 99999),
+        days=rng.randrange(2, 30),
+        amount=f"${rng.randrange(10, 500)}.{rng.randrange(100):02d}",
+    )
+    edit = rng.random()
+    if edit < 0.2:
+        message = message.upper()
+    elif edit < 0.4:
+        message = message.replace(",", "").replace(".", "!!!")
+    elif edit < 0.55:
+        words = message.split()
+        words.insert(rng.randrange(len(words)), rng.choice(["really", "seriously", "honestly", "again"]))
+        message = " ".join(words)
+    elif edit < 0.7:
+        message = message.replace(" I ", " i ", 1) + " " + rng.choice(["Thanks.", "Regards.", "!!!"])
+    return message
+
+def unrelated(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 24)))
+
+async def main(n_messages: int, n_templates: int, flood: float, max_distance: int) -> None:
+    cache._redis = FakeRedis()
+    rng = random.Random(42)
+    sources = templates(rng, n_templates)
+    stream = []
+    for i in range(n_messages):
+        if rng.random() < flood:
+            complaint, text = rng.choice(sources)
+            stream.append((complaint, vary(rng, text)))
+        else:
+            stream.append((f"u{i}", unrelated(rng)))
+
+    index = NearDuplicateIndex(max_distance=max_distance)
+    exact_seen = set()
+    calls = {"none": 0, "exact": 0, "near": 0}
+    false_links = 0
+    samples = []
+    for feedback_id, (source, message) in enumerate(stream):
+        calls["none"] += 1
+        digest = message_digest(message)
+        if digest not in exact_seen:
+            calls["exact"] += 1
+        start = time.perf_counter()
+        fingerprint = message_fingerprint(message)
+        match = await index.find(fingerprint, "bench")
+        samples.append((time.perf_counter() - start) * 1e6)
+        if match is not None:
+            false_links += match.analysis.summary != source
+        elif digest not in exact_seen:
+            calls["near"] += 1
+            # The summary carries the source, to check what a match reused
+            analysis = FeedbackAnalysis(sentiment=Sentiment.NEGATIVE, category=Category.OTHER, summary=source)
+            await index.remember(fingerprint, feedback_id, analysis, "bench")
+        exact_seen.add(digest)
+
+    samples.sort()
+    print(f"{n_messages} messages, {n_templates} templates, {flood:.0%} flood copies, max distance {max_distance}")
+    print(f"{'LLM calls, no cache':<36} {calls['none']:>8}")
+    print(f"{'LLM calls, exact-text cache':<36} {calls['exact']:>8}")
+    print(
+        f"{'LLM calls, exact + near-duplicates':<36} {calls['near']:>8}  "
+        f"({1 - calls['near'] / calls['exact']:.1%} fewer than exact)"
+    )
+    print(f"{'false links':<36} {false_links:>8}  ({false_links / n_messages:.3%} of messages)")
+    print(
+        f"{'fingerprint + lookup':<36} {statistics.fmean(samples):>8.1f} us mean, "
+        f"{samples[int(len(samples) * 0.99)]:.1f} us p99"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--templates", type=int, default=30, help=f"at most {len(_PROBLEMS) * len(_DEMANDS)}")
+    parser.add_argument("--flood", type=float, default=0.7)
+    parser.add_argument("--max-distance", type=int, default=9)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.templates, args.flood, args.max_distance))
@@ -0,0 +1,193 @@
+"""
+Per-request overhead of the request pipeline, before vs after:
+- before: BaseHTTPMiddleware routing, a new sessionmaker per request, dicts rendered
+  through jsonable_encoder + json
+- after: pure ASGI routing, cached session factories, orjson-rendered stats
+
+Requests are driven straight through the ASGI interface (no HTTP client or server), with
+SQLite, an in-memory Redis stand-in, a stubbed AI provider and the in-memory queue, so the
+numbers isolate framework + app overhead on the health, stats and create paths.
+
+    python tests/benchmarks/bench_request_overhead.py [--requests 2000]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+_DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_DB_PATH}")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from fastapi import Depends, FastAPI, Request  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+import app.core.cache as cache  # noqa: E402
+from app.api.v1.api import api_router  # noqa: E402
+from app.api.v1.endpoints import feedback as feedback_endpoint  # noqa: E402
+from app.core.database import (  # noqa: E402
+    DBClusterType, DBRoutingMiddleware, _db_cluster_ctx, db_manager, get_session, init_db,
+)
+from app.core.queue import InMemoryQueue, use_memory_queue  # noqa: E402
+from app.models.feedback import Category, Sentiment  # noqa: E402
+from app.services.ai_service import FeedbackAnalysis  # noqa: E402
+from app.services.dashboard_stats import read_counters  # noqa: E402
+
+# --- Stand-ins ---
+
+class BenchRedis:
+    def __init__(self):
+        self.counters = {
+            b"total": b"1000", b"reconciled_at": b"1",
+            b"category:Service": b"400", b"category:Delivery": b"600",
+            b"sentiment:Positive": b"700", b"sentiment:Negative": b"300",
+        }
+
+    async def hgetall(self, key):
+        return dict(self.counters)
+
+    async def get(self, key):
+        return None
+
+    async def set(self, *args, **kwargs):
+        return True
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hincrby(self, *args):
+        return self
+
+    async def execute(self):
+        return []
+
+_ANALYSIS = FeedbackAnalysis(sentiment=Sentiment.POSITIVE, category=Category.SERVICE, summary="Bench.")
+
+async def _stub_analysis(message: str) -> FeedbackAnalysis:
+    return _ANALYSIS
+
+# --- The previous pipeline, for comparison ---
+
+class LegacyDBRoutingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        target = DBClusterType.WRITER
+        if request.method == "GET":
+            target = DBClusterType.READER
+        if "X-DB-Target" in request.headers:
+            requested_target = request.headers["X-DB-Target"].lower()
+            if requested_target in [t.value for t in DBClusterType]:
+                target = DBClusterType(requested_target)
+        token = _db_cluster_ctx.set(target)
+        try:
+            return await call_next(request)
+        finally:
+            _db_cluster_ctx.reset(token)
+
+async def legacy_get_session() -> AsyncSession:
+    engine = db_manager.get_engine(_db_cluster_ctx.get())
+    async_session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with async_session_factory() as session:
+        yield session
+
+def build_apps():
+    def health_app(middleware) -> FastAPI:
+        app = FastAPI()
+        app.add_middleware(middleware)
+
+        @app.get("/health")
+        async def health_check():
+            return {"status": "ok"}
+        return app
+
+    legacy = health_app(LegacyDBRoutingMiddleware)
+
+    @legacy.get("/api/v1/dashboard/stats")
+    async def legacy_stats(session: AsyncSession = Depends(legacy_get_session)):
+        return await read_counters()
+
+    legacy.include_router(api_router, prefix="/api/v1")
+    legacy.dependency_overrides[get_session] = legacy_get_session
+
+    current = health_app(DBRoutingMiddleware)
+    current.include_router(api_router, prefix="/api/v1")
+    return legacy, current
+
+# --- ASGI driver ---
+
+async def call(app, method: str, path: str, body: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+    }
+    done = asyncio.Event()
+    delivered = False
+    status = 0
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+    return status
+
+async def measure(app, method: str, path: str, body: bytes, requests: int) -> list:
+    for _ in range(min(200, requests)):
+        await call(app, method, path, body)
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = await call(app, method, path, body)
+        samples.append((time.perf_counter() - start) * 1e6)
+        assert status < 300, f"{method} {path} -> {status}"
+    return samples
+
+async def main(requests: int) -> None:
+    cache._redis = BenchRedis()
+    use_memory_queue(InMemoryQueue())
+    feedback_endpoint.ai_service.analyze_feedback = _stub_analysis
+    await init_db()
+
+    legacy, current = build_apps()
+    body = b'{"customer_id": "bench", "message": "Great service"}'
+    scenarios = [
+        ("health", "GET", "/health", b""),
+        ("stats", "GET", "/api/v1/dashboard/stats", b""),
+        ("create", "POST", "/api/v1/feedback", body),
+    ]
+    print(f"{'path':<8} {'variant':<8} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+    for name, method, path, payload in scenarios:
+        means = {}
+        for variant, app in (("before", legacy), ("after", current)):
+            samples = sorted(await measure(app, method, path, payload, requests))
+            means[variant] = statistics.fmean(samples)
+            print(
+                f"{name:<8} {variant:<8} {means[variant]:>9.1f} "
+                f"{samples[len(samples) // 2]:>9.1f} {samples[int(len(samples) * 0.99)]:>9.1f}"
+            )
+        print(f"{name:<8} {'saved':<8} {means['before'] - means['after']:>9.1f}")
+    await db_manager.close_all()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args().requests))
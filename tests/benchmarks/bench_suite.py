@@ -0,0 +1,230 @@
+"""
+In-process benchmark suite with a regression gate.
+
+Runs the real app (routers, middleware, microservices) through its ASGI interface with
+SQLite, the in-memory Redis stand-in from tests/conftest.py and the in-memory queue, so it
+needs neither Docker nor a server. Scenarios:
+
+- create            POST /api/v1/feedback (local classifier, commit, counters, index, publish)
+- stats_cold        GET /api/v1/dashboard/stats, SQL aggregation (cache invalidated per call)
+- stats_warm        the same, served from the stale-while-revalidate cache
+- stats_counters    the same, served from the reconciled Redis counters
+- analyzer          POST /services/analyzer/analyze with distinct messages (cache misses)
+- classify_batch    RuleClassifier.classify_batch, 1000 messages per call
+
+The table-dependent scenarios run at each --sizes row count. Results (throughput and
+latency percentiles) are compared with the JSON baseline; the run exits 1 when a
+scenario's throughput drops, or its p50 latency grows, by more than --tolerance.
+--update-baseline records the current run instead. Baselines are machine-specific:
+record them on the machine that runs the gate.
+
+    python tests/benchmarks/bench_suite.py [--sizes 1000,10000,100000] [--requests 300]
+        [--concurrency 8] [--tolerance 0.25] [--baseline PATH] [--update-baseline]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+_WORK_DIR = tempfile.mkdtemp(prefix="bench-suite-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_WORK_DIR, 'bench.db')}"
+os.environ["VECTOR_STORE_DIR"] = os.path.join(_WORK_DIR, "vectors")
+# All requests come from one client: measure the app, not the per-IP rate limit
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from sqlalchemy import insert  # noqa: E402
+import app.core.cache as cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.core.cache import invalidate  # noqa: E402
+from app.core.database import db_manager, init_db, session_scope  # noqa: E402
+from app.core.queue import InMemoryQueue, use_memory_queue  # noqa: E402
+from app.microservices.loader import load_microservices  # noqa: E402
+from app.models.feedback import Feedback  # noqa: E402
+from app.services.dashboard_stats import STATS_COUNTERS_KEY, reconcile_counters  # noqa: E402
+from app.services.rule_classifier import RuleClassifier  # noqa: E402
+from bench_request_overhead import call  # noqa: E402
+from tests.conftest import FakeRedis  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+_WORDS = (
+    "great terrible slow fast delivery courier parcel app crash support staff rude lovely "
+    "refund product quality website service package late broken excellent the was and my"
+).split()
+
+def message(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 16)))
+
+async def run_scenario(
+    operation: Callable[[int], Awaitable[None]],
+    requests: int,
+    concurrency: int,
+    before: Optional[Callable[[], Awaitable[None]]] = None,
+    ops_per_call: int = 1,
+) -> Dict[str, float]:
+    """Runs `requests` calls over `concurrency` workers (after a short warm-up)."""
+    for i in range(min(20, requests)):
+        if before is not None:
+            await before()
+        await operation(-1 - i)
+    samples: List[float] = []
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for i in counter:
+            if before is not None:
+                await before()
+            start = time.perf_counter()
+            await operation(i)
+            samples.append((time.perf_counter() - start) * 1e3)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        "ops_per_sec": round(requests * ops_per_call / elapsed, 1),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
+
+async def expect(method: str, path: str, body: bytes = b"") -> None:
+    status = await call(app, method, path, body)
+    if status >= 300:
+        raise RuntimeError(f"{method} {path} -> {status}")
+
+async def seed(start: int, rows: int, rng: random.Random) -> None:
+    """Grows the feedback table from `start` to `rows` rows."""
+    for offset in range(start, rows, 5000):
+        batch = [
+            {
+                "customer_id": f"cust_{rng.randrange(1000)}",
+                "message": message(rng),
+                "sentiment": rng.choice(["Positive", "Neutral", "Negative"]),
+                "category": rng.choice(["Service", "Product", "Delivery", "Other"]),
+                "summary": "Seeded.",
+            }
+            for _ in range(min(5000, rows - offset))
+        ]
+        async with session_scope() as session:
+            await session.exec(insert(Feedback), params=batch)
+            await session.commit()
+
+async def run_suite(sizes: List[int], requests: int, concurrency: int) -> Dict[str, dict]:
+    cache._redis = FakeRedis()
+    use_memory_queue(InMemoryQueue())
+    await init_db()
+    load_microservices(app)
+    rng = random.Random(42)
+    results: Dict[str, dict] = {}
+
+    def report(name: str, result: Dict[str, float]) -> None:
+        results[name] = result
+        print(
+            f"{name:<24} {result['ops_per_sec']:>10.1f} {result['mean_ms']:>9.3f} "
+            f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}"
+        )
+
+    print(f"{'scenario':<24} {'ops/s':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    seeded = 0
+    for size in sizes:
+        # Rows created by earlier scenarios count towards the next size
+        await seed(seeded, size, rng)
+        seeded = size + requests + 20
+        bodies = [
+            json.dumps({"customer_id": f"bench_{i % 100}", "message": message(rng)}).encode()
+            for i in range(requests)
+        ]
+        report(f"create@{size}", await run_scenario(
+            lambda i: expect("POST", "/api/v1/feedback", bodies[i]), requests, concurrency
+        ))
+
+        stats = lambda i: expect("GET", "/api/v1/dashboard/stats")  # noqa: E731
+        report(f"stats_cold@{size}", await run_scenario(
+            stats, max(requests // 10, 10), 1, before=lambda: invalidate("dashboard_stats")
+        ))
+        report(f"stats_warm@{size}", await run_scenario(stats, requests, concurrency))
+        async with session_scope() as session:
+            await reconcile_counters(session)
+        report(f"stats_counters@{size}", await run_scenario(stats, requests, concurrency))
+        await cache.get_redis().delete(STATS_COUNTERS_KEY)
+
+    messages = [message(rng) for _ in range(requests + 20)]
+    report("analyzer", await run_scenario(
+        lambda i: expect(
+            "POST", "/services/analyzer/analyze", json.dumps({"message": f"{messages[i]} #{i}"}).encode()
+        ),
+        requests, concurrency,
+    ))
+
+    classifier = RuleClassifier()
+    batch = [message(rng) for _ in range(1000)]
+
+    async def classify(i: int) -> None:
+        classifier.classify_batch(batch)
+
+    report("classify_batch", await run_scenario(classify, 50, 1, ops_per_call=len(batch)))
+    await db_manager.close_all()
+    return results
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    found = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["ops_per_sec"] < reference["ops_per_sec"] * (1 - tolerance):
+            found.append(f"{name}: {result['ops_per_sec']} ops/s vs baseline {reference['ops_per_sec']}")
+        if result["p50_ms"] > reference["p50_ms"] * (1 + tolerance):
+            found.append(f"{name}: p50 {result['p50_ms']} ms vs baseline {reference['p50_ms']}")
+    return found
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    results = asyncio.run(run_suite(sizes, args.requests, args.concurrency))
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "machine": f"{platform.machine()} / Python {platform.python_version()}",
+                "settings": {"requests": args.requests, "concurrency": args.concurrency},
+                "scenarios": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        recorded = json.load(f)
+    settings = {"requests": args.requests, "concurrency": args.concurrency}
+    if recorded.get("settings") != settings:
+        print(f"WARNING baseline was recorded with {recorded.get('settings')}, this run used {settings}")
+    found = regressions(results, recorded["scenarios"], args.tolerance)
+    for line in found:
+        print(f"REGRESSION {line}")
+    if not found:
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ from httpx import AsyncClient
 from sqlmodel import SQLModel
 from app.main import app
 from app.core.database import db_manager, DBClusterType
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -20,7 +21,131 @@ async def db_session():
     async with writer_engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.drop_all)
 
+@pytest_asyncio.fixture
+async def sqlite_session(tmp_path):
+    """A session on a fresh SQLite file with the full schema (its engine is `.bind`)."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
 @pytest_asyncio.fixture(scope="function")
 async def client():
     async with AsyncClient(base_url="http://localhost:8000") as c:
         yield c
+
+class FakeRedis:
+    """In-memory subset of redis.asyncio.Redis used by the app (bytes in, bytes out)."""
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _b(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    async def get(self, key):
+        value = self.data.get(key)
+        return value if isinstance(value, bytes) else None
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = self._b(value)
+        return True
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def incrby(self, key, amount=1):
+        self.data[key] = self._b(int(self.data.get(key, b"0")) + amount)
+        return int(self.data[key])
+
+    async def expire(self, key, seconds):
+        return key in self.data
+
+    async def hincrby(self, key, field, amount=1):
+        table = self.data.setdefault(key, {})
+        table[self._b(field)] = self._b(int(table.get(self._b(field), b"0")) + amount)
+        return int(table[self._b(field)])
+
+    async def hset(self, key, mapping=None):
+        table = self.data.setdefault(key, {})
+        for field, value in (mapping or {}).items():
+            table[self._b(field)] = self._b(value)
+        return len(mapping or {})
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    # HyperLogLog stand-in: an exact set
+    async def pfadd(self, key, *members):
+        members = {self._b(member) for member in members}
+        table = self.data.setdefault(key, set())
+        added = not members <= table
+        table |= members
+        return int(added)
+
+    async def pfcount(self, *keys):
+        return len(set().union(*(self.data.get(key, set()) for key in keys)))
+
+    async def zadd(self, key, mapping, gt=False):
+        table = self.data.setdefault(key, {})
+        for member, score in mapping.items():
+            member = self._b(member)
+            if not gt or score > table.get(member, float("-inf")):
+                table[member] = float(score)
+        return len(mapping)
+
+    def _ranked(self, key):
+        return sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    async def zremrangebyrank(self, key, start, stop):
+        ranked = self._ranked(key)
+        stop = len(ranked) + stop if stop < 0 else stop
+        start = max(len(ranked) + start if start < 0 else start, 0)
+        removed = ranked[start:stop + 1] if stop >= 0 else []
+        for member, _ in removed:
+            del self.data[key][member]
+        return len(removed)
+
+    async def zrevrange(self, key, start, stop, withscores=False):
+        ranked = self._ranked(key)[::-1]
+        selected = ranked[start:None if stop == -1 else stop + 1]
+        return selected if withscores else [member for member, _ in selected]
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        # Only the compare-and-act scripts of app.core.cache
+        key, expected, *args = keys_and_args
+        if self.data.get(key) != self._b(expected):
+            return 0
+        if "'del'" in script:
+            return await self.delete(key)
+        return await self.expire(key, int(args[0]) / 1000)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._calls.append((getattr(self._redis, name), args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self._calls = self._calls, []
+        return [await method(*args, **kwargs) for method, args, kwargs in calls]
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    import app.core.cache as cache
+    redis = FakeRedis()
+    monkeypatch.setattr(cache, "_redis", redis)
+    return redis
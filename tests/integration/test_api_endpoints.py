@@ -41,3 +41,180 @@ async def test_dashboard_stats(client):
     assert data["by_sentiment"]["Negative"] >= 1
     assert data["by_category"]["Product"] >= 1
     assert data["by_category"]["Delivery"] >= 1
+
+@pytest.mark.asyncio
+async def test_create_feedback_respond_async(client):
+    payload = {
+        "customer_id": "cust_003",
+        "message": "The support team never answered."
+    }
+    response = await client.post(
+        "/api/v1/feedback", json=payload, headers={"Prefer": "respond-async"}
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["id"] is not None
+    assert data["sentiment"] is None
+    assert data["category"] is None
+
+@pytest.mark.asyncio
+async def test_create_feedback_bulk_ndjson(client):
+    body = "\n".join([
+        '{"customer_id": "bulk_001", "message": "Great service from the support team"}',
+        '{"customer_id": "bulk_002"}',
+        '{"customer_id": "bulk_003", "message": "The delivery was late"}',
+    ])
+    response = await client.post(
+        "/api/v1/feedback/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["failed"] == 1
+    assert data["results"][1]["status"] == "error"
+    assert data["results"][2]["id"] is not None
+
+@pytest.mark.asyncio
+async def test_create_feedback_bulk_rejects_non_array(client):
+    response = await client.post("/api/v1/feedback/bulk", json={"customer_id": "x", "message": "y"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_dashboard_stats_time_window(client):
+    response = await client.get(
+        "/api/v1/dashboard/stats",
+        params={"from": "2026-01-01T00:00:00Z", "to": "2026-02-01T00:00:00Z", "bucket": "day"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["bucket"] == "day"
+    assert isinstance(data["series"], list)
+    assert "by_category" in data
+
+    response = await client.get(
+        "/api/v1/dashboard/stats", params={"from": "2026-02-01T00:00:00", "to": "2026-01-01T00:00:00"}
+    )
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_list_and_export_feedback(client):
+    for i in range(3):
+        await client.post("/api/v1/feedback", json={"customer_id": "list_001", "message": f"Great product {i}"})
+
+    response = await client.get("/api/v1/feedback", params={"customer_id": "list_001", "limit": 2})
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page["items"]) == 2
+    assert page["next_cursor"]
+
+    response = await client.get(
+        "/api/v1/feedback", params={"customer_id": "list_001", "limit": 2, "cursor": page["next_cursor"]}
+    )
+    rest = response.json()
+    assert len(rest["items"]) >= 1
+    assert not {f["id"] for f in page["items"]} & {f["id"] for f in rest["items"]}
+
+    response = await client.get("/api/v1/feedback", params={"cursor": "garbage!"})
+    assert response.status_code == 400
+
+    response = await client.get("/api/v1/feedback/export", params={"customer_id": "list_001", "format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0].startswith("id,customer_id")
+    assert len(response.text.strip().splitlines()) >= 4
+
+@pytest.mark.asyncio
+async def test_search_feedback(client):
+    await client.post("/api/v1/feedback", json={"customer_id": "search_001", "message": "The courier was rude"})
+    response = await client.get("/api/v1/feedback/search", params={"q": "courier", "customer_id": "search_001"})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert items and "courier" in items[0]["message"]
+    assert "rank" in items[0]
+
+    response = await client.get("/api/v1/feedback/search", params={"q": ""})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_similar_feedback(client):
+    ids = []
+    for message in ("My parcel never arrived, courier lost it", "Courier lost my parcel again", "Great coffee"):
+        response = await client.post("/api/v1/feedback", json={"customer_id": "sim_001", "message": message})
+        ids.append(response.json()["id"])
+
+    response = await client.get(f"/api/v1/feedback/{ids[0]}/similar", params={"k": 5})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert ids[0] not in [f["id"] for f in items]
+    assert items[0]["id"] == ids[1]
+    assert items[0]["score"] > 0
+
+    response = await client.get("/api/v1/feedback/999999999/similar")
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_metrics_exposition(client):
+    await client.post("/api/v1/feedback", json={"customer_id": "cust_metrics", "message": "Great app"})
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for stage in ("analysis", "commit", "refresh", "publish"):
+        assert f'feedback_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'db_pool_connections_in_use{cluster="writer"}' in body
+    assert 'db_pool_checkout_seconds_count{cluster="writer"}' in body
+
+@pytest.mark.asyncio
+async def test_create_feedback_rate_limited_per_customer(client):
+    import asyncio
+
+    payload = {"customer_id": "cust_burst", "message": "Great support"}
+    responses = await asyncio.gather(*(client.post("/api/v1/feedback", json=payload) for _ in range(30)))
+    statuses = [r.status_code for r in responses]
+    assert 201 in statuses and 429 in statuses
+    limited = next(r for r in responses if r.status_code == 429)
+    assert int(limited.headers["retry-after"]) >= 1
+
+@pytest.mark.asyncio
+async def test_dashboard_stream_pushes_snapshot_then_deltas(client):
+    import json
+    import asyncio
+
+    async with client.stream("GET", "/api/v1/dashboard/stream") as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = aiter(response.aiter_lines())
+        initial_seq = int((await anext(events)).removeprefix("id: "))
+        assert await anext(events) == "event: snapshot"
+        assert "total_feedback" in json.loads((await anext(events)).removeprefix("data: "))
+        assert await anext(events) == ""
+
+        await client.post("/api/v1/feedback", json={"customer_id": "cust_stream", "message": "Great app"})
+
+        async def next_update():
+            # The new row arrives as a delta, or inside a snapshot if one was due
+            async for line in events:
+                if line.startswith("id: "):
+                    seq = int(line.removeprefix("id: "))
+                    await anext(events)
+                    return seq, json.loads((await anext(events)).removeprefix("data: "))
+        seq, update = await asyncio.wait_for(next_update(), 5)
+        assert seq > initial_seq
+        assert update["total_feedback"] >= 1
+
+@pytest.mark.asyncio
+async def test_create_feedback_idempotency_key(client):
+    import uuid
+    import asyncio
+
+    payload = {"customer_id": "cust_retry", "message": "The checkout page keeps timing out on my phone"}
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    responses = await asyncio.gather(*(client.post("/api/v1/feedback", json=payload, headers=headers) for _ in range(3)))
+    later = await client.post("/api/v1/feedback", json=payload, headers=headers)
+    assert {r.status_code for r in responses + [later]} == {201}
+    assert len({r.json()["id"] for r in responses + [later]}) == 1
+    assert [r.headers.get("idempotent-replayed") for r in responses].count("true") == 2
+    assert later.headers["idempotent-replayed"] == "true"
+
+    reused = await client.post("/api/v1/feedback", json={**payload, "message": "Other"}, headers=headers)
+    assert reused.status_code == 422
@@ -6,8 +6,10 @@ async def test_dashboard_stats_cached(client):
     r = await client.get("/api/v1/dashboard/stats")
     assert r.status_code == 200
     redis = Redis.from_url("redis://redis:6379/0")
+    # Served from the write-time counters once reconciled, otherwise from the SQL result cache
+    counters = await redis.hgetall("feedback_stats:counters")
     val = await redis.get("dashboard_stats")
-    assert val is not None
+    assert counters or val is not None
 
 @pytest.mark.asyncio
 async def test_queue_health(client):
@@ -0,0 +1,92 @@
+import asyncio
+import ipaddress
+import pytest
+import app.core.admission as admission
+from starlette.requests import Request
+from app.core.admission import Overloaded, RateLimited, RateLimiter, StageLimiter, client_ip
+
+def test_rate_limiter_allows_burst_then_rejects_with_retry_after():
+    limiter = RateLimiter("customer", rate=2, burst=3)
+    for _ in range(3):
+        limiter.check("c1")
+    with pytest.raises(RateLimited) as exc:
+        limiter.check("c1")
+    assert 0 < exc.value.retry_after <= 0.5
+    # Keys are independent
+    limiter.check("c2")
+
+@pytest.mark.asyncio
+async def test_sync_charges_other_replicas_admissions(fake_redis):
+    replica_a = RateLimiter("customer", rate=0.001, burst=10)
+    replica_b = RateLimiter("customer", rate=0.001, burst=10)
+    replica_a.check("c1")
+    replica_b.check("c1")
+    await replica_a.sync()
+    await replica_b.sync()
+    for _ in range(6):
+        replica_b.check("c1")
+    await replica_b.sync()
+    await replica_a.sync()  # nothing new locally: replica A is not dirty yet
+    replica_a.check("c1")
+    await replica_a.sync()
+    # Shared total 9 (A: 2, B: 7). A is charged for B's 7, leaving it a single token
+    replica_a.check("c1")
+    with pytest.raises(RateLimited):
+        replica_a.check("c1")
+    [key] = [k for k in fake_redis.data if k.startswith("ratelimit:customer:c1:")]
+    assert int(fake_redis.data[key]) == 9
+
+@pytest.mark.asyncio
+async def test_sync_charges_only_the_current_refill_window(fake_redis):
+    replica_a = RateLimiter("customer", rate=1, burst=10)
+    replica_b = RateLimiter("customer", rate=1, burst=10)
+    replica_a.check("c1")
+    replica_b.check("c1")
+    await replica_a.sync(now=1000)
+    await replica_b.sync(now=1000)
+    for _ in range(9):
+        replica_b.check("c1")
+    await replica_b.sync(now=1000)
+    # Replica A next syncs two windows later: B's old burst has refilled and costs nothing
+    replica_a.check("c1")
+    await replica_a.sync(now=1020)
+    for _ in range(8):
+        replica_a.check("c1")
+
+def _request(peer: str, forwarded_for: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 41000)})
+
+def test_client_ip_trusts_forwarded_for_only_from_trusted_proxies(monkeypatch):
+    assert client_ip(_request("10.0.1.7", "1.2.3.4")) == "10.0.1.7"
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/16")])
+    assert client_ip(_request("10.0.1.7", "6.6.6.6, 1.2.3.4, 10.0.2.9")) == "1.2.3.4"
+    assert client_ip(_request("10.0.1.7")) == "10.0.1.7"
+    # Not from the load balancer: the header is the client's own claim
+    assert client_ip(_request("5.5.5.5", "1.2.3.4")) == "5.5.5.5"
+
+@pytest.mark.asyncio
+async def test_stage_limiter_sheds_when_queue_full_or_wait_expires():
+    stage = StageLimiter("ai", limit=1, max_queue=1, max_wait=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with stage.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(stage.slot().__aenter__())
+    await asyncio.sleep(0)
+    # The one queue place is taken: shed immediately
+    with pytest.raises(Overloaded):
+        async with stage.slot():
+            pass
+    # The queued caller times out
+    with pytest.raises(Overloaded):
+        await waiter
+    release.set()
+    await holder
+    async with stage.slot():
+        assert stage.inflight == 1
+    assert stage.stats() == {"limit": 1, "inflight": 0, "waiting": 0}
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from app.models.feedback import Sentiment, Category
+from app.services.ai_service import FeedbackAnalysis
+from app.services.analysis_cache import AnalysisCache, normalize_message
+
+def _analysis() -> FeedbackAnalysis:
+    return FeedbackAnalysis(sentiment=Sentiment.NEGATIVE, category=Category.PRODUCT, summary="Crashes.")
+
+def test_normalize_message():
+    assert normalize_message("  App keeps\tCRASHING \n") == "app keeps crashing"
+
+@pytest.mark.asyncio
+async def test_single_flight_and_local_hits():
+    cache = AnalysisCache(ttl=60, local_size=10)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return _analysis()
+
+    variants = ["app keeps crashing", "App keeps crashing", "  app  keeps crashing "]
+    results = await asyncio.gather(
+        *(cache.get_or_compute(m, compute, FeedbackAnalysis) for m in variants)
+    )
+    assert calls == 1
+    assert all(r.summary == "Crashes." for r in results)
+    assert cache.coalesced == 2
+
+    await cache.get_or_compute("APP KEEPS CRASHING", compute, FeedbackAnalysis)
+    assert calls == 1
+    assert cache.stats()["hits_local"] == 1
+
+    # A new namespace (e.g. another model or prompt version) does not reuse old entries
+    await cache.get_or_compute("app keeps crashing", compute, FeedbackAnalysis, namespace="v2")
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_uncacheable_results_are_recomputed():
+    cache = AnalysisCache(ttl=60, local_size=10)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        return _analysis()
+
+    for _ in range(2):
+        await cache.get_or_compute("flaky", compute, FeedbackAnalysis, cacheable=lambda _: False)
+    assert calls == 2
+    assert cache.stats()["misses"] == 2
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_the_leader_is_cancelled():
+    cache = AnalysisCache(ttl=60, local_size=10)
+    started = asyncio.Event()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await asyncio.sleep(0.05)
+        return _analysis()
+
+    leader = asyncio.create_task(cache.get_or_compute("slow", compute, FeedbackAnalysis))
+    await started.wait()
+    follower = asyncio.create_task(cache.get_or_compute("slow", compute, FeedbackAnalysis))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert (await follower).summary == "Crashes."
+    assert leader.cancelled() and calls == 2
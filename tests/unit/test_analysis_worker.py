@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.queue import InMemoryQueue
+from app.models.feedback import Feedback, Sentiment, Category
+from app.services.ai_service import AIService
+from app.workers.analysis import AnalysisWorker
+
+@pytest.mark.asyncio
+async def test_in_memory_queue_requeues_on_nack():
+    queue = InMemoryQueue()
+    await queue.publish({"id": 1})
+    events = queue.consume(prefetch=1)
+
+    first = await events.__anext__()
+    await first.nack(requeue=True)
+    second = await events.__anext__()
+    assert second.payload == {"id": 1}
+    await second.ack()
+    assert queue.qsize() == 0
+
+@pytest.mark.asyncio
+async def test_worker_bulk_updates_pending_rows(sqlite_session):
+    messages = ["The delivery was terrible and slow.", "I love this fast product"]
+    queue = InMemoryQueue()
+    rows = [Feedback(customer_id="c1", message=m) for m in messages]
+    sqlite_session.add_all(rows)
+    await sqlite_session.commit()
+    for row in rows:
+        await queue.publish({"id": row.id, "message": row.message, "status": "pending"})
+    # Events for rows analyzed inline are acknowledged and skipped
+    await queue.publish({"id": 99, "message": "ignored", "status": "analyzed"})
+
+    ai = AIService()
+    ai.provider = "mock"
+    # The worker opens its own sessions
+    session_factory = sessionmaker(sqlite_session.bind, class_=AsyncSession, expire_on_commit=False)
+    worker = AnalysisWorker(ai, session_factory, concurrency=4, batch_size=10, flush_interval=0.05)
+    runner = asyncio.create_task(worker.run(queue.consume(prefetch=8)))
+    await asyncio.wait_for(queue.join(), timeout=5)
+    runner.cancel()
+
+    assert worker.updated == 2
+    async with session_factory() as session:
+        stored = (await session.exec(select(Feedback).order_by(Feedback.id))).all()
+    assert [(f.sentiment, f.category) for f in stored] == [
+        (Sentiment.NEGATIVE, Category.DELIVERY),
+        (Sentiment.POSITIVE, Category.PRODUCT),
+    ]
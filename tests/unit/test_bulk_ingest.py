@@ -0,0 +1,113 @@
+import json
+import pytest
+import app.core.admission as admission
+import app.services.bulk_ingest as bulk_ingest
+from sqlmodel import select
+from app.core.admission import RateLimiter, StageLimiter
+from app.core.queue import InMemoryQueue, use_memory_queue
+from app.models.feedback import Feedback, Sentiment
+from app.services.ai_service import AIService
+from app.services.bulk_ingest import BulkParseError, ingest_bulk, iter_json_array, iter_ndjson
+
+async def _chunks(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+async def _collect(items):
+    return [item async for item in items]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 3, 1024])
+async def test_iter_json_array_across_chunk_boundaries(size):
+    values = [{"customer_id": "c", "message": "café [ok], \"quoted\""}, {"n": 2}]
+    body = json.dumps(values).encode()
+    assert await _collect(iter_json_array(_chunks(body, size))) == values
+
+@pytest.mark.asyncio
+async def test_iter_json_array_rejects_truncated_body():
+    with pytest.raises(BulkParseError):
+        await _collect(iter_json_array(_chunks(b'[{"a": 1}, {"b"', 4)))
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [b'[{"a":1}{"b":2}]', b'[,,{}]', b'[{},]', b'[{},,{}]', b'[,]'])
+async def test_iter_json_array_requires_one_comma_between_elements(body):
+    with pytest.raises(BulkParseError):
+        await _collect(iter_json_array(_chunks(body, 3)))
+
+@pytest.mark.asyncio
+async def test_iter_json_array_accepts_empty_arrays_and_split_numbers():
+    assert await _collect(iter_json_array(_chunks(b" [ ] ", 1))) == []
+    assert await _collect(iter_json_array(_chunks(b"[12345, 6]", 2))) == [12345, 6]
+
+@pytest.mark.asyncio
+async def test_iter_ndjson_reports_bad_lines():
+    body = b'{"a": 1}\n\nnot json\n{"b": 2}'
+    items = await _collect(iter_ndjson(_chunks(body, 5)))
+    assert items[0] == {"a": 1}
+    assert isinstance(items[1], BulkParseError)
+    assert items[2] == {"b": 2}
+
+@pytest.mark.asyncio
+async def test_parsers_cap_the_buffered_item():
+    # A malformed element never decodes: fail once it outgrows the cap instead of buffering the body
+    body = b'[{"a": 1}, {"b": ' + b'1' * 100 + b', ' + b'{"c": 2}, ' * 50 + b']'
+    items = iter_json_array(_chunks(body, 8), max_item=64)
+    assert await anext(items) == {"a": 1}
+    with pytest.raises(BulkParseError):
+        await anext(items)
+
+    body = b'{"a": 1}\n' + b'x' * 100 + b'\n{"b": 2}'
+    items = iter_ndjson(_chunks(body, 8), max_item=64)
+    assert await anext(items) == {"a": 1}
+    with pytest.raises(BulkParseError):
+        await anext(items)
+
+@pytest.mark.asyncio
+async def test_ingest_bulk_chunks_and_reports_per_item(sqlite_session):
+    queue = use_memory_queue(InMemoryQueue())
+    ai = AIService()
+    ai.provider = "mock"
+
+    lines = [
+        {"customer_id": "c1", "message": "Great service"},
+        {"customer_id": "c2"},
+        {"customer_id": "c3", "message": "The delivery was terrible and slow."},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+    try:
+        result = await ingest_bulk(iter_ndjson(_chunks(body, 7)), sqlite_session, ai, chunk_size=1)
+    finally:
+        use_memory_queue(None)
+
+    assert result["accepted"] == 2
+    assert result["failed"] == 1
+    assert [r["status"] for r in result["results"]] == ["created", "error", "created"]
+    assert queue.qsize() == 2
+    stored = (await sqlite_session.exec(select(Feedback).order_by(Feedback.id))).all()
+    assert [f.id for f in stored] == [result["results"][0]["id"], result["results"][2]["id"]]
+    assert stored[1].sentiment == Sentiment.NEGATIVE
+    assert stored[1].created_at is not None
+
+@pytest.mark.asyncio
+async def test_items_count_against_customer_limits_and_stages(sqlite_session, monkeypatch):
+    monkeypatch.setattr(admission, "customer_limiter", RateLimiter("customer", rate=0.001, burst=2))
+    use_memory_queue(InMemoryQueue())
+    ai = AIService()
+    ai.provider = "mock"
+    lines = [{"customer_id": "noisy", "message": f"Parcel {i} is late"} for i in range(3)]
+    lines.append({"customer_id": "quiet", "message": "Lovely staff"})
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+    try:
+        result = await ingest_bulk(iter_ndjson(_chunks(body, 64)), sqlite_session, ai)
+        # A saturated writer stage sheds the chunk's items instead of queueing them
+        monkeypatch.setattr(admission.customer_limiter, "rate", 0)
+        busy = StageLimiter("db", 1, max_queue=0)
+        monkeypatch.setattr(bulk_ingest, "db_stage", busy)
+        async with busy.slot():
+            shed = await ingest_bulk(iter_ndjson(_chunks(body, 64)), sqlite_session, ai)
+    finally:
+        use_memory_queue(None)
+
+    assert [r["status"] for r in result["results"]] == ["created", "created", "error", "created"]
+    assert result["results"][2]["code"] == 429 and result["results"][2]["retry_after"] > 0
+    assert shed["accepted"] == 0 and {r["code"] for r in shed["results"]} == {503}
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+import pytest
+import app.core.cache as cache
+from app.core.cache import LRUCache, cached_computation
+
+@pytest.fixture(autouse=True)
+def clear_l1():
+    cache._l1.clear()
+    yield
+    cache._l1.clear()
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once(fake_redis):
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"total": 1}
+
+    results = await asyncio.gather(*(cached_computation("stats", compute) for _ in range(10)))
+    assert calls == 1
+    assert results == [{"total": 1}] * 10
+    assert json.loads(fake_redis.data["stats"])["value"] == {"total": 1}
+    # The lock is released once the value is stored
+    assert "lock:stats" not in fake_redis.data
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_refreshing(fake_redis):
+    fake_redis.data["stats"] = json.dumps({"stored_at": time.time() - 60, "value": "old"}).encode()
+    refreshed = asyncio.Event()
+
+    async def compute():
+        refreshed.set()
+        return "new"
+
+    assert await cached_computation("stats", compute, soft_ttl=30, hard_ttl=300) == "old"
+    await asyncio.wait_for(refreshed.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert await cached_computation("stats", compute, soft_ttl=30, hard_ttl=300) == "new"
+
+@pytest.mark.asyncio
+async def test_waits_for_replica_holding_the_lock(fake_redis):
+    fake_redis.data["lock:stats"] = b"other-replica"
+
+    async def publish_from_other_replica():
+        await asyncio.sleep(0.1)
+        fake_redis.data["stats"] = json.dumps({"stored_at": time.time(), "value": 42}).encode()
+
+    async def compute():
+        raise AssertionError("must not recompute while another replica holds the lock")
+
+    publisher = asyncio.create_task(publish_from_other_replica())
+    assert await cached_computation("stats", compute) == 42
+    await publisher
+
+@pytest.mark.asyncio
+async def test_release_keeps_a_lock_taken_over_by_another_replica(fake_redis):
+    async def compute():
+        # Our lock expired and another replica acquired it meanwhile
+        fake_redis.data["lock:stats"] = b"other-replica"
+        return 1
+
+    assert await cached_computation("stats", compute) == 1
+    assert fake_redis.data["lock:stats"] == b"other-replica"
+
+@pytest.mark.asyncio
+async def test_waiting_callers_take_over_when_the_first_is_cancelled(fake_redis):
+    started = asyncio.Event()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await asyncio.sleep(0.05)
+        return {"total": calls}
+
+    first = asyncio.create_task(cached_computation("stats", compute))
+    await started.wait()
+    waiting = asyncio.create_task(cached_computation("stats", compute))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await waiting == {"total": 2}
+    assert first.cancelled() and "lock:stats" not in fake_redis.data
@@ -0,0 +1,44 @@
+import pytest
+import app.services.dashboard_stats as dashboard_stats
+from app.models.feedback import Feedback, Sentiment, Category
+from app.services.dashboard_stats import increment_counters, read_counters, reconcile_counters
+
+@pytest.mark.asyncio
+async def test_counters_require_reconciliation_then_track_writes(fake_redis, sqlite_session):
+    sqlite_session.add(Feedback(customer_id="c1", message="m", sentiment=Sentiment.POSITIVE, category=Category.SERVICE))
+    await sqlite_session.commit()
+
+    # Never reconciled: callers must fall back to SQL
+    await increment_counters([(Sentiment.NEGATIVE, Category.DELIVERY)])
+    assert await read_counters() is None
+
+    await reconcile_counters(sqlite_session)
+
+    await increment_counters([(Sentiment.NEGATIVE, Category.DELIVERY), (None, None)])
+    await increment_counters([(Sentiment.NEUTRAL, Category.OTHER)], count_total=False)
+    assert await read_counters() == {
+        "total_feedback": 3,
+        "by_category": {"Service": 1, "Delivery": 1, "Other": 1},
+        "by_sentiment": {"Positive": 1, "Negative": 1, "Neutral": 1},
+    }
+
+@pytest.mark.asyncio
+async def test_reconciliation_adds_the_difference_and_keeps_concurrent_increments(fake_redis, sqlite_session, monkeypatch):
+    sqlite_session.add(Feedback(customer_id="c1", message="m", sentiment=Sentiment.POSITIVE, category=Category.SERVICE))
+    await sqlite_session.commit()
+    await increment_counters([(Sentiment.NEGATIVE, None)] * 3)  # drifted: never written to the DB
+    aggregate = dashboard_stats.aggregate_stats
+
+    async def aggregate_while_a_write_lands(session):
+        stats = await aggregate(session)
+        # Counted after the aggregate snapshot: must survive the reconciliation
+        await increment_counters([(Sentiment.POSITIVE, Category.SERVICE)])
+        return stats
+
+    monkeypatch.setattr(dashboard_stats, "aggregate_stats", aggregate_while_a_write_lands)
+    await reconcile_counters(sqlite_session)
+    assert await read_counters() == {
+        "total_feedback": 2,
+        "by_category": {"Service": 2},
+        "by_sentiment": {"Positive": 2},
+    }
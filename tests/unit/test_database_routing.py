@@ -0,0 +1,102 @@
+import pytest
+import app.core.database as database
+from app.core.database import DBClusterType, DBManager, DBRoutingMiddleware, _db_cluster_ctx
+
+async def _route(method, headers=()):
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["target"] = _db_cluster_ctx.get()
+
+    scope = {"type": "http", "method": method, "headers": list(headers), "client": ("10.0.1.7", 41000)}
+    await DBRoutingMiddleware(app)(scope, None, None)
+    return seen["target"]
+
+@pytest.mark.asyncio
+async def test_routing_by_method_and_header():
+    assert await _route("GET") == DBClusterType.READER
+    assert await _route("POST") == DBClusterType.WRITER
+    assert await _route("GET", [(b"x-db-target", b"Analytics")]) == DBClusterType.ANALYTICS
+    assert await _route("POST", [(b"x-db-target", b"nonsense")]) == DBClusterType.WRITER
+    # The routing decision does not leak out of the request
+    assert _db_cluster_ctx.get() == DBClusterType.WRITER
+
+def test_session_factory_is_cached_per_cluster(monkeypatch, tmp_path):
+    monkeypatch.setitem(database.DB_CONFIG, DBClusterType.READER, f"sqlite+aiosqlite:///{tmp_path / 'r.db'}")
+    manager = DBManager()
+    factory = manager.get_session_factory(DBClusterType.READER)
+    assert manager.get_session_factory(DBClusterType.READER) is factory
+
+class FakeEngine:
+    def __init__(self, name):
+        self.name = name
+
+def _pool(*names, lags=None):
+    replicas = [database.ReaderReplica(name, FakeEngine(name)) for name in names]
+    lags = lags if lags is not None else {}
+
+    async def probe(engine):
+        lag = lags.get(engine.name, 0.0)
+        if isinstance(lag, Exception):
+            raise lag
+        return lag
+
+    return database.ReaderPool(replicas, max_lag=5, probe=probe), lags
+
+def test_reader_pool_balances_by_outstanding_requests():
+    pool, _ = _pool("a", "b", "c")
+    held = [pool.acquire() for _ in range(3)]
+    assert sorted(r.url for r in held) == ["a", "b", "c"]
+    pool.release(held[1])
+    assert pool.acquire() is held[1]
+
+@pytest.mark.asyncio
+async def test_reader_pool_ejects_lagging_and_failed_replicas():
+    pool, lags = _pool("a", "b", "c")
+    lags.update({"a": 30.0, "b": ConnectionError("down")})
+    await pool.probe()
+    assert [r.url for r in pool.replicas if r.healthy] == ["c"]
+    assert {pool.acquire().url for _ in range(4)} == {"c"}
+
+    lags.update({"a": 0.5, "c": ConnectionError("down")})
+    await pool.probe()
+    assert [r.url for r in pool.replicas if r.healthy] == ["a"]
+
+    lags["a"] = 10.0
+    await pool.probe()
+    # No healthy replica: callers fall back to the writer
+    assert pool.acquire() is None
+
+@pytest.mark.asyncio
+async def test_read_your_writes_routes_recent_writers_to_writer(monkeypatch):
+    monkeypatch.setattr(database, "DB_READ_YOUR_WRITES_WINDOW", 5.0)
+    monkeypatch.setattr(database, "_recent_writers", database.LRUCache(maxsize=10, ttl=5.0))
+    client = [(b"x-client-id", b"c-1")]
+    assert await _route("GET", client) == DBClusterType.READER
+    await _route("POST", client)
+    assert await _route("GET", client) == DBClusterType.WRITER
+    assert await _route("GET", [(b"x-client-id", b"c-2")]) == DBClusterType.READER
+    # Without X-Client-Id there is no client to pin (the peer may be the load balancer)
+    await _route("POST")
+    assert await _route("GET") == DBClusterType.READER
+
+@pytest.mark.asyncio
+async def test_missing_nullable_columns_are_added(tmp_path):
+    from sqlalchemy import inspect, text
+    from sqlmodel import SQLModel
+    from sqlalchemy.ext.asyncio import create_async_engine
+    import app.models.feedback  # noqa: F401
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        # A feedback table from before the analysis_tier / analysis_confidence columns
+        await conn.execute(text(
+            "CREATE TABLE feedback (id INTEGER PRIMARY KEY, customer_id VARCHAR NOT NULL, "
+            "message VARCHAR NOT NULL, sentiment VARCHAR, category VARCHAR, summary VARCHAR, "
+            "created_at DATETIME NOT NULL)"
+        ))
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(database._add_missing_columns)
+        columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("feedback")})
+    await engine.dispose()
+    assert {"analysis_tier", "analysis_confidence"} <= columns
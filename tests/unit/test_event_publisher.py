@@ -0,0 +1,125 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+import pytest
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import app.services.outbox as outbox
+from app.core.queue import EventPublisher
+from app.models.outbox import OutboxEvent
+
+class FakeBroker:
+    """In-process stand-in for RabbitMQ: confirm-mode channels, an up/down switch and a round-trip delay."""
+
+    def __init__(self, delay=0.01):
+        self.up = True
+        self.delay = delay
+        self.messages = []
+        self.connects = 0
+        self.channels = 0
+
+    async def connect(self):
+        self.connects += 1
+        if not self.up:
+            raise ConnectionError("broker down")
+        return FakeConnection(self)
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_closed = False
+
+    async def channel(self, publisher_confirms=True):
+        assert publisher_confirms
+        self.broker.channels += 1
+        return FakeChannel(self.broker)
+
+    async def close(self):
+        self.is_closed = True
+
+class FakeChannel:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_closed = False
+        self.default_exchange = self
+
+    async def declare_queue(self, name, durable=False):
+        return None
+
+    async def publish(self, message, routing_key, timeout=None):
+        await asyncio.sleep(self.broker.delay)
+        if not self.broker.up:
+            self.is_closed = True
+            raise ConnectionError("connection lost")
+        self.broker.messages.append(json.loads(message.body))
+
+def _publisher(broker, spilled, **kwargs):
+    async def spill(payloads):
+        spilled.extend(payloads)
+
+    kwargs.setdefault("flush_interval", 0.005)
+    return EventPublisher(connect=broker.connect, spill=spill, retry_interval=60, **kwargs)
+
+@pytest.mark.asyncio
+async def test_publish_does_not_wait_for_the_broker_and_batches():
+    broker, spilled = FakeBroker(delay=0.05), []
+    publisher = _publisher(broker, spilled, pool_size=2, batch_size=50)
+    start = asyncio.get_running_loop().time()
+    for i in range(200):
+        assert await publisher.publish({"id": i})
+    # Enqueue only: far less than one broker round trip
+    assert asyncio.get_running_loop().time() - start < 0.05
+    await publisher.flush()
+    assert sorted(m["id"] for m in broker.messages) == list(range(200))
+    assert broker.channels <= 2
+    assert publisher.stats()["published"] == 200 and not spilled
+    await publisher.close()
+
+@pytest.mark.asyncio
+async def test_unavailable_broker_spills_and_backs_off():
+    broker, spilled = FakeBroker(), []
+    broker.up = False
+    publisher = _publisher(broker, spilled)
+    await publisher.publish_many([{"id": i} for i in range(10)])
+    await publisher.flush()
+    assert sorted(p["id"] for p in spilled) == list(range(10))
+    # One failed connect, then backing off instead of reconnecting per batch
+    await publisher.publish({"id": 10})
+    await publisher.flush()
+    assert broker.connects == 1
+    assert publisher.stats()["spilled"] == 11
+    await publisher.close()
+
+@pytest.mark.asyncio
+async def test_full_buffer_applies_backpressure_then_spills():
+    broker, spilled = FakeBroker(delay=0.2), []
+    publisher = _publisher(broker, spilled, pool_size=1, batch_size=1, buffer_size=2, buffer_wait=0.01)
+    results = [await publisher.publish({"id": i}) for i in range(6)]
+    assert all(results)
+    assert spilled  # the buffer overflowed into the outbox rather than growing without bound
+    await publisher.close()
+    assert len(broker.messages) + len(spilled) == 6
+
+@pytest.mark.asyncio
+async def test_outbox_relay_drains_once_the_broker_is_back(sqlite_session, monkeypatch):
+    session_factory = sessionmaker(sqlite_session.bind, class_=AsyncSession, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def session_scope(cluster=None):
+        async with session_factory() as session:
+            yield session
+
+    monkeypatch.setattr(outbox, "session_scope", session_scope)
+    broker = FakeBroker(delay=0)
+    broker.up = False
+    publisher = EventPublisher(connect=broker.connect, spill=outbox.spill_to_outbox, retry_interval=0)
+    await publisher.publish_many([{"id": i} for i in range(5)])
+    await publisher.flush()
+
+    assert await outbox.relay_outbox(publisher) == 0
+    broker.up = True
+    assert await outbox.relay_outbox(publisher, batch_size=2) == 5
+    assert [m["id"] for m in broker.messages] == list(range(5))
+    assert (await sqlite_session.exec(select(OutboxEvent))).all() == []
+    await publisher.close()
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+from app.models.feedback import Feedback, Sentiment, Category
+from app.services.feedback_query import (
+    FeedbackFilters, InvalidCursor, decode_cursor, export_csv, export_ndjson, list_feedback,
+    stream_feedback_rows,
+)
+
+@pytest_asyncio.fixture
+async def session(sqlite_session):
+    start = datetime(2026, 10, 1, 12)
+    sqlite_session.add_all([
+        Feedback(
+            customer_id=f"c{i % 2}", message=f"message {i}", created_at=start + timedelta(minutes=i // 2),
+            sentiment=Sentiment.POSITIVE if i % 3 else Sentiment.NEGATIVE, category=Category.SERVICE,
+        )
+        for i in range(25)
+    ])
+    await sqlite_session.commit()
+    return sqlite_session
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_every_row_once(session):
+    seen, cursor = [], None
+    while True:
+        items, cursor = await list_feedback(session, FeedbackFilters(), limit=7, cursor=cursor)
+        seen.extend(items)
+        if cursor is None:
+            break
+    assert len(seen) == 25
+    assert len({f.id for f in seen}) == 25
+    keys = [(f.created_at, f.id) for f in seen]
+    assert keys == sorted(keys, reverse=True)
+
+@pytest.mark.asyncio
+async def test_filters_and_bad_cursor(session):
+    filters = FeedbackFilters(
+        customer_id="c0", sentiment=Sentiment.NEGATIVE,
+        created_from=datetime(2026, 10, 1, 12, 3), created_to=datetime(2026, 10, 1, 12, 10),
+    )
+    items, cursor = await list_feedback(session, filters)
+    # i in [6, 20): even and divisible by 3
+    assert sorted(f.message for f in items) == ["message 12", "message 18", "message 6"]
+    assert cursor is None
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+@pytest.mark.asyncio
+async def test_exports_stream_all_rows(session):
+    filters = FeedbackFilters(customer_id="c1")
+    lines = b"".join([c async for c in export_ndjson(stream_feedback_rows(session, filters, batch_rows=4))])
+    rows = [json.loads(line) for line in lines.splitlines()]
+    assert len(rows) == 12
+    assert rows[0]["sentiment"] in ("Positive", "Negative") and rows[0]["customer_id"] == "c1"
+
+    text = b"".join([c async for c in export_csv(stream_feedback_rows(session, filters, batch_rows=5))]).decode()
+    table = list(csv.reader(io.StringIO(text)))
+    assert table[0][0] == "id" and len(table) == 13
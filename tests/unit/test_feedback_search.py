@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import update
+from app.core.database import install_search_index
+from app.models.feedback import Feedback, Sentiment, Category
+from app.services.feedback_query import FeedbackFilters
+from app.services.feedback_search import fts5_query, search_feedback
+
+def test_fts5_query_quotes_terms():
+    assert fts5_query("refund or courier") == '"refund" OR "courier"'
+    assert fts5_query('"late delivery" NEAR(x)') == '"late delivery" "NEAR" "x"'
+    assert fts5_query("or or") == ""
+
+@pytest.mark.asyncio
+async def test_search_is_maintained_on_insert_and_ranked(sqlite_session):
+    # Rows written before the index exists are picked up by the initial rebuild
+    sqlite_session.add(Feedback(customer_id="c", message="Asked for a refund twice", category=Category.PRODUCT))
+    await sqlite_session.commit()
+    async with sqlite_session.bind.begin() as conn:
+        await install_search_index(conn)
+
+    sqlite_session.add_all([
+        Feedback(customer_id="c", message="The courier lost my parcel", category=Category.DELIVERY,
+                 sentiment=Sentiment.NEGATIVE),
+        Feedback(customer_id="c", message="Refunds, refunds: still waiting for my refund",
+                 category=Category.SERVICE),
+        Feedback(customer_id="c", message="Lovely staff", category=Category.SERVICE),
+    ])
+    await sqlite_session.commit()
+
+    hits = await search_feedback(sqlite_session, "refund or courier", FeedbackFilters())
+    assert len(hits) == 3
+    assert [rank for _, rank in hits] == sorted((rank for _, rank in hits), reverse=True)
+
+    # Porter stemming matches "Refunds"; more occurrences rank higher
+    hits = await search_feedback(sqlite_session, "refund", FeedbackFilters())
+    assert [f.message for f, _ in hits] == [
+        "Refunds, refunds: still waiting for my refund", "Asked for a refund twice",
+    ]
+
+    hits = await search_feedback(sqlite_session, "refund", FeedbackFilters(category=Category.PRODUCT))
+    assert [f.message for f, _ in hits] == ["Asked for a refund twice"]
+
+    await sqlite_session.exec(update(Feedback).where(Feedback.message == "Lovely staff").values(message="Courier was lovely"))
+    await sqlite_session.commit()
+    hits = await search_feedback(sqlite_session, "courier", FeedbackFilters(sentiment=Sentiment.NEGATIVE))
+    assert [f.message for f, _ in hits] == ["The courier lost my parcel"]
+    assert len(await search_feedback(sqlite_session, "courier", FeedbackFilters())) == 2
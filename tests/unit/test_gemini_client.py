@@ -0,0 +1,135 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import pytest_asyncio
+from app.models.feedback import Sentiment, Category
+from app.services.ai_service import AIService
+from app.services.gemini_client import CircuitBreaker, CircuitOpenError, GeminiClient, GeminiError, TokenBucket
+
+class StubGemini:
+    """Local HTTP stand-in for generateContent: scripted (status, delay) replies, then `default`."""
+
+    def __init__(self):
+        self.script = []
+        self.default = (200, 0.0)
+        self.requests = 0
+        self.last_request = None
+        self.active = 0
+        self.max_active = 0
+        self.answer = {"sentiment": "Positive", "category": "Service", "summary": "Happy."}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.last_request = (self.path, self.headers.get("x-goog-api-key"))
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    status, delay = stub.script.pop(0) if stub.script else stub.default
+                time.sleep(delay)
+                body = json.dumps(
+                    {"candidates": [{"content": {"parts": [{"text": json.dumps(stub.answer)}]}}]}
+                    if status == 200 else {"error": {"code": status}}
+                ).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest_asyncio.fixture
+async def stub():
+    server = StubGemini()
+    yield server
+    server.close()
+
+def _client(stub, **kwargs):
+    kwargs.setdefault("rpm", 0)
+    return GeminiClient("test-key", "gemini-test", base_url=stub.url, **kwargs)
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors(stub):
+    stub.script = [(503, 0), (429, 0)]
+    client = _client(stub, retries=2)
+    assert json.loads(await client.generate_json("prompt"))["summary"] == "Happy."
+    assert stub.requests == 3
+    # The key travels in a header, never in the URL
+    assert stub.last_request == ("/v1beta/models/gemini-test:generateContent", "test-key")
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(stub):
+    stub.default = (200, 0.05)
+    client = _client(stub, max_concurrency=2)
+    await asyncio.gather(*(client.generate_json("prompt") for _ in range(8)))
+    assert stub.max_active <= 2
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast_then_recovers(stub):
+    stub.default = (500, 0)
+    client = _client(stub, retries=0, breaker=CircuitBreaker(threshold=3, reset_timeout=0.2))
+    for _ in range(3):
+        with pytest.raises(GeminiError):
+            await client.generate_json("prompt")
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await client.generate_json("prompt")
+    assert stub.requests == 3
+
+    await asyncio.sleep(0.25)
+    # A cancelled half-open trial gives its turn to the next call
+    stub.default = (200, 0.5)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(client.generate_json("prompt"), 0.05)
+    stub.default = (200, 0)
+    await client.generate_json("prompt")
+    assert client.breaker.state == "closed"
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_timeouts_fall_back_to_the_classifier(stub):
+    stub.default = (200, 0.5)
+    service = AIService()
+    service.provider = "gemini"
+    service.client = _client(stub, timeout=0.05, retries=0, breaker=CircuitBreaker(threshold=1, reset_timeout=60))
+    start = time.perf_counter()
+    result = await service._analyze("The delivery was terrible and slow.")
+    assert result._fallback
+    assert (result.sentiment, result.category) == (Sentiment.NEGATIVE, Category.DELIVERY)
+    # Circuit now open: no upstream call, no waiting
+    result = await service._analyze("Great service")
+    assert result._fallback and stub.requests == 1
+    assert time.perf_counter() - start < 0.4
+    await service.client.close()
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_calls():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.perf_counter()
+    for _ in range(5):
+        await bucket.acquire()
+    assert time.perf_counter() - start >= 0.18
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+import app.core.cache as cache
+from app.core.idempotency import (
+    IdempotencyKeyReused, IdempotencyStore, RequestInProgress, StoredResponse, request_hash,
+)
+
+RESPONSE = StoredResponse(201, {"id": 1}, {})
+
+def _counting(calls: list, delay: float = 0.0):
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return StoredResponse(201, {"id": len(calls)}, {})
+    return compute
+
+@pytest.mark.asyncio
+async def test_concurrent_and_later_duplicates_share_one_attempt(fake_redis):
+    store, calls = IdempotencyStore(), []
+    compute = _counting(calls, delay=0.05)
+    request = request_hash({"customer_id": "c", "message": "hi"})
+
+    results = await asyncio.gather(*(store.run("k", request, compute) for _ in range(5)))
+    assert calls == [1]
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert {response.body["id"] for response, _ in results} == {1}
+
+    # Another replica: nothing local, the stored response comes from Redis
+    response, replayed = await IdempotencyStore().run("k", request, compute)
+    assert replayed and response.body == {"id": 1} and calls == [1]
+
+    with pytest.raises(IdempotencyKeyReused):
+        await store.run("k", request_hash({"customer_id": "c", "message": "other"}), compute)
+
+@pytest.mark.asyncio
+async def test_replicas_wait_for_the_claim_and_failures_release_it(fake_redis):
+    first, second, calls = IdempotencyStore(), IdempotencyStore(wait=2), []
+
+    async def failing():
+        raise RuntimeError("AI down")
+
+    with pytest.raises(RuntimeError):
+        await first.run("k", "r", failing)
+    assert not fake_redis.data  # claim released: the retry runs
+
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(0.2)
+        return RESPONSE
+
+    running = asyncio.create_task(first.run("k", "r", slow))
+    await started.wait()
+    response, replayed = await second.run("k", "r", _counting(calls))
+    assert (response, replayed) == (RESPONSE, True) and not calls
+    assert await running == (RESPONSE, False)
+
+    # Claimed by a replica that never finishes: give up after the wait
+    fake_redis.data["idempotency:held"] = b'{"request": "r", "token": "t"}'
+    with pytest.raises(RequestInProgress):
+        await IdempotencyStore(wait=0.1).run("held", "r", _counting(calls))
+    assert not calls
+
+@pytest.mark.asyncio
+async def test_falls_back_to_process_when_redis_is_down(monkeypatch):
+    class DownRedis:
+        def __getattr__(self, name):
+            async def fail(*args, **kwargs):
+                raise ConnectionError("redis down")
+            return fail
+
+    monkeypatch.setattr(cache, "_redis", DownRedis())
+    store, calls = IdempotencyStore(), []
+    results = await asyncio.gather(*(store.run("k", "r", _counting(calls, delay=0.01)) for _ in range(3)))
+    assert calls == [1]
+    assert await store.run("k", "r", _counting(calls)) == (results[0][0], True)
+
+@pytest.mark.asyncio
+async def test_claim_is_renewed_while_running_and_released_only_by_its_owner(fake_redis, monkeypatch):
+    renewals = []
+    original_eval = fake_redis.eval
+
+    async def eval(script, numkeys, *keys_and_args):
+        if "'pexpire'" in script:
+            renewals.append(keys_and_args)
+        return await original_eval(script, numkeys, *keys_and_args)
+
+    monkeypatch.setattr(fake_redis, "eval", eval)
+    store = IdempotencyStore(lock_ttl=0.03)
+    assert await store.run("slow", "r", _counting([], delay=0.1)) == (StoredResponse(201, {"id": 1}, {}), False)
+    assert len(renewals) >= 2 and {renewal[2] for renewal in renewals} == {30}
+
+    # The claim expired and another replica took the key: the failure leaves its claim alone
+    async def taken_over():
+        fake_redis.data["idempotency:k"] = b'{"request": "r", "token": "other"}'
+        raise RuntimeError("AI down")
+
+    with pytest.raises(RuntimeError):
+        await store.run("k", "r", taken_over)
+    assert fake_redis.data["idempotency:k"] == b'{"request": "r", "token": "other"}'
@@ -0,0 +1,83 @@
+from datetime import datetime
+import pytest
+from app.core.queue import (
+    InMemoryQueue, add_event_listener, publish_feedback_event, remove_event_listener, use_memory_queue,
+)
+from app.services.insights import CountMinSketch, InsightsAggregator, Window, message_terms, read_insights
+
+NOW = datetime(2026, 5, 4, 13, 25)
+
+def test_message_terms_skip_stopwords_and_repeats():
+    assert message_terms("The courier was late, LATE again and the parcel was 2 days late") == {
+        "courier", "late", "parcel", "days",
+    }
+
+def test_count_min_cells_are_stable_and_one_per_row():
+    sketch = CountMinSketch(width=64, depth=4)
+    cells = sketch.cells("refund")
+    assert cells == CountMinSketch(width=64, depth=4).cells("refund")
+    assert [cell // 64 for cell in cells] == [0, 1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_sketches_merge_across_flushes_and_replicas(fake_redis):
+    replicas = [InsightsAggregator(CountMinSketch(width=256, depth=3), candidates=5) for _ in range(2)]
+    for i in range(30):
+        replicas[i % 2].observe({
+            "customer_id": f"c{i % 7}",
+            "message": "courier late" if i % 3 else "refund refused",
+            "sentiment": "Negative",
+            "category": "Delivery" if i % 3 else "Product",
+        }, at=NOW)
+    # Analyzed later by the worker: only its labels are added
+    replicas[0].observe({"customer_id": "c99", "message": "lovely staff", "sentiment": "Positive"}, overall=False, at=NOW)
+    assert await replicas[0].flush() > 0
+    assert await replicas[1].flush() > 0
+    assert await replicas[1].flush() == 0
+
+    hour = await read_insights(Window.HOUR, k=2, at=NOW)
+    assert hour["bucket_start"] == "2026-05-04T13:00:00"
+    assert hour["unique_customers"] == 7
+    # Count-Min never underestimates
+    assert {t["term"] for t in hour["top_terms"]} == {"courier", "late"}
+    assert all(t["count"] >= 20 for t in hour["top_terms"])
+    assert len(hour["top_customers"]) == 2
+    assert hour["by_sentiment"]["Negative"]["unique_customers"] == 7
+    assert hour["by_sentiment"]["Positive"]["top_customers"] == [{"customer_id": "c99", "count": 1}]
+    assert hour["by_category"]["Product"]["top_terms"][0]["term"] in {"refund", "refused"}
+    assert "Other" not in hour["by_category"]
+
+    day = await read_insights(Window.DAY, at=NOW)
+    assert day["unique_customers"] == 7
+    assert (await read_insights(Window.HOUR, at=datetime(2026, 5, 4, 14)))["unique_customers"] == 0
+
+@pytest.mark.asyncio
+async def test_candidates_missed_by_a_failed_ranking_are_ranked_on_the_next_flush(fake_redis, monkeypatch):
+    aggregator = InsightsAggregator(CountMinSketch(width=64, depth=2))
+    aggregator.observe({"customer_id": "c1", "message": "courier late"}, at=NOW)
+    zadd = fake_redis.zadd
+
+    async def down(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(fake_redis, "zadd", down)
+    # The sketch counts were written: reported, and the ranking is retried later
+    assert await aggregator.flush() > 0
+    assert (await read_insights(Window.HOUR, at=NOW))["top_terms"] == []
+
+    monkeypatch.setattr(fake_redis, "zadd", zadd)
+    assert await aggregator.flush() == 0
+    hour = await read_insights(Window.HOUR, at=NOW)
+    assert {t["term"] for t in hour["top_terms"]} == {"courier", "late"}
+    assert hour["top_customers"] == [{"customer_id": "c1", "count": 1}]
+
+@pytest.mark.asyncio
+async def test_published_events_reach_listeners():
+    seen = []
+    use_memory_queue(InMemoryQueue())
+    add_event_listener(seen.append)
+    try:
+        await publish_feedback_event({"id": 1, "message": "m"})
+    finally:
+        remove_event_listener(seen.append)
+        use_memory_queue(None)
+    assert seen == [{"id": 1, "message": "m"}]
@@ -0,0 +1,67 @@
+import json
+import pytest
+from app.services.live_stats import StatsBroadcaster
+
+def _event(message) -> tuple:
+    seq, name, data = message.sse.decode().strip().split("\n")
+    assert json.loads(message.text)["seq"] == int(seq.removeprefix("id: "))
+    return int(seq.removeprefix("id: ")), name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+@pytest.mark.asyncio
+async def test_deltas_are_coalesced_and_snapshots_resync():
+    snapshots = [{"total_feedback": 10, "by_category": {}, "by_sentiment": {}}]
+
+    async def snapshot():
+        return snapshots[-1]
+
+    broadcaster = StatsBroadcaster(snapshot=snapshot, snapshot_interval=3600)
+    broadcaster.observe({"sentiment": "Positive"})  # nobody listening: not buffered
+    subscription = broadcaster.subscribe()
+
+    broadcaster.observe({"sentiment": "Neutral"})  # counted before the snapshot read: not a delta
+    await broadcaster.tick()
+    broadcaster.observe({"sentiment": "Negative", "category": "Delivery", "status": "analyzed"})
+    broadcaster.observe({"sentiment": "Negative", "category": "Product", "status": "analyzed"})
+    broadcaster.observe({"sentiment": None, "category": None, "status": "pending"})
+    await broadcaster.tick()
+    await broadcaster.tick()  # nothing new, snapshot not due
+
+    assert subscription.queue.qsize() == 2
+    assert _event(subscription.queue.get_nowait()) == (1, "snapshot", snapshots[-1])
+    assert _event(subscription.queue.get_nowait()) == (2, "delta", {
+        "total_feedback": 3,
+        "by_category": {"Delivery": 1, "Product": 1},
+        "by_sentiment": {"Negative": 2},
+    })
+    assert subscription.queue.empty()
+
+@pytest.mark.asyncio
+async def test_a_failed_snapshot_falls_back_to_the_delta():
+    async def snapshot():
+        raise ConnectionError("redis down")
+
+    broadcaster = StatsBroadcaster(snapshot=snapshot)
+    subscription = broadcaster.subscribe()
+    broadcaster.observe({"sentiment": "Positive"})
+    await broadcaster.tick()
+
+    assert _event(subscription.queue.get_nowait()) == (1, "delta", {
+        "total_feedback": 1, "by_category": {}, "by_sentiment": {"Positive": 1},
+    })
+
+@pytest.mark.asyncio
+async def test_slow_consumers_are_evicted():
+    async def snapshot():
+        return None
+
+    broadcaster = StatsBroadcaster(snapshot=snapshot, buffer=2)
+    slow, fast = broadcaster.subscribe(), broadcaster.subscribe()
+    for _ in range(3):
+        broadcaster.observe({"sentiment": "Neutral"})
+        await broadcaster.tick()
+        while not fast.queue.empty():
+            fast.queue.get_nowait()
+
+    assert slow.evicted and not fast.evicted
+    assert slow.queue.get_nowait() is None
+    assert broadcaster.stats() == {"subscribers": 1, "evicted": 1}
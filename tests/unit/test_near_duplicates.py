@@ -0,0 +1,101 @@
+import pytest
+from sqlmodel import select
+import app.services.bulk_ingest as bulk_ingest
+from app.core.queue import InMemoryQueue, use_memory_queue
+from app.models.feedback import Category, Feedback, Sentiment
+from app.services.ai_service import AIService, FeedbackAnalysis
+from app.services.bulk_ingest import ingest_bulk
+from app.services.near_duplicates import _BUCKET_SIZE, NearDuplicateIndex, hamming, message_fingerprint, to_signed
+
+BASE = (
+    "Hi, my name is John and my order 48213 never arrived. The courier says delivered "
+    "but nothing at my door, I want a refund now"
+)
+ANALYSIS = FeedbackAnalysis(sentiment=Sentiment.NEGATIVE, category=Category.DELIVERY, summary="Lost parcel.")
+
+def test_fingerprint_tolerates_small_edits_only():
+    base = message_fingerprint(BASE)
+    edits = [
+        BASE.replace("John", "Maria").replace("48213", "99120"),
+        BASE.replace(",", "").replace(".", "!!").upper(),
+        BASE.replace("refund now", "refund today"),
+    ]
+    for edit in edits:
+        assert hamming(base.bits, message_fingerprint(edit).bits) <= 9
+        assert set(base.buckets) & set(message_fingerprint(edit).buckets)
+    other = message_fingerprint("The app crashes every time I open the settings page on my phone")
+    assert hamming(base.bits, other.bits) > 9
+    assert message_fingerprint("Not great") is None
+    assert -(2**63) <= to_signed(base) < 2**63
+
+@pytest.mark.asyncio
+async def test_index_is_shared_through_redis(fake_redis):
+    fingerprint = message_fingerprint(BASE)
+    await NearDuplicateIndex().remember(fingerprint, 7, ANALYSIS, "ns")
+
+    # Another replica: empty local index, same Redis
+    replica = NearDuplicateIndex()
+    match = await replica.find(message_fingerprint(BASE.replace("John", "Priya")), "ns")
+    assert match.feedback_id == 7
+    assert match.analysis == ANALYSIS
+    assert await replica.find(fingerprint, "other-namespace") is None
+    assert await replica.find(message_fingerprint("Lovely staff and a very clean store, thanks"), "ns") is None
+    assert replica.stats()["hits"] == 1 and replica.stats()["misses"] == 2
+
+    lovely = message_fingerprint("Lovely staff and a very clean store overall")
+    fallback = ANALYSIS.model_copy()
+    fallback._fallback = True
+    await replica.remember(lovely, 8, fallback, "ns")
+    assert await NearDuplicateIndex().find(lovely, "ns") is None
+
+    # Buckets keep their newest entries only
+    await replica.remember_many(((fingerprint, 100 + i, ANALYSIS) for i in range(20)), "ns")
+    assert {len(members) for key, members in fake_redis.data.items() if key.startswith("neardup:")} == {_BUCKET_SIZE}
+    assert (await NearDuplicateIndex().find(fingerprint, "ns")).feedback_id == 119
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_links_near_duplicates(fake_redis, monkeypatch, sqlite_session):
+    monkeypatch.setattr(bulk_ingest, "near_duplicates", NearDuplicateIndex())
+    use_memory_queue(InMemoryQueue())
+
+    analyzed = []
+
+    class CountingService(AIService):
+        async def analyze_batch(self, messages, slots=None, endpoint="default", stage=None):
+            analyzed.extend(messages)
+            return await super().analyze_batch(messages, slots, endpoint, stage)
+
+    async def items(messages):
+        for message in messages:
+            yield {"customer_id": "c", "message": message}
+
+    service = CountingService()
+    try:
+        await ingest_bulk(items([BASE]), sqlite_session, service)
+        copies = [BASE.replace("John", name) for name in ("Ann", "Raj", "Lee")]
+        unrelated = "The app crashes every time I open the settings"
+        summary = await ingest_bulk(items(copies + [unrelated]), sqlite_session, service)
+        rows = (await sqlite_session.exec(select(Feedback).order_by(Feedback.id))).all()
+    finally:
+        use_memory_queue(None)
+
+    assert summary["accepted"] == 4
+    assert len(analyzed) == 2
+    assert [row.duplicate_of for row in rows] == [None, rows[0].id, rows[0].id, rows[0].id, None]
+    assert all(row.sentiment == rows[0].sentiment for row in rows[:4])
+    assert rows[0].fingerprint == to_signed(message_fingerprint(BASE))
+
+    # Copies within one chunk: only the first is analyzed
+    monkeypatch.setattr(bulk_ingest, "near_duplicates", NearDuplicateIndex())
+    analyzed.clear()
+    fresh = "Parcel arrived torn open and half of the order is missing, Maria"
+    use_memory_queue(InMemoryQueue())
+    try:
+        summary = await ingest_bulk(
+            items([fresh, fresh.replace("Maria", "Olga"), fresh.upper()]), sqlite_session, service
+        )
+        rows = (await sqlite_session.exec(select(Feedback).where(Feedback.id > rows[-1].id).order_by(Feedback.id))).all()
+    finally:
+        use_memory_queue(None)
+    assert summary["accepted"] == 3 and analyzed == [fresh]
+    assert [row.duplicate_of for row in rows] == [None, rows[0].id, rows[0].id]
@@ -0,0 +1,59 @@
+import time
+import pytest
+import app.core.profiling as profiling
+from app.core.profiling import ProfilingMiddleware, SamplingProfiler
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_sampling_profiler_collects_collapsed_stacks():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    _busy(0.05)
+    profiler.stop()
+    output = profiler.collapsed()
+    assert "_busy (test_profiling.py" in output
+    stack, count = output.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+async def _call(headers):
+    sent = []
+
+    async def app(scope, receive, send):
+        _busy(0.02)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/api/v1/feedback", "headers": headers}
+    await ProfilingMiddleware(app)(scope, None, send)
+    return dict(sent[0]["headers"])
+
+@pytest.mark.asyncio
+async def test_profiling_middleware_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_HEADER_ENABLED", False)
+    assert b"x-profile-file" not in await _call([(b"x-profile", b"1")])
+
+    monkeypatch.setattr(profiling, "PROFILE_HEADER_ENABLED", True)
+    assert b"x-profile-file" not in await _call([])
+    name = (await _call([(b"x-profile", b"1")]))[b"x-profile-file"].decode()
+    assert name.endswith("-GET-api_v1_feedback.folded")
+    assert "_busy" in (tmp_path / name).read_text()
+
+@pytest.mark.asyncio
+async def test_a_failed_profile_write_keeps_the_response(monkeypatch, tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(blocker))
+    monkeypatch.setattr(profiling, "PROFILE_HEADER_ENABLED", True)
+    failures = profiling.PROFILE_WRITE_FAILURES._value.get()
+
+    assert b"x-profile-file" in await _call([(b"x-profile", b"1")])
+    assert profiling.PROFILE_WRITE_FAILURES._value.get() == failures + 1
+    # The profiler is free again for the next request
+    assert not profiling._active.locked()
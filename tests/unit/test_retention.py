@@ -0,0 +1,79 @@
+import gzip
+import json
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+import app.services.retention as retention
+from app.core.partitions import add_months, detach_partition, partition_name, partitioned_copy
+from app.models.feedback import Feedback, Sentiment
+
+def test_month_arithmetic_and_names():
+    assert add_months(datetime(2025, 11, 1), 3) == datetime(2026, 2, 1)
+    assert add_months(datetime(2026, 1, 1), -1) == datetime(2025, 12, 1)
+    assert partition_name("feedback", datetime(2026, 3, 1)) == "feedback_y2026m03"
+
+def test_partitioned_table_ddl():
+    ddl = str(CreateTable(partitioned_copy(Feedback.__table__, "created_at")).compile(dialect=postgresql.dialect()))
+    assert "PRIMARY KEY (id, created_at)" in ddl
+    assert "PARTITION BY RANGE (created_at)" in ddl
+    assert "id SERIAL" in ddl
+    # The model itself is unchanged
+    assert [c.name for c in Feedback.__table__.primary_key.columns] == ["id"]
+
+class _CatalogConn:
+    """Records statements; answers the catalog queries of detach_partition."""
+
+    def __init__(self, pending, has_default):
+        self.pending, self.has_default, self.statements = pending, has_default, []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        value = self.pending if "inhdetachpending" in sql else (1 if self.has_default else None)
+        return SimpleNamespace(scalar=lambda: value, first=lambda: value)
+
+@pytest.mark.parametrize("pending, has_default, expected", [
+    (False, False, "ALTER TABLE feedback DETACH PARTITION feedback_y2026m01 CONCURRENTLY"),
+    (True, False, "ALTER TABLE feedback DETACH PARTITION feedback_y2026m01 FINALIZE"),
+    # Postgres refuses CONCURRENTLY next to a DEFAULT partition: bounded lock wait instead
+    (False, True, "ALTER TABLE feedback DETACH PARTITION feedback_y2026m01"),
+    (None, False, None),
+])
+def test_detach_partition(pending, has_default, expected):
+    conn = _CatalogConn(pending, has_default)
+    detach_partition(conn, "feedback", "feedback_y2026m01")
+    detaches = [sql for sql in conn.statements if "DETACH" in sql]
+    assert detaches == ([expected] if expected else [])
+    if has_default:
+        assert conn.statements[-1] == "RESET lock_timeout"
+
+@pytest.mark.asyncio
+async def test_expired_months_are_archived_then_removed(sqlite_session, tmp_path):
+    for month in (1, 1, 2, 4):
+        sqlite_session.add(Feedback(
+            customer_id="c", message=f"m{month}", sentiment=Sentiment.POSITIVE,
+            created_at=datetime(2026, month, 15),
+        ))
+    await sqlite_session.commit()
+
+    # March holds no rows: not listed
+    directory = str(tmp_path / "archive")
+    months = await retention.expired_months(sqlite_session, datetime(2026, 4, 1))
+    assert months == [datetime(2026, 1, 1), datetime(2026, 2, 1)]
+    archived = [await retention.archive_month(sqlite_session, month, directory) for month in months]
+    assert archived == [2, 1]
+    assert await retention.expired_months(sqlite_session, datetime(2026, 4, 1)) == []
+    # An empty month (e.g. an empty partition) is removed without an archive file
+    assert await retention.archive_month(sqlite_session, datetime(2026, 3, 1), directory) == 0
+    assert sorted(p.name for p in (tmp_path / "archive").iterdir()) == [
+        "feedback_y2026m01.ndjson.gz", "feedback_y2026m02.ndjson.gz",
+    ]
+
+    with gzip.open(retention.archive_path(datetime(2026, 1, 1), directory)) as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["message"] for row in rows] == ["m1", "m1"]
+    assert rows[0]["sentiment"] == "Positive" and rows[0]["created_at"].startswith("2026-01-15")
+    assert await sqlite_session.scalar(select(func.count()).select_from(Feedback)) == 1
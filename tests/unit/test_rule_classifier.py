@@ -0,0 +1,57 @@
+import time
+import pytest
+from app.models.feedback import Sentiment, Category
+from app.services.ai_service import AIService
+from app.services.rule_classifier import RuleClassifier
+
+def test_word_boundaries_prefixes_and_phrases():
+    classifier = RuleClassifier()
+    # "app" must not match inside "happy", nor "late" inside "translate"
+    result = classifier.classify("Happy with the translated manual")
+    assert result.category == Category.OTHER
+    assert classifier.classify("The app crashes on start").category == Category.PRODUCT
+    result = classifier.classify("My parcel NEVER\n  arrived")
+    assert (result.sentiment, result.category) == (Sentiment.NEGATIVE, Category.DELIVERY)
+
+def test_weights_ties_and_confidence():
+    classifier = RuleClassifier()
+    # Weighted: "terrible" (1.5) outweighs "good" (1.0)
+    assert classifier.classify("Good price but terrible packaging").sentiment == Sentiment.NEGATIVE
+    # Tie goes to the label listed first (Negative)
+    assert classifier.classify("bad and good").sentiment == Sentiment.NEGATIVE
+    assert classifier.classify("nothing to see here").confidence == 0.0
+    weak = classifier.classify("good delivery").confidence
+    strong = classifier.classify("great, excellent, fast delivery by a lovely courier").confidence
+    assert 0 < weak < strong < 1
+
+def test_custom_rules_and_batch_matches_single():
+    rules = {
+        "sentiment": {"Negative": {"meh": 2.0}, "Positive": {"yay": 1.0}, "Neutral": {}},
+        "category": {"Delivery": {}, "Product": {"widget*": 1.0}, "Service": {}, "Other": {}},
+    }
+    classifier = RuleClassifier(rules)
+    assert classifier.version != RuleClassifier().version
+    messages = ["meh widgets", "yay", "", "yay\x00meh", "Widget"] * 200
+    batch = classifier.classify_batch(messages)
+    assert batch == [classifier.classify(m) for m in messages]
+    assert batch[0].sentiment == Sentiment.NEGATIVE and batch[0].category == Category.PRODUCT
+    assert batch[2].sentiment == Sentiment.NEUTRAL and batch[2].category == Category.OTHER
+
+def test_classify_batch_throughput():
+    classifier = RuleClassifier()
+    messages = ["The delivery was terrible and slow, the courier was rude to me."] * 10_000
+    start = time.perf_counter()
+    results = classifier.classify_batch(messages)
+    assert time.perf_counter() - start < 2.0
+    assert all(r.sentiment == Sentiment.NEGATIVE for r in results)
+
+@pytest.mark.asyncio
+async def test_ai_service_batch_uses_rules_without_latency():
+    service = AIService()
+    service.provider = "mock"
+    start = time.perf_counter()
+    results = await service.analyze_batch(["I love this fast product", "Delivery was slow and terrible"])
+    assert time.perf_counter() - start < 0.1
+    assert [(r.sentiment, r.category) for r in results] == [
+        (Sentiment.POSITIVE, Category.PRODUCT), (Sentiment.NEGATIVE, Category.DELIVERY),
+    ]
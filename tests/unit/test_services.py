@@ -29,3 +29,77 @@ async def test_ai_service_fallback():
     if service.provider == "mock":
         result = await service.analyze_feedback("neutral message")
         assert result.sentiment in [Sentiment.POSITIVE, Sentiment.NEUTRAL, Sentiment.NEGATIVE]
+
+class _FakeBatchClient:
+    """Stands in for the Gemini client: answers a batch prompt with a JSON array."""
+
+    def __init__(self, response_text):
+        self.response_text = response_text
+        self.calls = 0
+
+    async def generate_json(self, prompt):
+        self.calls += 1
+        return self.response_text
+
+@pytest.mark.asyncio
+async def test_batcher_coalesces_concurrent_calls(monkeypatch):
+    import asyncio
+    import json
+    from app.services.ai_service import AnalysisBatcher
+
+    # Every message goes to the LLM
+    monkeypatch.setenv("AI_CASCADE_THRESHOLD_DEFAULT", "off")
+    service = AIService()
+    service.provider = "gemini"
+    service.client = _FakeBatchClient(json.dumps([
+        {"index": 0, "sentiment": "Positive", "category": "Service", "summary": "Happy."},
+        {"index": 1, "sentiment": "Negative", "category": "Delivery", "summary": "Late."},
+        # Item 2 is malformed and must fall back to the mock on its own
+        {"index": 2, "sentiment": "Furious", "category": "Delivery", "summary": "?"},
+    ]))
+    service.batcher = AnalysisBatcher(service._gemini_batch_analysis, window=0.05, max_size=3)
+
+    results = await asyncio.gather(
+        service.analyze_feedback("Staff were lovely"),
+        service.analyze_feedback("Parcel arrived a week late"),
+        service.analyze_feedback("The delivery was terrible and slow."),
+    )
+
+    assert service.client.calls == 1
+    assert results[0].sentiment == Sentiment.POSITIVE
+    assert results[1].summary == "Late."
+    assert results[2].summary.startswith("[Mock Analysis]")
+    assert results[2].sentiment == Sentiment.NEGATIVE
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_only_ambiguous_messages(monkeypatch):
+    import json
+
+    monkeypatch.setenv("AI_CASCADE_THRESHOLD_CASCADE_TEST", "0.6")
+    service = AIService()
+    service.provider = "gemini"
+    service.cache = None
+    service.client = _FakeBatchClient(json.dumps(
+        {"sentiment": "Neutral", "category": "Product", "summary": "Mixed."}
+    ))
+
+    clear = await service.analyze_feedback("Great, fast delivery", endpoint="cascade_test")
+    assert clear.tier == "rules"
+    assert clear.confidence >= 0.6
+    assert clear.sentiment == Sentiment.POSITIVE
+    assert service.client.calls == 0
+
+    mixed = await service.analyze_feedback("Great app but slow delivery", endpoint="cascade_test")
+    assert mixed.tier == "llm"
+    assert mixed.summary == "Mixed."
+    assert service.client.calls == 1
+
+    batch = await service.analyze_batch(
+        ["Terrible, rude support", "hello there", "Lovely staff"], endpoint="cascade_test"
+    )
+    assert [a.tier for a in batch] == ["rules", "llm", "rules"]
+    assert service.client.calls == 2
+
+    stats = service.cascade_stats()["cascade_test"]
+    assert (stats["local"], stats["escalated"]) == (3, 2)
+    assert stats["escalation_rate"] == pytest.approx(0.4)
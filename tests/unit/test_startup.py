@@ -0,0 +1,41 @@
+import sys
+import subprocess
+from fastapi import FastAPI
+import app.microservices.loader as loader
+from app.core.startup import StartupReport
+from app.services.ai_service import get_ai_service
+
+def test_microservice_allowlist(monkeypatch):
+    assert loader.microservice_enabled("echo", "")
+    assert loader.microservice_enabled("echo", "*")
+    assert loader.microservice_enabled("echo", "analyzer, echo")
+    assert not loader.microservice_enabled("echo", "analyzer")
+
+    monkeypatch.setattr(loader, "MICROSERVICES", "echo")
+    app = FastAPI()
+    report = StartupReport()
+    assert loader.load_microservices(app, report) == ["echo"]
+    assert list(report.steps) == ["service:echo"]
+    paths = app.openapi()["paths"]
+    assert "/services/echo/ping" in paths
+    assert not any(path.startswith("/services/analyzer") for path in paths)
+
+def test_excluded_microservices_are_never_imported():
+    code = (
+        "import os, sys; os.environ['MICROSERVICES'] = 'echo'; import app.main; "
+        "from app.microservices.loader import load_microservices; load_microservices(app.main.app); "
+        "print(any(name.startswith('app.microservices.queuehealth') for name in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+def test_ai_service_is_shared_per_process():
+    assert get_ai_service() is get_ai_service()
+
+def test_provider_client_imported_only_when_selected():
+    code = (
+        "import os, sys; os.environ.pop('GEMINI_API_KEY', None); import app.main; "
+        "print('app.services.gemini_client' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import select
+from app.models.feedback import Feedback, Sentiment, Category
+from app.models.rollup import FeedbackStatsHourly
+from app.services.stats_rollup import Bucket, recompute_recent, refresh_rollup, windowed_stats
+
+def _row(created_at, sentiment=Sentiment.POSITIVE, category=Category.SERVICE, id=None):
+    return Feedback(
+        id=id, customer_id="c", message="m", sentiment=sentiment, category=category, created_at=created_at
+    )
+
+@pytest.mark.asyncio
+async def test_rollup_is_incremental_and_windowed(sqlite_session):
+    day1 = datetime(2026, 10, 5, 9, 15)  # Monday
+    sqlite_session.add_all([
+        _row(day1),
+        _row(day1 + timedelta(minutes=30)),
+        _row(day1 + timedelta(hours=2), Sentiment.NEGATIVE, Category.DELIVERY),
+    ])
+    await sqlite_session.commit()
+    assert await refresh_rollup(sqlite_session) == 3
+    # Nothing new: the watermark prevents double counting
+    assert await refresh_rollup(sqlite_session) == 0
+
+    # Recent rows are left to the recompute window: one awaiting async analysis (5), and
+    # one whose id (6) is allocated before a higher one (7) but commits after it
+    now = datetime.utcnow()
+    pending = Feedback(id=5, customer_id="c", message="pending", created_at=now)
+    sqlite_session.add_all([_row(day1 + timedelta(days=1)), pending, _row(now, id=7)])
+    await sqlite_session.commit()
+    assert await refresh_rollup(sqlite_session) == 4
+    await recompute_recent(sqlite_session)
+
+    pending.sentiment, pending.category = Sentiment.NEGATIVE, Category.PRODUCT
+    sqlite_session.add_all([pending, _row(now, id=6)])
+    await sqlite_session.commit()
+    assert await refresh_rollup(sqlite_session) == 0
+    await recompute_recent(sqlite_session)
+    await recompute_recent(sqlite_session)  # replaces, never adds
+
+    hourly = (await sqlite_session.exec(select(FeedbackStatsHourly))).all()
+    assert sum(r.count for r in hourly) == 7
+    assert sum(r.count for r in hourly if r.bucket > day1 + timedelta(days=2)) == 3
+
+    by_day = await windowed_stats(sqlite_session, day1.replace(hour=0), day1 + timedelta(days=7), Bucket.DAY)
+    assert by_day["total_feedback"] == 4
+    assert [p["total"] for p in by_day["series"]] == [3, 1]
+    assert by_day["by_category"] == {"Service": 3, "Delivery": 1}
+
+    by_week = await windowed_stats(sqlite_session, None, day1 + timedelta(days=7), Bucket.WEEK)
+    assert [(p["bucket"], p["total"]) for p in by_week["series"]] == [(datetime(2026, 10, 5), 4)]
+
+    by_hour = await windowed_stats(sqlite_session, day1, day1 + timedelta(hours=1), Bucket.HOUR)
+    assert by_hour["series"][0]["by_sentiment"] == {"Positive": 2}
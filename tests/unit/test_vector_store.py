@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import app.services.similarity as similarity
+from app.core.vector_store import VectorStore
+from app.models.feedback import Feedback
+from app.services.embeddings import HashingEmbedder
+
+def _clustered(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dim))
+    vectors = centers[rng.integers(0, 16, n)] + 0.3 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def test_embedder_is_stable_and_similarity_aware():
+    embedder = HashingEmbedder(dim=256)
+    a = embedder.embed("The courier lost my parcel")
+    assert np.allclose(a, HashingEmbedder(dim=256).embed("the COURIER lost my parcel!"))
+    assert abs(np.linalg.norm(a) - 1) < 1e-5
+    close = embedder.embed("The courier lost my parcel again")
+    far = embedder.embed("Lovely staff at the front desk")
+    assert a @ close > a @ far
+    assert not embedder.embed("").any()
+
+def test_store_searches_before_and_after_training(tmp_path):
+    dim = 32
+    vectors = _clustered(3000, dim)
+    store = VectorStore(str(tmp_path), dim, n_lists=16, nprobe=4, train_size=2000)
+    store.add(range(1000), vectors[:1000])
+    assert not store.trained
+    assert store.search(vectors[5], k=1)[0][0] == 5
+
+    # Appends never train: searches scan every row until the background training ran
+    store.add(range(1000, 3000), vectors[1000:])
+    assert not store.trained and store.needs_training
+    assert store.search(vectors[2500], k=1)[0][0] == 2500
+    store.train()
+    assert store.trained and not store.needs_training
+    hits = store.search(vectors[2500], k=10)
+    assert hits[0][0] == 2500
+    exact = {id for id, _ in store.brute_force(vectors[2500], k=10)}
+    assert len(exact & {id for id, _ in hits}) >= 8
+
+    # Retrained once the store doubled; rows appended since are in their lists meanwhile
+    store.add(range(3000, 6000), _clustered(3000, dim, seed=2))
+    assert store.needs_training
+    store.train()
+    assert not store.needs_training and store.search(vectors[2500], k=1)[0][0] == 2500
+
+def test_store_reopens_from_disk_and_sees_other_writers(tmp_path):
+    dim = 16
+    vectors = _clustered(600, dim, seed=1)
+    writer = VectorStore(str(tmp_path), dim, n_lists=4, train_size=400)
+    writer.add(range(500), vectors[:500])
+    writer.train()
+    reader = VectorStore(str(tmp_path), dim, n_lists=4)
+    assert reader.trained and len(reader) == 500
+
+    # A crash mid-append leaves a partial vector behind; the next append drops it
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(b"\x00" * 7)
+    writer.add(range(500, 600), vectors[500:])
+    assert len(reader) == 600
+    assert reader.search(vectors[599], k=1)[0][0] == 599
+
+@pytest.mark.asyncio
+async def test_backfill_embeds_rows_missing_from_the_store(sqlite_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(similarity, "_store", VectorStore(str(tmp_path / "vectors"), similarity._embedder.dim))
+    messages = ["The courier lost my parcel", "Lovely staff", "Refund still pending", "App crashes on login"]
+    sqlite_session.add_all(Feedback(customer_id="c", message=message) for message in messages)
+    await sqlite_session.commit()
+    await similarity.index_feedback([(2, messages[1])])
+
+    assert await similarity.backfill_index(sqlite_session, batch_size=3) == 3
+    assert sorted(similarity.get_vector_store().ids()) == [1, 2, 3, 4]
+    assert await similarity.backfill_index(sqlite_session) == 0
+    assert (await similarity.find_similar("the courier lost my parcel!", k=1))[0][0] == 1